@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import tracemalloc
+import subprocess
+import contextlib
+
+import cache_utils
+import project_utils
+import code_utils
+import tree_utils
+
+DEFAULT_CONFIG = {
+    "projects": 2,
+    "asset_types": 3,
+    "assets": 10,
+    "sequences": 2,
+    "shots": 10,
+    "departments": 4,
+    "versions": 20,
+    "repos": 3,
+    "packages": 20,
+}
+
+def generateProjectLibrary(root, projects=2, asset_types=3, assets=10, sequences=2, shots=10, departments=4, versions=20, apps=("maya", "blender")):
+    """
+    Writes a synthetic project library following the pipeline layout.
+
+    :param root: The folder to write the library to
+    :type root: str
+    :return: Number of scene files written
+    :rtype: int
+    """
+    count = 0
+
+    def writeEntity(entity_dir, prefix):
+        written = 0
+        for stage in project_utils.STAGES:
+            for d in range(departments):
+                for app in apps:
+                    scenes_dir = "{}/{}/dept{:02d}/{}/scenes".format(entity_dir, stage, d, app)
+                    os.makedirs(scenes_dir)
+                    ext = project_utils.SCENE_EXTENSIONS[app][0]
+                    for v in range(1, versions + 1):
+                        open("{}/{}_dept{:02d}_v{:03d}{}".format(scenes_dir, prefix, d, v, ext), "w").close()
+                        written += 1
+        return written
+
+    for p in range(projects):
+        project_dir = "{}/project{:02d}".format(root, p)
+        for t in range(asset_types):
+            for a in range(assets):
+                count += writeEntity("{}/assets/type{:02d}/asset{:03d}".format(project_dir, t, a), "asset{:03d}".format(a))
+        for q in range(sequences):
+            for s in range(shots):
+                count += writeEntity("{}/shots/sq{:02d}/sh{:03d}".format(project_dir, q, s * 10), "sh{:03d}".format(s * 10))
+    return count
+
+def generateCodeLibrary(root, repos=3, packages=20):
+    """
+    Writes a synthetic code library, every repo holding the same packages.
+
+    :param root: The folder to write the library to
+    :type root: str
+    """
+    names = ["master"] + ["repo{:02d}".format(r) for r in range(1, repos)]
+    for repo in names:
+        for p in range(packages):
+            os.makedirs("{}/{}/package{:02d}".format(root, repo, p))
+
+@contextlib.contextmanager
+def injectLatency(seconds):
+    """
+    Adds a fixed delay to every stat and directory listing to simulate a NAS.
+
+    :param seconds: Delay added to each call
+    :type seconds: float
+    """
+    if not seconds:
+        yield
+        return
+
+    originals = {name: getattr(os, name) for name in ("stat", "scandir", "listdir")}
+
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            time.sleep(seconds)
+            return func(*args, **kwargs)
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(os, name, delayed(func))
+    try:
+        yield
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+
+def _time(func, repeat):
+    samples = []
+    for x in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {"min": samples[0], "median": samples[len(samples) // 2], "max": samples[-1]}
+
+def _benchmarkCalls():
+    project = project_utils.listProjects()[0]
+    asset_type = project_utils.listAssetTypes(project)[0]
+    asset = project_utils.listAssets(project, asset_type)[0]
+    sequence = project_utils.listSequences(project)[0]
+    shot = project_utils.listShots(project, sequence)[0]
+    dept = project_utils.listAssetDepartments(project, asset_type, asset)[0]
+    shot_dept = project_utils.listShotDepartments(project, sequence, shot)[0]
+    return {
+        "project_utils.listProjects": lambda: project_utils.listProjects(),
+        "project_utils.listAssetTypes": lambda: project_utils.listAssetTypes(project),
+        "project_utils.listAssets": lambda: project_utils.listAssets(project, asset_type),
+        "project_utils.listAssetDepartments": lambda: project_utils.listAssetDepartments(project, asset_type, asset),
+        "project_utils.listAssetMayaScenes": lambda: project_utils.listAssetMayaScenes(project, asset_type, asset, "work", dept),
+        "project_utils.listAssetBlenderScenes": lambda: project_utils.listAssetBlenderScenes(project, asset_type, asset, "work", dept),
+        "project_utils.listSequences": lambda: project_utils.listSequences(project),
+        "project_utils.listShots": lambda: project_utils.listShots(project, sequence),
+        "project_utils.listShotDepartments": lambda: project_utils.listShotDepartments(project, sequence, shot),
+        "project_utils.listShotMayaScenes": lambda: project_utils.listShotMayaScenes(project, sequence, shot, "work", shot_dept),
+        "project_utils.listShotBlenderScenes": lambda: project_utils.listShotBlenderScenes(project, sequence, shot, "work", shot_dept),
+        "project_utils.getAssetTree": lambda: project_utils.getAssetTree(project, asset_type, asset),
+        "project_utils.getShotTree": lambda: project_utils.getShotTree(project, sequence, shot),
+        "project_utils.crawlProject": lambda: sum(1 for r in project_utils.crawlProject(project)),
+        "code_utils.listRepos": lambda: code_utils.listRepos(),
+        "code_utils.listPackages": lambda: code_utils.listPackages("master"),
+    }
+
+def benchmarkFunctions(repeat=5):
+    """
+    Times every listing function cold (empty cache) and warm (cached).
+
+    :param repeat: Number of samples per function
+    :type repeat: int
+    :return: Dictionary of function name to cold/warm timings and filesystem calls
+    :rtype: dict
+    """
+    results = {}
+    for name, func in sorted(_benchmarkCalls().items()):
+        def cold():
+            cache_utils.clearCache()
+            func()
+        calls = cache_utils.getFilesystemCallCount()
+        cold_times = _time(cold, repeat)
+        cold_calls = (cache_utils.getFilesystemCallCount() - calls) // repeat
+        results[name] = {"cold": cold_times, "warm": _time(func, repeat), "fs_calls": cold_calls}
+    return results
+
+def benchmarkLauncher(timeout=60.0):
+    """
+    Times an offscreen LauncherWindow startup and a full refresh, until the
+    refresh engine is idle.
+
+    :param timeout: Seconds to wait for a pass to finish
+    :type timeout: float
+    :return: Dictionary of timings, or the reason the benchmark was skipped
+    :rtype: dict
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PySide2 import QtWidgets
+        import launcher
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    def waitIdle(window):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            app.processEvents()
+            if window.refresh_engine.isIdle() and window.refresh_engine.last_stats is not None:
+                return True
+            time.sleep(0.001)
+        return False
+
+    cache_utils.clearCache()
+    start = time.perf_counter()
+    window = launcher.LauncherWindow("maya")
+    constructed = time.perf_counter() - start
+    # the listings start on the first paint, an offscreen window may never paint
+    window.start()
+    finished = waitIdle(window)
+    startup = time.perf_counter() - start
+    startup_stats = window.refresh_engine.last_stats
+
+    window.refresh_engine.last_stats = None
+    start = time.perf_counter()
+    window.refresh_engine.refreshAll()
+    waitIdle(window)
+    refresh = time.perf_counter() - start
+
+    window.dispatcher.cancelAll()
+    window.close()
+    return {
+        "construct": constructed,
+        "startup": startup,
+        "startup_finished": finished,
+        "startup_fs_calls": startup_stats["fs_calls"] if startup_stats else None,
+        "refresh": refresh,
+        "refresh_fs_calls": window.refresh_engine.last_stats["fs_calls"] if window.refresh_engine.last_stats else None,
+    }
+
+def _iterScenePaths(files, root="D:/pipeline/projects", versions=25, departments=6):
+    # synthetic scene paths following the pipeline layout, without touching the disk
+    count = 0
+    entity = 0
+    while True:
+        project, asset = divmod(entity, 1000)
+        for stage in project_utils.STAGES:
+            for d in range(departments):
+                for v in range(1, versions + 1):
+                    yield "{}/project{:02d}/assets/type{:02d}/asset{:03d}/{}/dept{:02d}/maya/scenes/asset{:03d}_dept{:02d}_v{:03d}.ma".format(
+                        root, project, asset // 100, asset % 100, stage, d, asset % 100, d, v)
+                    count += 1
+                    if count >= files:
+                        return
+        entity += 1
+
+def benchmarkTreeMemory(files=1000000):
+    """
+    Measures the memory held by a list of path strings and by a tree_utils.CompactTree of the same paths.
+
+    :param files: Number of synthetic scene paths
+    :type files: int
+    :return: Dictionary with the `baseline` and `compact` bytes, their `ratio` and the build time of the tree
+    :rtype: dict
+    """
+    tracemalloc.start()
+    try:
+        paths = list(_iterScenePaths(files))
+        baseline = tracemalloc.get_traced_memory()[0]
+        del paths
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        tree = tree_utils.CompactTree()
+        for path in _iterScenePaths(files):
+            tree.add(path)
+        tree.freeze()
+        elapsed = time.perf_counter() - start
+        compact = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {"files": files, "baseline": baseline, "compact": compact, "ratio": float(baseline) / compact, "build": elapsed}
+
+def _getCommit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runBenchmarks(config=None, latency=0.0, repeat=5, launcher=True, root=None, tree_files=0):
+    """
+    Generates synthetic libraries and times the listing functions and the launcher.
+
+    :param config: Breadth of the synthetic libraries, see DEFAULT_CONFIG
+    :type config: dict, optional
+    :param latency: Seconds added to every filesystem call
+    :type latency: float, optional
+    :param repeat: Number of samples per function
+    :type repeat: int, optional
+    :param launcher: Also time the offscreen launcher
+    :type launcher: bool, optional
+    :param root: Folder for the synthetic libraries, a temporary folder by default
+    :type root: str, optional
+    :param tree_files: Number of paths of the compact tree memory benchmark, skipped when 0
+    :type tree_files: int, optional
+    :return: The benchmark report
+    :rtype: dict
+    """
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    temp_root = root or tempfile.mkdtemp(prefix="pipeline_bench_")
+    environ = dict(os.environ)
+    try:
+        project_lib = "{}/projects".format(temp_root)
+        code_lib = "{}/code".format(temp_root)
+        start = time.perf_counter()
+        scenes = generateProjectLibrary(project_lib, **{k: config[k] for k in ("projects", "asset_types", "assets", "sequences", "shots", "departments", "versions")})
+        generateCodeLibrary(code_lib, config["repos"], config["packages"])
+        generated = time.perf_counter() - start
+
+        os.environ["PIPELINE_PROJECT_LIBRARY"] = project_lib
+        os.environ["PIPELINE_CODE_LIBRARY"] = code_lib
+        os.environ["PIPELINE_CACHE_DIR"] = "{}/cache".format(temp_root)
+        os.environ.pop("PROJECT", None)
+        os.environ.pop("PIPELINE_PROJECT_LIBRARIES", None)
+        os.environ.pop("PIPELINE_CODE_LIBRARIES", None)
+
+        with injectLatency(latency):
+            report = {
+                "commit": _getCommit(),
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": config,
+                "latency": latency,
+                "scenes": scenes,
+                "generate": generated,
+                "functions": benchmarkFunctions(repeat),
+            }
+            if launcher:
+                report["launcher"] = benchmarkLauncher()
+        if tree_files:
+            report["tree_memory"] = benchmarkTreeMemory(tree_files)
+        return report
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+        if root is None:
+            shutil.rmtree(temp_root, ignore_errors=True)
+
+def compareReports(old, new):
+    """
+    Returns the warm and cold median ratios new/old of every function found in both reports.
+
+    :param old: The baseline report
+    :type old: dict
+    :param new: The report to compare
+    :type new: dict
+    :return: Dictionary of function name to (cold ratio, warm ratio)
+    :rtype: dict
+    """
+    ratios = {}
+    for name, timings in new["functions"].items():
+        if name not in old["functions"]:
+            continue
+        base = old["functions"][name]
+        ratios[name] = tuple(timings[kind]["median"] / base[kind]["median"] if base[kind]["median"] else float("inf")
+                             for kind in ("cold", "warm"))
+    return ratios
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline listings against synthetic libraries.")
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument("--{}".format(key.replace("_", "-")), type=int, default=value)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stat/listing to simulate a NAS")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per function")
+    parser.add_argument("--no-launcher", action="store_true", help="skip the offscreen launcher benchmark")
+    parser.add_argument("--tree-files", type=int, default=0, help="also measure the compact tree memory for this many paths")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="print the ratios against a previous JSON report")
+    args = parser.parse_args(argv)
+
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    report = runBenchmarks(config, args.latency, args.repeat, not args.no_launcher, tree_files=args.tree_files)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    for name, timings in sorted(report["functions"].items()):
+        print("{:<45} cold {:9.3f} ms  warm {:9.3f} ms  {:4d} fs calls".format(
+            name, timings["cold"]["median"] * 1000, timings["warm"]["median"] * 1000, timings["fs_calls"]))
+    if "launcher" in report:
+        print("launcher: {}".format(json.dumps(report["launcher"], sort_keys=True)))
+    if "tree_memory" in report:
+        tree = report["tree_memory"]
+        print("tree memory for {} paths: list {:.1f} MB, compact {:.1f} MB, x{:.1f}".format(
+            tree["files"], tree["baseline"] / 1e6, tree["compact"] / 1e6, tree["ratio"]))
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for name, (cold, warm) in sorted(compareReports(old, report).items()):
+            print("{:<45} cold x{:.2f}  warm x{:.2f}".format(name, cold, warm))
+
+if __name__ == "__main__":
+    main()
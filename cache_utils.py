@@ -0,0 +1,371 @@
+import os
+import stat
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_LIST_WORKERS = 8
+
+_fs_calls = 0
+_fs_calls_lock = threading.Lock()
+
+def countFilesystemCall(count=1):
+    """
+    Adds to the counter of filesystem round-trips made by the listing layer.
+
+    :param count: Number of calls to add, defaults to 1
+    :type count: int, optional
+    """
+    global _fs_calls
+    with _fs_calls_lock:
+        _fs_calls += count
+
+def getFilesystemCallCount():
+    """
+    Returns the number of filesystem round-trips made by the listing layer so far.
+
+    :rtype: int
+    """
+    return _fs_calls
+
+def resolvePath(path):
+    """
+    Returns the normalized, absolute form of a path used as a cache key.
+
+    :param path: The path to resolve
+    :type path: str
+    :return: The resolved path
+    :rtype: str
+    """
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+class _CacheEntry(object):
+    __slots__ = ("mtime", "timestamp", "value")
+
+    def __init__(self, mtime, timestamp, value):
+        self.mtime = mtime
+        self.timestamp = timestamp
+        self.value = value
+
+class DirectoryCache(object):
+    """
+    A thread safe LRU cache of directory listings.
+
+    Entries are keyed by the resolved directory and are only trusted while the
+    directory mtime is unchanged and the entry is younger than the ttl.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, directory, loader, kind="entries"):
+        """
+        Returns the cached value for the directory, calling the loader on a miss.
+
+        :param directory: The directory to look up
+        :type directory: str
+        :param loader: Callable taking the resolved directory and returning the value to cache
+        :type loader: callable
+        :param kind: Name of the listing flavour, lets one directory hold several values
+        :type kind: str
+        :return: The cached value, or None if the directory does not exist
+        :rtype: object
+        """
+        path = resolvePath(directory)
+        key = (path, kind)
+
+        countFilesystemCall()
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISDIR(st.st_mode):
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == st.st_mtime and now - entry.timestamp < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            self.misses += 1
+
+        value = loader(path)
+
+        with self._lock:
+            self._entries[key] = _CacheEntry(st.st_mtime, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, path, recursive=True):
+        """
+        Drops the cached entries of a directory.
+
+        :param path: The directory to invalidate
+        :type path: str
+        :param recursive: Also drop every entry below the directory, defaults to True
+        :type recursive: bool, optional
+        :return: Number of entries dropped
+        :rtype: int
+        """
+        path = resolvePath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == path or (recursive and key[0].startswith(prefix))]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of the cache.
+
+        :return: Dictionary with `hits`, `misses`, `entries` and `hit_rate`
+        :rtype: dict
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": float(self.hits) / total if total else 0.0,
+            }
+
+_cache = DirectoryCache()
+_index = None
+
+def getCache():
+    """
+    Returns the shared directory cache used by project_utils and code_utils.
+
+    :return: The shared cache
+    :rtype: DirectoryCache
+    """
+    return _cache
+
+def configureCache(ttl=None, max_entries=None):
+    """
+    Changes the settings of the shared cache.
+
+    :param ttl: Seconds an entry is trusted for
+    :type ttl: float, optional
+    :param max_entries: Maximum number of entries before the least recently used are evicted
+    :type max_entries: int, optional
+    """
+    if ttl is not None:
+        _cache.ttl = ttl
+    if max_entries is not None:
+        _cache.max_entries = max_entries
+
+def setIndex(index):
+    """
+    Sets a persistent index answering the listings before the cache and the disk.
+
+    :param index: Object with a `scan(directory)` method returning a list of DirectoryEntry or None and a `refresh(directory, force, blocking)` method, None to disable
+    :type index: object
+    """
+    global _index
+    _index = index
+
+DirectoryEntry = namedtuple("DirectoryEntry", ["name", "is_dir", "mtime"])
+
+def readDirectory(directory, with_mtime=False):
+    """
+    Returns the entries inside a directory from a single uncached os.scandir pass.
+
+    :param directory: The directory to read
+    :type directory: str
+    :param with_mtime: Also fill in the mtime of every entry, defaults to False
+    :type with_mtime: bool, optional
+    :return: List of DirectoryEntry
+    :rtype: list
+    """
+    entries = []
+    countFilesystemCall()
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            mtime = None
+            if with_mtime:
+                countFilesystemCall()
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    pass
+            entries.append(DirectoryEntry(entry.name, is_dir, mtime))
+    return entries
+
+def _loadEntries(directory):
+    return readDirectory(directory, False)
+
+def _loadEntriesWithMtime(directory):
+    return readDirectory(directory, True)
+
+def scanDirectory(directory, with_mtime=False):
+    """
+    Returns the entries inside a directory from a single os.scandir pass, served
+    from the shared cache when possible.
+
+    :param directory: The directory to scan
+    :type directory: str
+    :param with_mtime: Also fill in the mtime of every entry, costs a stat per entry on posix, defaults to False
+    :type with_mtime: bool, optional
+    :return: List of DirectoryEntry, empty if the directory does not exist
+    :rtype: list
+    """
+    if _index is not None and not with_mtime:
+        entries = _index.scan(directory)
+        if entries is not None:
+            return entries
+
+    if with_mtime:
+        entries = _cache.get(directory, _loadEntriesWithMtime, "stat")
+    else:
+        entries = _cache.get(directory, _loadEntries, "entries")
+    return list(entries) if entries is not None else []
+
+def listDirectory(directory, dirs_only=False, extensions=None):
+    """
+    Returns the names inside a directory, served from the shared cache when possible.
+
+    :param directory: The directory to list
+    :type directory: str
+    :param dirs_only: Only return the sub directories, defaults to False
+    :type dirs_only: bool, optional
+    :param extensions: Only return the files ending with one of these extensions
+    :type extensions: tuple, optional
+    :return: List of names, empty if the directory does not exist
+    :rtype: list
+    """
+    entries = scanDirectory(directory)
+    if dirs_only:
+        return [e.name for e in entries if e.is_dir]
+    if extensions:
+        return [e.name for e in entries if not e.is_dir and e.name.endswith(tuple(extensions))]
+    return [e.name for e in entries]
+
+def walkDirectory(directory, max_depth=None):
+    """
+    Walks a directory tree top down like os.walk, reusing the cached scans.
+
+    :param directory: The directory to walk
+    :type directory: str
+    :param max_depth: Number of levels to descend below the directory, unlimited by default
+    :type max_depth: int, optional
+    :return: Generator of (dirpath, dirnames, filenames) tuples
+    :rtype: generator
+    """
+    stack = [(directory, 0)]
+    while stack:
+        dirpath, depth = stack.pop()
+        entries = scanDirectory(dirpath)
+        dirnames = [e.name for e in entries if e.is_dir]
+        filenames = [e.name for e in entries if not e.is_dir]
+        yield dirpath, dirnames, filenames
+        if max_depth is None or depth < max_depth:
+            for name in reversed(dirnames):
+                stack.append(("{}/{}".format(dirpath, name), depth + 1))
+
+def invalidate(path, recursive=True):
+    """
+    Drops the cached listings of a directory from the shared cache, and lists
+    the directory again in the index when one is set.
+
+    :param path: The directory to invalidate
+    :type path: str
+    :param recursive: Also drop every listing below the directory, defaults to True
+    :type recursive: bool, optional
+    :return: Number of entries dropped
+    :rtype: int
+    """
+    if _index is not None:
+        _index.refresh(path, force=True, blocking=False)
+    return _cache.invalidate(path, recursive)
+
+def clearCache():
+    """
+    Drops every listing from the shared cache.
+    """
+    _cache.clear()
+
+def getCacheStats():
+    """
+    Returns the hit/miss counters of the shared cache.
+
+    :return: Dictionary with `hits`, `misses`, `entries` and `hit_rate`
+    :rtype: dict
+    """
+    return _cache.stats()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _getExecutor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(DEFAULT_LIST_WORKERS)
+        return _executor
+
+def listDirectories(directories, dirs_only=False, extensions=None):
+    """
+    Lists several directories concurrently.
+
+    :param directories: The directories to list
+    :type directories: list
+    :param dirs_only: Only return the sub directories, defaults to False
+    :type dirs_only: bool, optional
+    :param extensions: Only return the files ending with one of these extensions
+    :type extensions: tuple, optional
+    :return: One list of names per directory, in the order of the directories
+    :rtype: list
+    """
+    if len(directories) < 2:
+        return [listDirectory(d, dirs_only, extensions) for d in directories]
+    return list(_getExecutor().map(lambda d: listDirectory(d, dirs_only, extensions), directories))
+
+def mergeListings(listings):
+    """
+    Merges listings by precedence, the names of the first listing come first
+    and a name found in several listings is only kept once.
+
+    :param listings: The listings, by precedence
+    :type listings: list
+    :return: The merged names
+    :rtype: list
+    """
+    if len(listings) == 1:
+        return list(listings[0])
+    seen = set()
+    merged = []
+    for names in listings:
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                merged.append(name)
+    return merged
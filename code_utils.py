@@ -1,22 +1,49 @@
-import os 
+import os
+import threading
+from collections import namedtuple, OrderedDict
 
-def getCodeLibrary():
+import cache_utils
+import config_utils
+
+MAX_SNAPSHOTS = 64
+
+EnvironmentSnapshot = namedtuple("EnvironmentSnapshot", ["selection", "packages", "paths", "environ"])
+
+def getCodeLibraries():
+    """
+    Returns the ordered code library folders, the fastest storage first.
+    See config_utils.getLibraryRoots for where they are configured.
+
+    :return: List of code library folders
+    :rtype: list
+    """
+    return config_utils.getLibraryRoots("code", "D:/pipeline/code")
+
+def getCodeLibrary(repo=None):
     """
-    Returns the code library folder.
+    Returns the code library folder. Given a repo, returns the first library holding it.
 
+    :param repo: The name of the repo
+    :type repo: str, optional
     :return: The code library folder
     :rtype: str
     """
-    return "D:/pipeline/code"
+    roots = getCodeLibraries()
+    if repo and len(roots) > 1:
+        for root in roots:
+            if repo in cache_utils.listDirectory(root, dirs_only=True):
+                return root
+    return roots[0]
 
 def listRepos():
     """
-    Returns a list of the repo folders, as strings.
+    Returns a list of the repo folders, as strings. The libraries are listed
+    concurrently and merged by precedence.
 
     :return: List of repos
     :rtype: list
     """
-    return os.listdir(getCodeLibrary())
+    return cache_utils.mergeListings(cache_utils.listDirectories(getCodeLibraries()))
 
 def listPackages(repo="local"):
     """
@@ -27,11 +54,161 @@ def listPackages(repo="local"):
     :return: List of packages
     :rtype: list
     """
-    directory = "{}/{}".format(getCodeLibrary(), repo)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = "{}/{}".format(getCodeLibrary(repo), repo)
+    return cache_utils.listDirectory(directory)
+
+class PackageIndex(object):
+    """
+    Every package of every repo, listed once. Resolves a package to repo
+    selection into a validated environment snapshot, cached by selection.
+    """
+    def __init__(self):
+        self.repos = []
+        self._libraries = {}
+        self._packages = {}
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+        self.scan()
+
+    def scan(self):
+        """
+        Lists the repos and their packages again, the libraries concurrently,
+        and drops the cached snapshots.
+        """
+        libraries = getCodeLibraries()
+        repos = []
+        repo_libraries = {}
+        for library, names in zip(libraries, cache_utils.listDirectories(libraries, dirs_only=True)):
+            for repo in names:
+                if repo not in repo_libraries:
+                    repo_libraries[repo] = library
+                    repos.append(repo)
+
+        packages = {}
+        listings = cache_utils.listDirectories(["{}/{}".format(repo_libraries[repo], repo) for repo in repos], dirs_only=True)
+        for repo, names in zip(repos, listings):
+            for package in names:
+                packages.setdefault(package, OrderedDict())[repo] = "{}/{}/{}".format(repo_libraries[repo], repo, package)
+
+        with self._lock:
+            self.repos = repos
+            self._libraries = repo_libraries
+            self._packages = packages
+            self._snapshots.clear()
+
+    def listPackages(self, repo=None):
+        """
+        Returns the packages of a repo, or of every repo.
+
+        :param repo: The name of the repo, every repo by default
+        :type repo: str, optional
+        :return: List of packages
+        :rtype: list
+        """
+        if repo is None:
+            return sorted(self._packages)
+        return sorted(package for package, repos in self._packages.items() if repo in repos)
+
+    def getRepos(self, package):
+        """
+        Returns the repos holding a package, by precedence.
+
+        :param package: The name of the package
+        :type package: str
+        :return: List of repos
+        :rtype: list
+        """
+        return list(self._packages.get(package, ()))
+
+    def getPackagePath(self, package, repo):
+        """
+        Returns the folder of a package in a repo.
+
+        :param package: The name of the package
+        :type package: str
+        :param repo: The name of the repo
+        :type repo: str
+        :return: The package folder, None when the repo does not hold the package
+        :rtype: str
+        """
+        return self._packages.get(package, {}).get(repo)
+
+    def resolve(self, selection):
+        """
+        Returns the environment of a package to repo selection, reusing the
+        snapshot of an identical earlier selection.
+
+        :param selection: List of (package, repo) pairs, in load order
+        :type selection: list
+        :raises ValueError: When a repo does not hold its package
+        :return: The snapshot, its `environ` holds the `PACKAGES` and `PACKAGE_PATHS` variables
+        :rtype: EnvironmentSnapshot
+        """
+        key = tuple((package, repo) for package, repo in selection)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                self._snapshots.move_to_end(key)
+                return snapshot
+
+            paths = []
+            for package, repo in key:
+                path = self._packages.get(package, {}).get(repo)
+                if path is None:
+                    raise ValueError("Package {} not found in repo {}".format(package, repo))
+                paths.append(path)
+            packages = tuple(package for package, repo in key)
+            environ = {"PACKAGES": ";".join(packages), "PACKAGE_PATHS": ";".join(paths)}
+            snapshot = EnvironmentSnapshot(key, packages, tuple(paths), environ)
+
+            self._snapshots[key] = snapshot
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+            return snapshot
+
+_package_index = None
+_package_index_lock = threading.Lock()
+
+def getPackageIndex(rescan=False):
+    """
+    Returns the shared package index, scanned on first use.
+
+    :param rescan: List the repos and packages again, defaults to False
+    :type rescan: bool, optional
+    :rtype: PackageIndex
+    """
+    global _package_index
+    with _package_index_lock:
+        if _package_index is None:
+            _package_index = PackageIndex()
+        elif rescan:
+            _package_index.scan()
+        return _package_index
+
+def resolveEnvironment(selection):
+    """
+    Returns the validated environment snapshot of a package to repo selection.
+
+    :param selection: List of (package, repo) pairs, in load order
+    :type selection: list
+    :raises ValueError: When a repo does not hold its package
+    :rtype: EnvironmentSnapshot
+    """
+    return getPackageIndex().resolve(selection)
+
+def applyEnvironment(snapshot, environ=None):
+    """
+    Writes the variables of a snapshot into an environment, read them back
+    with getEnvironmentPackages and getEnvironmentPackagePaths.
+
+    :param snapshot: The resolved snapshot
+    :type snapshot: EnvironmentSnapshot
+    :param environ: The environment to update, defaults to os.environ
+    :type environ: dict, optional
+    """
+    if environ is None:
+        environ = os.environ
+    environ.update(snapshot.environ)
 
 def getEnvironmentPackages():
     """
@@ -41,7 +218,7 @@ def getEnvironmentPackages():
     :rtype: list
     """
     if "PACKAGES" in os.environ:
-        return [pkg for pkg in os.environ["PACKAGES"].split(";")]
+        return [pkg for pkg in os.environ["PACKAGES"].split(";") if pkg]
     else:
         return []
 
@@ -53,6 +230,6 @@ def getEnvironmentPackagePaths():
     :rtype: list
     """
     if "PACKAGE_PATHS" in os.environ:
-        return [path for path in os.environ["PACKAGE_PATHS"].split(";")]
+        return [path for path in os.environ["PACKAGE_PATHS"].split(";") if path]
     else:
         return []
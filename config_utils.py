@@ -0,0 +1,92 @@
+import os
+import json
+import shlex
+import threading
+
+_config = None
+_lock = threading.Lock()
+
+def getConfigPath():
+    """
+    Returns the path of the pipeline configuration file, set through the
+    `PIPELINE_CONFIG` environment variable.
+
+    :return: The configuration file, None when not configured
+    :rtype: str
+    """
+    return os.environ.get("PIPELINE_CONFIG")
+
+def getConfig():
+    """
+    Returns the pipeline configuration, loaded once from the configuration file.
+
+    :return: The configuration, empty when there is no configuration file
+    :rtype: dict
+    """
+    global _config
+    with _lock:
+        if _config is None:
+            path = getConfigPath()
+            if path and os.path.isfile(path):
+                with open(path) as f:
+                    _config = json.load(f)
+            else:
+                _config = {}
+        return _config
+
+def reloadConfig():
+    """
+    Drops the loaded configuration so the next read loads the file again.
+    """
+    global _config
+    with _lock:
+        _config = None
+
+def getLibraryRoots(name, default):
+    """
+    Returns the ordered roots of a library, the fastest storage first.
+
+    The roots are read, by priority, from the `PIPELINE_<NAME>_LIBRARIES`
+    environment variable (separated by `;`), the single root of the
+    `PIPELINE_<NAME>_LIBRARY` environment variable, the `<name>_libraries` list
+    of the configuration file and finally the default.
+
+    :param name: The library name, `project` or `code`
+    :type name: str
+    :param default: The root used when nothing is configured
+    :type default: str
+    :return: List of roots
+    :rtype: list
+    """
+    key = "PIPELINE_{}_LIBRARIES".format(name.upper())
+    if os.environ.get(key):
+        return [root for root in os.environ[key].split(";") if root]
+    key = "PIPELINE_{}_LIBRARY".format(name.upper())
+    if key in os.environ:
+        return [os.environ[key]]
+    roots = getConfig().get("{}_libraries".format(name))
+    if roots:
+        return list(roots)
+    return [default]
+
+def getExecutable(software, default):
+    """
+    Returns the command starting a software, read, by priority, from the
+    `PIPELINE_<SOFTWARE>_EXECUTABLE` environment variable (split like a shell
+    command line), the `<software>_executable` entry of the configuration
+    file (a string or a list) and finally the default.
+
+    :param software: The software name, `maya` or `blender`
+    :type software: str
+    :param default: The executable used when nothing is configured
+    :type default: str
+    :return: The command, a list of arguments
+    :rtype: list
+    """
+    key = "PIPELINE_{}_EXECUTABLE".format(software.upper())
+    if os.environ.get(key):
+        return shlex.split(os.environ[key], posix=os.name != "nt")
+    command = getConfig().get("{}_executable".format(software))
+    if command:
+        return [command] if isinstance(command, str) else list(command)
+    return [default]
@@ -0,0 +1,397 @@
+import time
+from functools import partial
+from PySide2 import QtCore
+
+import cache_utils
+import index_utils
+import manifest_utils
+import metadata_utils
+import project_utils
+import version_utils
+
+LOADING_TEXT = "Loading..."
+PATH_ROLE = QtCore.Qt.UserRole
+COLUMNS = ("Name", "Software", "Saved By", "Modified", "Size", "Disk Usage", "Files")
+# the columns of the department storage rollups, only filled while enabled
+USAGE_COLUMNS = (5, 6)
+
+class FileNode(object):
+    """
+    A node of the file tree model, either the stage root, a department, a scene
+    or a loading placeholder.
+    """
+    __slots__ = ("name", "path", "parent", "kind", "children", "state", "metadata", "usage")
+
+    def __init__(self, name, path, parent, kind):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.kind = kind
+        self.children = []
+        # None until fetched, then `loading` and `loaded`
+        self.state = None
+        # the SceneMetadata of a scene, read in the background
+        self.metadata = None
+        # the (size, files) below a department folder, read in the background
+        self.usage = None
+
+    def row(self):
+        if self.parent is None:
+            return 0
+        return self.parent.children.index(self)
+
+class FileTreeModel(QtCore.QAbstractItemModel):
+    """
+    Lazy model of the departments and scenes of an asset or shot stage folder.
+
+    The departments are listed when the stage folder is set, the scenes of a
+    department only once its node is expanded, newest version first, followed
+    by the header metadata of its scenes. Every listing runs on the dispatcher
+    so the view never waits on the filesystem.
+    """
+    branchChanged = QtCore.Signal()
+    # the department index whose scenes were just listed
+    scenesListed = QtCore.Signal(QtCore.QModelIndex)
+
+    def __init__(self, software, dispatcher, parent=None):
+        super().__init__(parent)
+        self.software = software
+        self.dispatcher = dispatcher
+        self.extensions = project_utils.SCENE_EXTENSIONS.get(software, ())
+        self._root = FileNode("", None, None, "root")
+        self._generation = 0
+        self._show_usage = False
+        # storage_utils, only imported once the rollups are first shown
+        self._storage_utils = None
+
+    # --- population ---
+
+    def setStageDir(self, stage_dir, callback=None):
+        """
+        Shows the departments of a stage folder, None clears the model.
+
+        :param stage_dir: The asset or shot stage folder
+        :type stage_dir: str
+        :param callback: Called once the departments are listed
+        :type callback: callable, optional
+        """
+        self._generation += 1
+        self.beginResetModel()
+        self._root = FileNode("", stage_dir, None, "root")
+        if stage_dir:
+            self._root.children.append(FileNode(LOADING_TEXT, None, self._root, "placeholder"))
+        self.endResetModel()
+
+        if stage_dir:
+            self._root.state = "loading"
+            listed = partial(self._onDepartmentsListed, self._generation, callback)
+            # an unreadable stage folder shows no departments rather than loading forever
+            self.dispatcher.submit("file_tree", listed, self._listDirectory, stage_dir, False,
+                                   on_error=lambda error: listed([]))
+        else:
+            self.dispatcher.cancel("file_tree")
+        self.branchChanged.emit()
+        if not stage_dir and callback is not None:
+            callback()
+
+    def getStageDir(self):
+        """
+        Returns the stage folder shown by the model.
+
+        :rtype: str
+        """
+        return self._root.path
+
+    def _listDirectory(self, directory, scenes, refresh=False):
+        if refresh:
+            # the watcher saw it change, maybe within the same mtime
+            index_utils.refresh(directory, force=True)
+        else:
+            # a publish folder is read from its manifest unless the watcher saw it change
+            names = manifest_utils.listPublished(directory, not scenes, self.extensions if scenes else None)
+            if names is not None:
+                return version_utils.SceneVersions(names).names() if scenes else names
+        if scenes:
+            return version_utils.getSceneVersions(directory, self.extensions).names()
+        return cache_utils.listDirectory(directory, dirs_only=True)
+
+    def _getScenesDir(self, dept):
+        return "{}/{}/{}/scenes".format(self._root.path, dept, self.software)
+
+    def _makeNode(self, parent, name):
+        if parent.kind == "root":
+            return FileNode(name, self._getScenesDir(name), parent, "department")
+        node = FileNode(name, "{}/{}".format(parent.path, name), parent, "scene")
+        node.state = "loaded"
+        return node
+
+    def _onDepartmentsListed(self, generation, callback, names):
+        if generation != self._generation:
+            return
+        self.beginResetModel()
+        self._root.children = [self._makeNode(self._root, name) for name in names]
+        self._root.state = "loaded"
+        self.endResetModel()
+        self.branchChanged.emit()
+        self._fetchUsage()
+        if callback is not None:
+            callback()
+
+    def _onScenesListed(self, generation, node, names):
+        if generation != self._generation:
+            return
+        self._setChildren(node, names)
+        node.state = "loaded"
+        index = self.indexFromNode(node)
+        self.dataChanged.emit(index, index)
+        self.branchChanged.emit()
+        self.scenesListed.emit(index)
+        self._fetchMetadata(node)
+
+    def _setChildren(self, node, names):
+        # remove the vanished rows and insert the new ones at their place, leaving the rest untouched
+        parent_index = self.indexFromNode(node)
+        wanted = set(names)
+        for row in reversed(range(len(node.children))):
+            if node.children[row].name not in wanted:
+                self.beginRemoveRows(parent_index, row, row)
+                del node.children[row]
+                self.endRemoveRows()
+
+        current = set(child.name for child in node.children)
+        for row, name in enumerate(names):
+            if name not in current:
+                self.beginInsertRows(parent_index, row, row)
+                node.children.insert(row, self._makeNode(node, name))
+                self.endInsertRows()
+
+    # --- live updates ---
+
+    def watchedDirectories(self):
+        """
+        Returns the directories whose changes affect the visible rows.
+
+        :return: The stage folder and the scenes folders of the expanded departments
+        :rtype: list
+        """
+        if not self._root.path:
+            return []
+        dirs = [self._root.path]
+        dirs.extend(child.path for child in self._root.children if child.kind == "department" and child.state == "loaded")
+        return dirs
+
+    def refreshDirectories(self, paths):
+        """
+        Lists changed directories again and patches the matching rows.
+
+        :param paths: The resolved directories that changed
+        :type paths: list
+        """
+        if not self._root.path:
+            return
+        nodes = {cache_utils.resolvePath(self._root.path): self._root}
+        for child in self._root.children:
+            if child.kind == "department" and child.state == "loaded":
+                nodes[cache_utils.resolvePath(child.path)] = child
+
+        for path in paths:
+            node = nodes.get(path)
+            if node is None:
+                continue
+            callback = partial(self._onRefreshed, self._generation, node)
+            self.dispatcher.submit("watch:{}".format(path), callback, self._listDirectory, node.path, node.kind == "department", True)
+
+    def _onRefreshed(self, generation, node, names):
+        if generation != self._generation:
+            return
+        self._setChildren(node, names)
+        self.branchChanged.emit()
+        if node.kind == "root":
+            self._fetchUsage()
+        if node.kind == "department":
+            self.scenesListed.emit(self.indexFromNode(node))
+            self._fetchMetadata(node)
+
+    def _fetchMetadata(self, node):
+        paths = [child.path for child in node.children if child.metadata is None]
+        if not paths:
+            return
+        callback = partial(self._onMetadataRead, self._generation, node)
+        self.dispatcher.submit("metadata:{}".format(node.path), callback, metadata_utils.getMetadata, paths)
+
+    def _onMetadataRead(self, generation, node, results):
+        if generation != self._generation or not node.children:
+            return
+        for child in node.children:
+            if child.path in results:
+                child.metadata = results[child.path]
+        parent_index = self.indexFromNode(node)
+        self.dataChanged.emit(self.index(0, 1, parent_index), self.index(len(node.children) - 1, len(COLUMNS) - 1, parent_index))
+
+    def setUsageVisible(self, visible):
+        """
+        Turns the storage rollups of the departments on or off.
+
+        :param visible: Whether the usage columns are filled
+        :type visible: bool
+        """
+        self._show_usage = visible
+        if visible:
+            if self._storage_utils is None:
+                import storage_utils
+                self._storage_utils = storage_utils
+            self._fetchUsage()
+        else:
+            self.dispatcher.cancel("usage")
+
+    def isUsageVisible(self):
+        """
+        Returns whether the storage rollups of the departments are filled.
+
+        :rtype: bool
+        """
+        return self._show_usage
+
+    def _fetchUsage(self):
+        if not self._show_usage or not self._root.path or self._root.state != "loaded":
+            return
+        callback = partial(self._onUsageRead, self._generation)
+        self.dispatcher.submit("usage", callback, self._storage_utils.getFolderUsage, self._root.path)
+
+    def _onUsageRead(self, generation, usage):
+        if generation != self._generation or not self._root.children:
+            return
+        for child in self._root.children:
+            if child.kind == "department":
+                child.usage = usage.get(child.name)
+        self.dataChanged.emit(self.index(0, USAGE_COLUMNS[0]), self.index(len(self._root.children) - 1, USAGE_COLUMNS[-1]))
+
+    # --- helpers ---
+
+    def nodeFromIndex(self, index):
+        """
+        Returns the node behind a model index, the root for an invalid index.
+
+        :rtype: FileNode
+        """
+        if index.isValid():
+            return index.internalPointer()
+        return self._root
+
+    def indexFromNode(self, node):
+        """
+        Returns the model index of a node.
+
+        :rtype: QtCore.QModelIndex
+        """
+        if node is None or node.kind == "root":
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row(), 0, node)
+
+    def departmentOf(self, index):
+        """
+        Returns the department name of a department or scene index.
+
+        :rtype: str
+        """
+        node = self.nodeFromIndex(index)
+        if node.kind == "scene":
+            node = node.parent
+        if node.kind == "department":
+            return node.name
+        return None
+
+    def scenePath(self, index):
+        """
+        Returns the file path of a scene index, None for the other rows.
+
+        :rtype: str
+        """
+        node = self.nodeFromIndex(index)
+        if node.kind == "scene":
+            return node.path
+        return None
+
+    # --- QAbstractItemModel ---
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        node = self.nodeFromIndex(parent)
+        if 0 <= row < len(node.children) and 0 <= column < len(COLUMNS):
+            return self.createIndex(row, column, node.children[row])
+        return QtCore.QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self.indexFromNode(index.internalPointer().parent)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.nodeFromIndex(parent).children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        node = self.nodeFromIndex(parent)
+        if node.kind == "department":
+            return node.state != "loaded" or bool(node.children)
+        return bool(node.children)
+
+    def canFetchMore(self, parent):
+        node = self.nodeFromIndex(parent)
+        return node.kind == "department" and node.state is None
+
+    def fetchMore(self, parent):
+        node = self.nodeFromIndex(parent)
+        if node.kind != "department" or node.state is not None:
+            return
+        node.state = "loading"
+        self.dataChanged.emit(parent, parent)
+        callback = partial(self._onScenesListed, self._generation, node)
+        self.dispatcher.submit("scenes:{}".format(node.path), callback, self._listDirectory, node.path, True,
+                               on_error=lambda error: callback([]))
+
+    def flags(self, index):
+        node = self.nodeFromIndex(index)
+        if node.kind == "placeholder":
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if index.column() in USAGE_COLUMNS:
+            if role == QtCore.Qt.DisplayRole and node.usage is not None:
+                size, files = node.usage
+                if index.column() != USAGE_COLUMNS[0]:
+                    return str(files)
+                return self._storage_utils.formatSize(size)
+            return None
+        if index.column() > 0:
+            if role == QtCore.Qt.DisplayRole and node.metadata is not None:
+                return self._formatMetadata(node.metadata, index.column())
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            if node.kind == "department" and node.state == "loading":
+                return "{} ({})".format(node.name, LOADING_TEXT)
+            return node.name
+        if role == PATH_ROLE:
+            return node.path
+        return None
+
+    def _formatMetadata(self, metadata, column):
+        if column == 1:
+            return metadata.app_version
+        if column == 2:
+            return metadata.saved_by
+        if column == 3:
+            return metadata.saved_at or time.strftime("%Y-%m-%d %H:%M", time.localtime(metadata.mtime))
+        return "{:.1f} MB".format(metadata.size / 1048576.0)
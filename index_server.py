@@ -0,0 +1,272 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+
+import cache_utils
+import code_utils
+import index_utils
+import project_utils
+
+DEFAULT_PORT = 47810
+DEFAULT_INTERVAL = 60.0
+# seconds to wait before trying an unreachable server again
+RETRY_DELAY = 30.0
+
+_EMPTY_COUNTS = {"checked": 0, "listed": 0, "removed": 0}
+
+def getAddress():
+    """
+    Returns the address the index server listens on, a Unix socket path on
+    posix and a localhost (host, port) tuple on Windows. The socket is kept
+    in the cache folder of the user, so each user of a host runs their own
+    server, listing the libraries with their own permissions.
+
+    The `PIPELINE_INDEX_PORT` environment variable forces a localhost port.
+
+    :return: The server address
+    :rtype: str or tuple
+    """
+    if "PIPELINE_INDEX_PORT" in os.environ:
+        return ("127.0.0.1", int(os.environ["PIPELINE_INDEX_PORT"]))
+    if hasattr(socket, "AF_UNIX") and sys.platform != "win32":
+        return "{}/index_server.sock".format(index_utils.getCacheDir())
+    return ("127.0.0.1", DEFAULT_PORT)
+
+def _encodeEntries(entries):
+    if entries is None:
+        return None
+    return [[e.name, e.is_dir, e.mtime] for e in entries]
+
+def _decodeEntries(entries):
+    if entries is None:
+        return None
+    return [cache_utils.DirectoryEntry(name, is_dir, mtime) for name, is_dir, mtime in entries]
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode("utf-8"))
+                response = {"result": self.server.dispatch(request)}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class _ServerMixin(object):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def getPath(self, request):
+        # only the folders of the libraries are served, anything else is refused
+        path = request["path"]
+        resolved = cache_utils.resolvePath(path)
+        for root in self.roots:
+            if resolved == root or resolved.startswith(root.rstrip(os.sep) + os.sep):
+                return path
+        raise ValueError("Not in a library {}".format(path))
+
+    def dispatch(self, request):
+        method = request.get("method")
+        if method == "scan":
+            return _encodeEntries(cache_utils.scanDirectory(self.getPath(request)))
+        if method == "refresh":
+            path = self.getPath(request)
+            cache_utils.getCache().invalidate(path, recursive=False)
+            return index_utils.refresh(path, request.get("force", False))
+        if method == "invalidate":
+            return cache_utils.invalidate(self.getPath(request), request.get("recursive", True))
+        if method == "stats":
+            return {"cache": cache_utils.getCacheStats(), "last_rescan": self.last_rescan}
+        if method == "ping":
+            return "pong"
+        raise ValueError("Unknown method {}".format(method))
+
+class _TCPServer(_ServerMixin, socketserver.ThreadingTCPServer):
+    pass
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(_ServerMixin, socketserver.ThreadingUnixStreamServer):
+        pass
+
+class IndexServer(object):
+    """
+    A long running service owning the cached view of the project and code
+    libraries, answering the listings of every launcher of the user on the
+    host. Only the folders below the configured libraries are served.
+    """
+    def __init__(self, address=None, interval=DEFAULT_INTERVAL, index_path=None):
+        self.address = address or getAddress()
+        self.interval = interval
+        self.index_path = index_path
+        self._server = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Opens the index, starts the background rescans and listens for requests.
+        """
+        index_utils.enable(self.index_path)
+
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self._server = _UnixServer(self.address, _RequestHandler)
+        else:
+            self._server = _TCPServer(self.address, _RequestHandler)
+        self._server.last_rescan = None
+        self._server.roots = [cache_utils.resolvePath(root) for root in project_utils.getProjectLibraries() + code_utils.getCodeLibraries()]
+
+        thread = threading.Thread(target=self._rescanLoop, name="index-rescan")
+        thread.daemon = True
+        thread.start()
+
+    def serveForever(self):
+        """
+        Handles requests until stop is called.
+        """
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stop.set()
+            self._server.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def stop(self):
+        """
+        Stops the background rescans and the request loop.
+        """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _rescanLoop(self):
+        while not self._stop.is_set():
+            start = time.time()
+            counts = index_utils.rescan()
+            self._server.last_rescan = dict(counts, time=start, elapsed=time.time() - start)
+            self._stop.wait(self.interval)
+
+class RemoteIndex(object):
+    """
+    Client side of the index server with the index interface of cache_utils and
+    index_utils. Every request that cannot reach the server returns None, so
+    the listings fall back to the local cache and the disk.
+    """
+    def __init__(self, address=None, timeout=2.0):
+        self.address = address or getAddress()
+        self.timeout = timeout
+        self._local = threading.local()
+        self._retry_at = 0.0
+
+    def _connect(self):
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        return sock, sock.makefile("rb")
+
+    def request(self, method, **kwargs):
+        """
+        Sends a request to the server.
+
+        :param method: One of `scan`, `refresh`, `invalidate`, `stats` or `ping`
+        :type method: str
+        :return: The result, None when the server cannot be reached
+        :rtype: object
+        """
+        if time.time() < self._retry_at:
+            return None
+        kwargs["method"] = method
+        payload = (json.dumps(kwargs) + "\n").encode("utf-8")
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    self._local.conn = conn
+                conn[0].sendall(payload)
+                line = conn[1].readline()
+                if not line:
+                    raise socket.error("Connection closed")
+                response = json.loads(line.decode("utf-8"))
+                break
+            except (OSError, ValueError):
+                self.close()
+                if attempt:
+                    self._retry_at = time.time() + RETRY_DELAY
+                    return None
+        if "error" in response:
+            return None
+        return response["result"]
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+            self._local.conn = None
+
+    def isAvailable(self):
+        """
+        Returns whether the server answers.
+
+        :rtype: bool
+        """
+        return self.request("ping") == "pong"
+
+    def scan(self, directory):
+        return _decodeEntries(self.request("scan", path=directory))
+
+    def refresh(self, directory, force=False, blocking=True):
+        # the server takes the index lock for a single directory, it is always waited for
+        return self.request("refresh", path=directory, force=force) or dict(_EMPTY_COUNTS)
+
+    def rescan(self, root=None):
+        # the server keeps itself fresh in the background
+        return dict(_EMPTY_COUNTS)
+
+def connect(address=None):
+    """
+    Lets project_utils and code_utils answer from a running index server.
+
+    :param address: The server address, see getAddress
+    :type address: str or tuple, optional
+    :return: The connected client, None when no server is running
+    :rtype: RemoteIndex
+    """
+    remote = RemoteIndex(address)
+    if not remote.isAvailable():
+        return None
+    index_utils.setIndex(remote)
+    return remote
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the project and code library listings to the launchers on this host.")
+    parser.add_argument("--port", type=int, help="listen on this localhost port instead of the default address")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between two background rescans")
+    parser.add_argument("--index", help="path of the index database")
+    args = parser.parse_args(argv)
+
+    address = ("127.0.0.1", args.port) if args.port else None
+    server = IndexServer(address, args.interval, args.index)
+    server.start()
+    print("Index server listening on {}".format(server.address))
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+import cache_utils
+import project_utils
+
+# levels below the project library down to the scenes folders
+MAX_DEPTH = 8
+# listed directories written per transaction by a rescan
+WRITE_BATCH = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    kind TEXT,
+    scanned REAL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    parent TEXT,
+    name TEXT,
+    is_dir INTEGER,
+    PRIMARY KEY (parent, name)
+);
+CREATE INDEX IF NOT EXISTS directories_kind ON directories (kind);
+"""
+
+_ENTITY_KINDS = {
+    "assets": ("asset_type", "asset"),
+    "shots": ("sequence", "shot"),
+}
+
+def getCacheDir():
+    """
+    Returns the local folder the pipeline caches are written to.
+
+    :return: The cache folder
+    :rtype: str
+    """
+    if "PIPELINE_CACHE_DIR" in os.environ:
+        return os.environ["PIPELINE_CACHE_DIR"]
+    if sys.platform == "win32" and "LOCALAPPDATA" in os.environ:
+        return "{}/pipeline".format(os.environ["LOCALAPPDATA"])
+    return "{}/.cache/pipeline".format(os.path.expanduser("~"))
+
+def getDefaultIndexPath():
+    """
+    Returns the path of the project index database.
+
+    :return: The database path
+    :rtype: str
+    """
+    return "{}/project_index.db".format(getCacheDir())
+
+def classifyPath(parts):
+    """
+    Returns the kind of folder found at the given parts below the project library.
+
+    :param parts: The folder names below the project library
+    :type parts: list
+    :return: One of `project`, `asset_type`, `asset`, `sequence`, `shot`, `stage`, `department`, `app`, `scenes` or None
+    :rtype: str
+    """
+    depth = len(parts)
+    if depth == 1:
+        return "project"
+    if depth < 3 or parts[1] not in _ENTITY_KINDS:
+        return None
+    if depth <= 4:
+        return _ENTITY_KINDS[parts[1]][depth - 3]
+    return {5: "stage", 6: "department", 7: "app", 8: "scenes"}.get(depth)
+
+class ProjectIndex(object):
+    """
+    A persistent SQLite index of the directory listings below the project libraries.
+    """
+    def __init__(self, path=None, roots=None):
+        self.path = path or getDefaultIndexPath()
+        self.roots = roots
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # the directories to list again whatever their mtime, see refresh
+        self._stale = set()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection().executescript(_SCHEMA)
+
+    def getRoots(self):
+        """
+        Returns the resolved project libraries the index covers.
+
+        :rtype: list
+        """
+        return [cache_utils.resolvePath(root) for root in self.roots or project_utils.getProjectLibraries()]
+
+    def _getLibrary(self, path):
+        roots = self.getRoots()
+        for root in roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return roots[0]
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def scan(self, directory):
+        """
+        Returns the indexed entries of a directory. The directory is stat'ed
+        and listed again first when its mtime changed since it was indexed, or
+        left to the cache while another rescan is writing.
+
+        :param directory: The directory to look up
+        :type directory: str
+        :return: List of DirectoryEntry, or None if the directory is not indexed
+        :rtype: list
+        """
+        path = cache_utils.resolvePath(directory)
+        conn = self._connection()
+        row = conn.execute("SELECT mtime FROM directories WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        cache_utils.countFilesystemCall()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if row[0] != mtime or path in self._stale:
+            # the cache answers rather than waiting on a rescan writing
+            if self.refresh(path, blocking=False) is None:
+                return None
+            if conn.execute("SELECT 1 FROM directories WHERE path = ?", (path,)).fetchone() is None:
+                return None
+        rows = conn.execute("SELECT name, is_dir FROM entries WHERE parent = ?", (path,)).fetchall()
+        return [cache_utils.DirectoryEntry(name, bool(is_dir), None) for name, is_dir in rows]
+
+    def listKind(self, kind):
+        """
+        Returns the indexed directories of one kind, see classifyPath.
+
+        :param kind: The kind of directory
+        :type kind: str
+        :return: List of resolved paths
+        :rtype: list
+        """
+        rows = self._connection().execute("SELECT path FROM directories WHERE kind = ? ORDER BY path", (kind,))
+        return [row[0] for row in rows]
+
+    def listSceneFiles(self):
+        """
+        Returns every indexed scene file.
+
+        :return: List of resolved scene paths
+        :rtype: list
+        """
+        rows = self._connection().execute(
+            "SELECT e.parent, e.name FROM entries e JOIN directories d ON e.parent = d.path "
+            "WHERE d.kind = 'scenes' AND e.is_dir = 0 ORDER BY e.parent, e.name")
+        return [os.path.join(parent, name) for parent, name in rows]
+
+    def _removeTree(self, conn, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        conn.execute("DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix))
+        conn.execute("DELETE FROM entries WHERE parent = ? OR substr(parent, 1, ?) = ?", (path, len(prefix), prefix))
+
+    def rescan(self, root=None, max_depth=None, blocking=True):
+        """
+        Brings the index up to date with the disk. Every indexed directory is
+        stat'ed but only the directories whose mtime changed are listed again.
+        The listings are written in short batches, so the readers and the
+        other rescans never wait for a whole crawl.
+
+        :param root: The directory to rescan, defaults to every project library
+        :type root: str, optional
+        :param max_depth: Number of levels to descend below the root, defaults to the scenes folders
+        :type max_depth: int, optional
+        :param blocking: Wait for another rescan writing a directory, defaults to True
+        :type blocking: bool, optional
+        :return: Dictionary with the number of `checked`, `listed` and `removed` directories, None when not `blocking` and another rescan was writing
+        :rtype: dict
+        """
+        if root is None:
+            counts = {"checked": 0, "listed": 0, "removed": 0}
+            for library in self.getRoots():
+                for key, value in self.rescan(library, max_depth).items():
+                    counts[key] += value
+            return counts
+
+        root = cache_utils.resolvePath(root)
+        library = self._getLibrary(root)
+        base_depth = len(os.path.relpath(root, library).split(os.sep)) if root != library else 0
+        if max_depth is None:
+            max_depth = MAX_DEPTH - base_depth
+        counts = {"checked": 0, "listed": 0, "removed": 0}
+
+        conn = self._connection()
+        pending = []
+        stack = [(root, 0)]
+        while stack:
+            path, depth = stack.pop()
+            counts["checked"] += 1
+            cache_utils.countFilesystemCall()
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                pending.append((path, None, None, None))
+                counts["removed"] += 1
+                continue
+
+            row = conn.execute("SELECT mtime FROM directories WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] == mtime and path not in self._stale:
+                rows = conn.execute("SELECT name FROM entries WHERE parent = ? AND is_dir = 1", (path,))
+                children = [r[0] for r in rows]
+            else:
+                # listed outside the lock, only the writes hold it
+                try:
+                    entries = cache_utils.readDirectory(path)
+                except OSError:
+                    continue
+                children = [e.name for e in entries if e.is_dir]
+                parts = os.path.relpath(path, library).split(os.sep) if path != library else []
+                pending.append((path, mtime, classifyPath(parts), entries))
+                counts["listed"] += 1
+
+            if len(pending) >= WRITE_BATCH and not self._write(conn, pending, counts, blocking):
+                return None
+            if depth < max_depth:
+                for name in children:
+                    stack.append((os.path.join(path, name), depth + 1))
+        if not self._write(conn, pending, counts, blocking):
+            return None
+        return counts
+
+    def _write(self, conn, pending, counts, blocking):
+        # one short transaction per batch of listed directories
+        if not pending:
+            return True
+        if not self._write_lock.acquire(blocking):
+            return False
+        try:
+            for path, mtime, kind, entries in pending:
+                if entries is None:
+                    self._removeTree(conn, path)
+                    continue
+                # drop the sub trees that disappeared since the last scan
+                children = set(e.name for e in entries if e.is_dir)
+                rows = conn.execute("SELECT name FROM entries WHERE parent = ? AND is_dir = 1", (path,))
+                for name in set(r[0] for r in rows) - children:
+                    self._removeTree(conn, os.path.join(path, name))
+                    counts["removed"] += 1
+                conn.execute("DELETE FROM entries WHERE parent = ?", (path,))
+                conn.executemany("INSERT INTO entries (parent, name, is_dir) VALUES (?, ?, ?)",
+                                 [(path, e.name, int(e.is_dir)) for e in entries])
+                conn.execute("INSERT OR REPLACE INTO directories (path, mtime, kind, scanned) VALUES (?, ?, ?, ?)",
+                             (path, mtime, kind, time.time()))
+            conn.commit()
+        finally:
+            self._write_lock.release()
+        for path, mtime, kind, entries in pending:
+            self._stale.discard(path)
+        del pending[:]
+        return True
+
+    def refresh(self, directory, force=False, blocking=True):
+        """
+        Lists a single directory again when its mtime changed, without descending.
+
+        :param directory: The directory to refresh
+        :type directory: str
+        :param force: List it again even when its mtime did not change, defaults to False
+        :type force: bool, optional
+        :param blocking: Wait for another rescan writing a directory, defaults to True
+        :type blocking: bool, optional
+        :return: Dictionary with the number of `checked`, `listed` and `removed` directories, None when not `blocking` and another rescan was writing
+        :rtype: dict
+        """
+        if force:
+            # scan leaves it to the cache until it is listed again
+            self._stale.add(cache_utils.resolvePath(directory))
+        return self.rescan(directory, max_depth=0, blocking=blocking)
+
+    def clear(self):
+        """
+        Drops everything from the index.
+        """
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM directories")
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+
+_index = None
+
+def getIndex():
+    """
+    Returns the index answering the listings, None when disabled.
+
+    :rtype: ProjectIndex
+    """
+    return _index
+
+def setIndex(index):
+    """
+    Lets project_utils answer from an index.
+
+    :param index: Object with the `scan`, `rescan` and `refresh` methods of ProjectIndex, None to disable
+    :type index: object
+    """
+    global _index
+    _index = index
+    cache_utils.setIndex(index)
+
+def enable(path=None):
+    """
+    Opens the project index and lets project_utils answer from it.
+
+    :param path: The database path, see getDefaultIndexPath
+    :type path: str, optional
+    :return: The opened index
+    :rtype: ProjectIndex
+    """
+    setIndex(ProjectIndex(path))
+    return _index
+
+def disable():
+    """
+    Stops answering the listings from the project index.
+    """
+    setIndex(None)
+
+def rescan(root=None):
+    """
+    Incrementally rescans the enabled index.
+
+    :param root: The directory to rescan, defaults to the whole project library
+    :type root: str, optional
+    :return: Dictionary with the number of `checked`, `listed` and `removed` directories
+    :rtype: dict
+    """
+    if _index is None:
+        return {"checked": 0, "listed": 0, "removed": 0}
+    return _index.rescan(root)
+
+def refresh(directory, force=False):
+    """
+    Refreshes a single directory of the enabled index.
+
+    :param directory: The directory to refresh
+    :type directory: str
+    :param force: List it again even when its mtime did not change, defaults to False
+    :type force: bool, optional
+    :return: Dictionary with the number of `checked`, `listed` and `removed` directories
+    :rtype: dict
+    """
+    if _index is None:
+        return {"checked": 0, "listed": 0, "removed": 0}
+    return _index.refresh(directory, force)
@@ -0,0 +1,321 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from collections import namedtuple, deque
+
+import config_utils
+import index_utils
+
+# finished launches kept in the history, with their logs
+MAX_LAUNCHES = 50
+# seconds between the first two checks of the log while waiting for the first output,
+# doubled after every check up to MAX_POLL_INTERVAL
+POLL_INTERVAL = 0.005
+MAX_POLL_INTERVAL = 0.5
+# seconds the first output is waited for, gui software may never write any
+FIRST_OUTPUT_TIMEOUT = 120.0
+
+SoftwareSpec = namedtuple("SoftwareSpec", ["executables", "extensions", "scene_args"])
+
+SOFTWARE = {
+    "maya": SoftwareSpec({"win32": "C:/Program Files/Autodesk/Maya2020/bin/maya.exe",
+                          "linux": "/usr/autodesk/maya2020/bin/maya"}, (".ma", ".mb"), ["-file"]),
+    "blender": SoftwareSpec({"win32": "C:/Program Files/Blender Foundation/Blender 3.1/blender.exe",
+                             "linux": "blender"}, (".blend",), []),
+}
+
+def getLogDir():
+    """
+    Returns the folder the output of the launched processes is written to.
+
+    :rtype: str
+    """
+    return "{}/launches".format(index_utils.getCacheDir())
+
+def getStubCommand(*args):
+    """
+    Returns the command of the stub software, a python process printing the
+    pipeline variables of its environment, for tests and benchmarks. Point a
+    software at it with the `PIPELINE_<SOFTWARE>_EXECUTABLE` variable.
+
+    :param args: Extra stub arguments, see the `--stub` command line
+    :type args: str
+    :return: The command, a list of arguments
+    :rtype: list
+    """
+    return [sys.executable, os.path.abspath(__file__), "--stub"] + list(args)
+
+def getCommand(software, scene=None):
+    """
+    Returns the command starting a software, opening the scene when the
+    software can read it. See config_utils.getExecutable for how the
+    executable is configured.
+
+    :param software: The software name, a key of SOFTWARE
+    :type software: str
+    :param scene: The scene to open
+    :type scene: str, optional
+    :raises ValueError: When the software is unknown
+    :return: The command, a list of arguments
+    :rtype: list
+    """
+    spec = SOFTWARE.get(software)
+    if spec is None:
+        raise ValueError("Unknown software {}".format(software))
+    default = spec.executables.get(sys.platform, spec.executables["linux"])
+    command = config_utils.getExecutable(software, default)
+    if scene and scene.endswith(spec.extensions):
+        command += spec.scene_args + [scene]
+    return command
+
+def buildEnvironment(layers, base=None):
+    """
+    Returns a new environment made of a base environment and variable layers,
+    the later layers winning. Neither the base nor os.environ are modified.
+
+    :param layers: The dictionaries of variables, in order
+    :type layers: list
+    :param base: The environment to start from, defaults to os.environ
+    :type base: dict, optional
+    :return: The environment
+    :rtype: dict
+    """
+    environ = dict(os.environ if base is None else base)
+    for layer in layers:
+        environ.update((str(key), str(value)) for key, value in layer.items())
+    return environ
+
+class Launch(object):
+    """
+    A started software process and the timings of its launch phases, in
+    seconds: `resolve` to build the environment, `spawn` to create the
+    process, `first_output` from the spawn to the first bytes written and
+    `exit` from the spawn to the end of the process. The log is checked for
+    the first output at doubling intervals, so `first_output` may be late by
+    up to half its value.
+    """
+    def __init__(self, software, command, log_path):
+        self.software = software
+        self.command = command
+        self.log_path = log_path
+        self.started = time.time()
+        self.pid = None
+        self.returncode = None
+        self.error = None
+        self.timings = {}
+        self.process = None
+        self._finished = threading.Event()
+
+    def isRunning(self):
+        """
+        Returns whether the process is still running.
+
+        :rtype: bool
+        """
+        return self.process is not None and not self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the process to end and its timings to be recorded.
+
+        :param timeout: Seconds to wait, forever by default
+        :type timeout: float, optional
+        :return: The exit code, None when still running
+        :rtype: int
+        """
+        self._finished.wait(timeout)
+        return self.returncode
+
+    def readOutput(self, lines=20):
+        """
+        Returns the last lines written by the process.
+
+        :param lines: Number of lines
+        :type lines: int, optional
+        :rtype: list
+        """
+        try:
+            with open(self.log_path, errors="replace") as f:
+                return [line.rstrip("\n") for line in deque(f, lines)]
+        except OSError:
+            return []
+
+    def asDict(self):
+        """
+        Returns the launch as a dictionary for the debug reports.
+
+        :rtype: dict
+        """
+        return {
+            "software": self.software,
+            "command": self.command,
+            "pid": self.pid,
+            "started": self.started,
+            "returncode": self.returncode,
+            "error": self.error,
+            "timings": dict(self.timings),
+            "log": self.log_path,
+        }
+
+class LaunchEngine(object):
+    """
+    Starts software processes with their own environment, never touching the
+    environment of the launcher. Any number of launches may run at once, each
+    one is watched by a thread recording its timings.
+
+    The output goes to a log file rather than a pipe, so the processes keep
+    running after the launcher is closed.
+    """
+    def __init__(self, log_dir=None, max_launches=MAX_LAUNCHES):
+        self.log_dir = log_dir or getLogDir()
+        self.max_launches = max_launches
+        self._launches = []
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def launch(self, software, command, environ, cwd=None, resolve_time=None):
+        """
+        Starts a process and returns without waiting for it.
+
+        :param software: The software name, used in the reports and log name
+        :type software: str
+        :param command: The command, a list of arguments
+        :type command: list
+        :param environ: The complete environment of the process, see buildEnvironment
+        :type environ: dict
+        :param cwd: The working directory of the process
+        :type cwd: str, optional
+        :param resolve_time: Seconds spent building the environment, recorded as the `resolve` phase
+        :type resolve_time: float, optional
+        :raises OSError: When the process cannot be started
+        :return: The launch
+        :rtype: Launch
+        """
+        if not os.path.isdir(self.log_dir):
+            os.makedirs(self.log_dir, exist_ok=True)
+        with self._lock:
+            self._count += 1
+            name = "{}_{}_{}_{}.log".format(software, time.strftime("%Y%m%d_%H%M%S"), os.getpid(), self._count)
+        launch = Launch(software, list(command), "{}/{}".format(self.log_dir, name))
+        if resolve_time is not None:
+            launch.timings["resolve"] = resolve_time
+
+        kwargs = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            # the software must outlive the launcher
+            kwargs["start_new_session"] = True
+        with open(launch.log_path, "wb") as log:
+            start = time.perf_counter()
+            try:
+                launch.process = subprocess.Popen(launch.command, env=environ, cwd=cwd, stdin=subprocess.DEVNULL,
+                                                  stdout=log, stderr=subprocess.STDOUT, close_fds=True, **kwargs)
+            except OSError as e:
+                launch.error = str(e)
+                launch._finished.set()
+                self._addLaunch(launch)
+                raise
+        launch.timings["spawn"] = time.perf_counter() - start
+        launch.pid = launch.process.pid
+
+        thread = threading.Thread(target=self._watch, args=(launch, start), name="launch-{}".format(launch.pid))
+        thread.daemon = True
+        thread.start()
+        self._addLaunch(launch)
+        return launch
+
+    def _watch(self, launch, start):
+        process = launch.process
+        interval = POLL_INTERVAL
+        deadline = start + FIRST_OUTPUT_TIMEOUT
+        try:
+            while time.perf_counter() < deadline:
+                if os.path.getsize(launch.log_path):
+                    launch.timings["first_output"] = time.perf_counter() - start
+                    break
+                try:
+                    process.wait(interval)
+                except subprocess.TimeoutExpired:
+                    interval = min(interval * 2, MAX_POLL_INTERVAL)
+                    continue
+                # exited, maybe after writing its only output
+                if os.path.getsize(launch.log_path):
+                    launch.timings["first_output"] = time.perf_counter() - start
+                break
+        except OSError:
+            # the log was removed, only the exit is left to record
+            pass
+        process.wait()
+        launch.returncode = process.returncode
+        launch.timings["exit"] = time.perf_counter() - start
+        launch._finished.set()
+        self._prune()
+
+    def _addLaunch(self, launch):
+        with self._lock:
+            self._launches.append(launch)
+        self._prune()
+
+    def _prune(self):
+        removed = []
+        with self._lock:
+            # drop the oldest finished launches past the limit
+            finished = [item for item in self._launches if not item.isRunning()]
+            for item in finished[:max(0, len(self._launches) - self.max_launches)]:
+                self._launches.remove(item)
+                removed.append(item)
+        for item in removed:
+            try:
+                os.remove(item.log_path)
+            except OSError:
+                pass
+
+    def getLaunches(self, running=False):
+        """
+        Returns the launches, oldest first.
+
+        :param running: Only return the launches still running, defaults to False
+        :type running: bool, optional
+        :rtype: list
+        """
+        with self._lock:
+            launches = list(self._launches)
+        if running:
+            launches = [launch for launch in launches if launch.isRunning()]
+        return launches
+
+    def getReport(self):
+        """
+        Returns the launches as dictionaries, oldest first.
+
+        :rtype: list
+        """
+        return [launch.asDict() for launch in self.getLaunches()]
+
+_STUB_VARIABLES = ("PROJECT", "ASSET_TYPE", "ASSET", "SEQUENCE", "SHOT", "DEPARTMENT", "PACKAGES", "PACKAGE_PATHS")
+
+def _runStub(args):
+    time.sleep(args.delay)
+    print("stub started: {}".format(" ".join(args.args)))
+    for name in _STUB_VARIABLES + tuple(args.print_env):
+        print("{}={}".format(name, os.environ.get(name, "")))
+    sys.stdout.flush()
+    time.sleep(args.duration)
+    return args.exit_code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand in for a software in launch tests.")
+    parser.add_argument("--stub", action="store_true", help="run as the stub software")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before the first output")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds to run after the first output")
+    parser.add_argument("--exit-code", type=int, default=0, help="the exit code")
+    parser.add_argument("--print-env", action="append", default=[], help="another variable to print")
+    # the other arguments are the ones given to the software, like maya's -file and the scene
+    args, args.args = parser.parse_known_args()
+    if not args.stub:
+        parser.error("only the --stub mode is available")
+    sys.exit(_runStub(args))
@@ -1,26 +1,94 @@
 import sys
 import os
+import json
+import time
+import argparse
+from collections import OrderedDict
 from functools import partial
 from PySide2 import QtCore, QtWidgets, QtGui
 
 import project_utils
 import code_utils
+import cache_utils
+import file_model
+import index_utils
+import prefetch_utils
+import profile_utils
+import refresh_utils
+import search_utils
+import watch_utils
+import worker_utils
+
+# update methods timed when profiling is enabled
+PROFILED_METHODS = [
+    "_updateProject",
+    "_updateDataType",
+    "_updateAssetType",
+    "_updateAsset",
+    "_updateSequence",
+    "_updateShot",
+    "_updateStage",
+    "_updateFileTree",
+    "_setItems",
+    "_buildPackageMenu",
+]
 
 class LauncherWindow(QtWidgets.QWidget):
     def __init__(self, software=""):
         super().__init__()
 
         self.software = software
+        self.dispatcher = worker_utils.TaskDispatcher(self)
+        # created on the first launch, see _getLaunchEngine
+        self.launch_engine = None
+        self.settings = QtCore.QSettings("pipeline", "launcher")
+        # seconds since construction of the startup milestones
+        self.startup_times = {}
+        self._created = time.perf_counter()
+        self._started = False
+        self._print_startup = False
+
+        # wrap the update methods before they are connected to anything
+        profile_utils.instrumentMethods(self, PROFILED_METHODS)
 
         self.setWindowTitle("{} Launcher".format(self.software))
 
-        # create a menu bar
+        # create a menu bar, the package submenus are filled when first opened
         self.menu = QtWidgets.QMenuBar()
         self.pkg_menu = self.menu.addMenu("&Pkg")
-        self._populatePackages()
+        self.pkg_menu.setEnabled(False)
+        self.package_index = None
+        self._package_repos = OrderedDict()
+
+        # storage usage of the departments, off by default as it walks the whole stage folder
+        self.view_menu = self.menu.addMenu("&View")
+        self.usage_action = self.view_menu.addAction("Show Storage Usage")
+        self.usage_action.setCheckable(True)
+        self.view_menu.addAction("Export Storage Usage...", self._exportStorageUsage)
+
+        # hidden debug menu, toggled with Ctrl+Shift+D
+        self.debug_menu = self.menu.addMenu("&Debug")
+        self.debug_menu.menuAction().setVisible(False)
+        self._populateDebugMenu()
+        debug_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self)
+        debug_shortcut.activated.connect(self._toggleDebugMenu)
+
+        # search box over every entity and scene, usable once the index is built in the background
+        self.search_index = None
+        self._search_results = {}
+        self._pending_selection = {}
+        self.search_edit = QtWidgets.QLineEdit()
+        self.search_edit.setPlaceholderText("Search assets, shots and scenes...")
+        self.search_edit.setEnabled(False)
+        self.search_model = QtCore.QStringListModel(self)
+        self.search_completer = QtWidgets.QCompleter(self.search_model, self)
+        self.search_completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+        self.search_completer.setMaxVisibleItems(15)
+        self.search_edit.setCompleter(self.search_completer)
 
         # create layout
         self.main_layout = QtWidgets.QVBoxLayout()
+        self.main_layout.addWidget(self.search_edit)
         self.project_layout = QtWidgets.QGridLayout()
         self.file_layout = QtWidgets.QGridLayout()
         self.main_layout.addLayout(self.project_layout)
@@ -42,13 +110,23 @@ class LauncherWindow(QtWidgets.QWidget):
         self.shot_cb = QtWidgets.QComboBox()
         self.stage_label = QtWidgets.QLabel("Stage:")
         self.stage_cb = QtWidgets.QComboBox()
-        self.file_tree = QtWidgets.QTreeWidget()
-        self.file_tree.setHeaderHidden(True)
+        for name in ("project", "data_type", "asset_type", "asset", "sequence", "shot", "stage"):
+            getattr(self, "{}_cb".format(name)).setObjectName(name)
+        self.file_model = file_model.FileTreeModel(self.software, self.dispatcher, self)
+        self.file_tree = QtWidgets.QTreeView()
+        self.file_tree.header().setStretchLastSection(False)
+        self.file_tree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self.file_tree.setModel(self.file_model)
+        for column in file_model.USAGE_COLUMNS:
+            self.file_tree.setColumnHidden(column, True)
+        self.file_watcher = watch_utils.DirectoryWatcher(self)
+        # warms the stage folders the user is likely to open next
+        self.prefetcher = prefetch_utils.PrefetchScheduler(self.software, self.file_model.extensions)
+        self._tree_visit = None
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.hide()
         self.launch_button = QtWidgets.QPushButton("Launch {}".format(self.software))
 
-        # populate the widgets
-        self._updateAll()
-
         # Add the widgets to the layout
         self.project_layout.addWidget(self.project_label, 0, 0, 1, 1)
         self.project_layout.addWidget(self.project_cb, 0, 1, 1, 5)
@@ -65,16 +143,78 @@ class LauncherWindow(QtWidgets.QWidget):
         self.project_layout.addWidget(self.stage_label, 6, 0, 1, 5)
         self.project_layout.addWidget(self.stage_cb, 6, 1, 1, 5)
         self.file_layout.addWidget(self.file_tree, 0, 0, 5, 5)
+        self.file_layout.addWidget(self.status_label, 5, 0, 1, 5)
         self.file_layout.addWidget(self.launch_button, 6, 0, 1, 5)
         self.main_layout.setMenuBar(self.menu)
 
-        # Connect the widgets to signals
-        self.project_cb.currentIndexChanged.connect(self._updateDataType)
-        self.data_type_cb.currentIndexChanged.connect(self._updateDataTypeWidgets)
-        self.asset_type_cb.currentIndexChanged.connect(self._updateAsset)
-        self.asset_cb.currentIndexChanged.connect(self._updateStage)
-        self.stage_cb.currentIndexChanged.connect(self._updateFileTree)
+        # declare the selection levels, each one is refreshed once per pass after the levels it depends on
+        self.refresh_engine = refresh_utils.RefreshEngine(self)
+        self.refresh_engine.addLevel("project", self._updateProject, cancel=partial(self.dispatcher.cancel, "project"))
+        self.refresh_engine.addLevel("data_type", self._updateDataType)
+        self.refresh_engine.addLevel("asset_type", self._updateAssetType, ("project", "data_type"), partial(self.dispatcher.cancel, "asset_type"))
+        self.refresh_engine.addLevel("asset", self._updateAsset, ("asset_type",), partial(self.dispatcher.cancel, "asset"))
+        self.refresh_engine.addLevel("sequence", self._updateSequence, ("project", "data_type"), partial(self.dispatcher.cancel, "sequence"))
+        self.refresh_engine.addLevel("shot", self._updateShot, ("sequence",), partial(self.dispatcher.cancel, "shot"))
+        self.refresh_engine.addLevel("stage", self._updateStage)
+        self.refresh_engine.addLevel("file_tree", self._updateFileTree, ("asset", "shot", "stage"), partial(self.dispatcher.cancel, "file_tree"))
+        self.refresh_engine.passStarted.connect(self._onRefreshStarted)
+        self.refresh_engine.passFinished.connect(self._onRefreshFinished)
+
+        # Connect the widgets to signals, a user change only refreshes the levels computed from it
+        self.project_cb.currentIndexChanged.connect(self._onProjectChanged)
+        self.data_type_cb.currentIndexChanged.connect(self._onDataTypeChanged)
+        self.asset_type_cb.currentIndexChanged.connect(lambda index: self.refresh_engine.markChanged("asset_type"))
+        self.asset_cb.currentIndexChanged.connect(lambda index: self.refresh_engine.markChanged("asset"))
+        self.sequence_cb.currentIndexChanged.connect(lambda index: self.refresh_engine.markChanged("sequence"))
+        self.shot_cb.currentIndexChanged.connect(lambda index: self.refresh_engine.markChanged("shot"))
+        self.stage_cb.currentIndexChanged.connect(lambda index: self.refresh_engine.markChanged("stage"))
+        self.asset_cb.highlighted.connect(partial(self._onEntityHighlighted, self.asset_cb))
+        self.shot_cb.highlighted.connect(partial(self._onEntityHighlighted, self.shot_cb))
         self.launch_button.clicked.connect(self.launchSoftware)
+        self.usage_action.toggled.connect(self._setUsageVisible)
+        self.file_model.branchChanged.connect(self._onBranchChanged)
+        self.file_model.scenesListed.connect(self._onScenesListed)
+        self.file_watcher.directoriesChanged.connect(self.file_model.refreshDirectories)
+        self.search_edit.textEdited.connect(self._onSearchEdited)
+        self.search_completer.activated[str].connect(self._onSearchActivated)
+
+        self.usage_action.setChecked(self.settings.value("show_usage", False, type=bool))
+
+        # the listings start once the window painted, see paintEvent
+        self.startup_times["window"] = time.perf_counter() - self._created
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._started:
+            self._started = True
+            self.startup_times["first_paint"] = time.perf_counter() - self._created
+            QtCore.QTimer.singleShot(0, self.start)
+
+    def start(self):
+        # connect to the index off the ui thread, then populate the widgets in the background
+        self.dispatcher.submit("index_connect", self._onIndexConnected, self._connectIndex)
+        self._populatePackages()
+
+    def _connectIndex(self):
+        # answer the listings from the host index server, or from the local project index when it can be opened
+        import index_server
+        if index_server.connect() is None:
+            try:
+                index_utils.enable()
+            except Exception as e:
+                return "Project index disabled: {}".format(e)
+        return None
+
+    def _onIndexConnected(self, warning):
+        if warning:
+            QtCore.qWarning(warning)
+        self._updateAll()
+
+    def _onProjectChanged(self, index):
+        project = self._getSelection(self.project_cb)
+        if project:
+            self.settings.setValue("{}/project".format(self.software), project)
+        self.refresh_engine.markChanged("project")
 
     def _updateDataTypeWidgets(self):
         if self.data_type_cb.currentText() == "assets":
@@ -86,7 +226,6 @@ class LauncherWindow(QtWidgets.QWidget):
             self.sequence_cb.hide()
             self.shot_label.hide()
             self.shot_cb.hide()
-            self._updateAssetType()
         elif self.data_type_cb.currentText() == "shots":
             self.sequence_label.show()
             self.sequence_cb.show()
@@ -96,144 +235,506 @@ class LauncherWindow(QtWidgets.QWidget):
             self.asset_type_cb.hide()
             self.asset_label.hide()
             self.asset_cb.hide()
-            self._updateSequence()
-
-    def _updateProject(self):
-        self.project_cb.clear()
-        self.project_cb.addItems(project_utils.listProjects())
 
-        # get the environments
+    def _onDataTypeChanged(self, index):
+        self._updateDataTypeWidgets()
+        self.refresh_engine.markChanged("data_type")
+
+    def _getSelection(self, combo):
+        text = combo.currentText()
+        if text and text != file_model.LOADING_TEXT:
+            return text
+        return None
+
+    def _setLoading(self, combo):
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItem(file_model.LOADING_TEXT)
+        combo.blockSignals(False)
+        combo.setEnabled(False)
+
+    def _setItems(self, combo, items, current=None, done=None):
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItems(items)
+        if current:
+            index = combo.findText(current)
+            if index >= 0:
+                combo.setCurrentIndex(index)
+        combo.blockSignals(False)
+        combo.setEnabled(True)
+        if done is not None:
+            done()
+
+    def _updateCombo(self, combo, done, func, *args, default=None):
+        # keep the current selection when it is still listed, a picked search result wins
+        current = self._pending_selection.pop(combo.objectName(), None) or self._getSelection(combo) or default
+        self._setLoading(combo)
+        self.dispatcher.submit(combo.objectName(), partial(self._setItems, combo, current=current, done=done), func, *args,
+                               on_error=partial(self._onListingFailed, combo, done))
+
+    def _onListingFailed(self, combo, done, error):
+        # leave the level empty so the dependent levels and the pass still finish
+        self._setItems(combo, [])
+        self._showStatus("Could not list the {}: {}".format(combo.objectName().replace("_", " "), error.strip().splitlines()[-1]))
+        done()
+
+    def _showStatus(self, text):
+        self.status_label.setText(text)
+        self.status_label.setVisible(bool(text))
+
+    def _onRefreshStarted(self, action):
+        self._showStatus("")
+        self.prefetcher.pause()
+
+    def _updateProject(self, done):
+        # get the environments, then the project of the last session
         if "PROJECT" in os.environ:
             project = os.environ["PROJECT"]
         else:
-            project = None
-        
-        if project:
-            index = self.project_cb.findText(project)
-            self.project_cb.setCurrentIndex(index)
-
-    def _updateDataType(self):
-        self.data_type_cb.clear()
-        self.data_type_cb.addItems(["assets", "shots"])
-
-    def _updateAssetType(self):
-        self.asset_type_cb.clear()
-        self.asset_type_cb.addItems(project_utils.listAssetTypes(self.project_cb.currentText()))
-
-    def _updateAsset(self):
-        self.asset_cb.clear()
-        self.asset_cb.addItems(project_utils.listAssets(self.project_cb.currentText(), self.asset_type_cb.currentText()))
-    
-    def _updateSequence(self):
-        self.sequence_cb.clear()
-        self.sequence_cb.addItems(project_utils.listSequences(self.project_cb.currentText()))
-    
-    def _updateShot(self):
-        self.shot_cb.clear()
-        self.shot_cb.addItems(project_utils.listShots(self.project_cb.currentText(), self.sequence_cb.currentText()))
-
-    def _updateStage(self):
-        self.stage_cb.clear()
-        self.stage_cb.addItems(["work", "publish"])
-        self._updateFileTree()
-
-    def _updateFileTree(self):
-        # clear the tree
-        self.file_tree.clear()
+            project = self.settings.value("{}/project".format(self.software))
+
+        self._updateCombo(self.project_cb, done, project_utils.listProjects, default=project)
 
+    def _updateDataType(self, done):
+        if self.data_type_cb.count() == 0:
+            self.data_type_cb.blockSignals(True)
+            self.data_type_cb.addItems(["assets", "shots"])
+            self.data_type_cb.blockSignals(False)
+        self._updateDataTypeWidgets()
+        done()
+
+    def _updateAssetType(self, done):
+        if self.data_type_cb.currentText() != "assets":
+            done()
+            return
+        self._updateCombo(self.asset_type_cb, done, project_utils.listAssetTypes, self.project_cb.currentText())
+
+    def _updateAsset(self, done):
+        if self.data_type_cb.currentText() != "assets":
+            done()
+            return
+        self._updateCombo(self.asset_cb, done, project_utils.listAssets, self.project_cb.currentText(), self.asset_type_cb.currentText())
+
+    def _updateSequence(self, done):
+        if self.data_type_cb.currentText() != "shots":
+            done()
+            return
+        self._updateCombo(self.sequence_cb, done, project_utils.listSequences, self.project_cb.currentText())
+
+    def _updateShot(self, done):
+        if self.data_type_cb.currentText() != "shots":
+            done()
+            return
+        self._updateCombo(self.shot_cb, done, project_utils.listShots, self.project_cb.currentText(), self.sequence_cb.currentText())
+
+    def _updateStage(self, done):
+        if self.stage_cb.count() == 0:
+            self.stage_cb.blockSignals(True)
+            self.stage_cb.addItems(["work", "publish"])
+            self.stage_cb.blockSignals(False)
+        done()
+
+    def _updateFileTree(self, done):
         # get the parameters
         project = self.project_cb.currentText()
         data_type = self.data_type_cb.currentText()
-        asset_type = self.asset_type_cb.currentText()
-        asset = self.asset_cb.currentText()
         stage = self.stage_cb.currentText()
 
+        # the model lists the departments in the background and the scenes on expand
+        if data_type == "assets":
+            stage_dir = project_utils.getAssetStageDir(project, self.asset_type_cb.currentText(), self.asset_cb.currentText(), stage)
+        elif data_type == "shots":
+            stage_dir = project_utils.getShotStageDir(project, self.sequence_cb.currentText(), self.shot_cb.currentText(), stage)
+        else:
+            stage_dir = None
+        self._tree_visit = (self.prefetcher.recordVisit(stage_dir), time.perf_counter()) if stage_dir else None
+        self.file_model.setStageDir(stage_dir, partial(self._onFileTreeLoaded, done))
+
+    def _onFileTreeLoaded(self, done):
+        if self._tree_visit is not None:
+            self.prefetcher.recordLatency(self._tree_visit[0], time.perf_counter() - self._tree_visit[1])
+            self._tree_visit = None
+
+        # open the department of a picked search result, its scenes are selected once listed
+        department = self._pending_selection.pop("department", None)
+        if department:
+            root = QtCore.QModelIndex()
+            for row in range(self.file_model.rowCount(root)):
+                index = self.file_model.index(row, 0, root)
+                if self.file_model.departmentOf(index) == department:
+                    self.file_tree.setCurrentIndex(index)
+                    self.file_tree.expand(index)
+                    break
+            else:
+                self._pending_selection.pop("path", None)
+        done()
+
+    def _onRefreshFinished(self, stats):
+        QtCore.qDebug("Refresh after {} change: {} filesystem calls, levels {}".format(
+            stats["action"], stats["fs_calls"], ", ".join(stats["refreshed"])))
+        self._schedulePrefetch()
+        if "first_refresh" not in self.startup_times:
+            self.startup_times["first_refresh"] = time.perf_counter() - self._created
+            if self._print_startup:
+                print("Startup: {}".format(", ".join("{} {:.0f} ms".format(name, self.startup_times[name] * 1000)
+                                                     for name in ("imports", "window", "first_paint", "first_refresh")
+                                                     if name in self.startup_times)))
+
+    def _getEntityCombo(self):
+        data_type = self.data_type_cb.currentText()
         if data_type == "assets":
-            for dept in project_utils.listAssetDepartments(project, asset_type, asset, stage):
-                dept_tree_item = QtWidgets.QTreeWidgetItem()
-                dept_tree_item.setText(0, dept)
-                self.file_tree.addTopLevelItem(dept_tree_item)
-
-                if self.software == "maya":
-                    scenes = project_utils.listAssetMayaScenes(project, asset_type, asset, stage, dept)
-                elif self.software == "blender":
-                    scenes = project_utils.listAssetBlenderScenes(project, asset_type, asset, stage, dept)
-
-                for scene in scenes:
-                    scene_tree_item = QtWidgets.QTreeWidgetItem()
-                    scene_tree_item.setText(0, scene)
-                    filepath = "{}/{}/assets/{}/{}/{}/{}/{}/scenes/{}".format(project_utils.getProjectLibrary(), project, asset_type, asset, stage, dept, self.software, scene)
-                    scene_tree_item.setData(32, 0, filepath)
-                    dept_tree_item.addChild(scene_tree_item)
+            return self.asset_cb
+        if data_type == "shots":
+            return self.shot_cb
+        return None
+
+    def _getStageDir(self, entity, stage):
+        project = self.project_cb.currentText()
+        if self.data_type_cb.currentText() == "assets":
+            return project_utils.getAssetStageDir(project, self.asset_type_cb.currentText(), entity, stage)
+        return project_utils.getShotStageDir(project, self.sequence_cb.currentText(), entity, stage)
+
+    def _schedulePrefetch(self):
+        # the other stages first, then the neighbours in the order artists step through them
+        combo = self._getEntityCombo()
+        if combo is None or not self._getSelection(combo):
+            self.prefetcher.cancel()
+            return
+        row = combo.currentIndex()
+        stage = self.stage_cb.currentText()
+        stage_dirs = [self._getStageDir(combo.currentText(), self.stage_cb.itemText(i))
+                      for i in range(self.stage_cb.count()) if self.stage_cb.itemText(i) != stage]
+        for offset in (1, -1, 2):
+            if 0 <= row + offset < combo.count():
+                stage_dirs.append(self._getStageDir(combo.itemText(row + offset), stage))
+        self.prefetcher.schedule(stage_dirs)
+
+    def _onEntityHighlighted(self, combo, row):
+        # an entry hovered in the open list is warmed before the neighbours
+        if combo is self._getEntityCombo() and row != combo.currentIndex():
+            self.prefetcher.schedule([self._getStageDir(combo.itemText(row), self.stage_cb.currentText())], "hover")
+
+    def profileStartup(self, start=None):
+        # print the startup milestones once the first refresh finished
+        self._print_startup = True
+        if start is not None:
+            self.startup_times["imports"] = self._created - start
+
+    def _onBranchChanged(self):
+        # watch the visible branch so new versions show up without a rebuild
+        self.file_watcher.setDirectories(self.file_model.watchedDirectories())
+
+    def _onScenesListed(self, department_index):
+        path = self._pending_selection.get("path")
+        if path:
+            for row in range(self.file_model.rowCount(department_index)):
+                index = self.file_model.index(row, 0, department_index)
+                if self.file_model.scenePath(index) == path:
+                    del self._pending_selection["path"]
+                    self.file_tree.setCurrentIndex(index)
+                    return
+
+        # pre-select the newest scene unless the user already picked one
+        current = self.file_tree.currentIndex()
+        if current.isValid() and current != department_index:
+            return
+        newest = self.file_model.index(0, 0, department_index)
+        if newest.isValid():
+            self.file_tree.setCurrentIndex(newest)
+
+    def getCurrentDepartment(self):
+        return self.file_model.departmentOf(self.file_tree.currentIndex())
+
+    def getCurrentScenePath(self):
+        return self.file_model.scenePath(self.file_tree.currentIndex())
 
     def _updateAll(self):
-        self._updateProject()
-        self._updateDataType()
+        self.refresh_engine.refreshAll()
+        self.dispatcher.submit("index", self._onIndexRescanned, index_utils.rescan)
+
+    def _onIndexRescanned(self, counts):
+        if counts["listed"] or counts["removed"]:
+            self.refresh_engine.markDirty("project")
+        self.dispatcher.submit("search", self._onSearchIndexBuilt, search_utils.buildIndex, None, (self.software,))
+
+    def _onSearchIndexBuilt(self, index):
+        self.search_index = index
+        self.search_edit.setEnabled(True)
+
+    def _onSearchEdited(self, text):
+        if self.search_index is None:
+            return
+        entries = self.search_index.search(text)
+        labels = [search_utils.formatLabel(entry) for entry in entries]
+        self._search_results = dict(zip(labels, entries))
+        self.search_model.setStringList(labels)
+        self.search_completer.complete()
+
+    def _onSearchActivated(self, label):
+        entry = self._search_results.get(label)
+        if entry is not None:
+            self.selectSearchEntry(entry)
+
+    def _selectText(self, combo, text):
+        index = combo.findText(text)
+        if index >= 0:
+            combo.blockSignals(True)
+            combo.setCurrentIndex(index)
+            combo.blockSignals(False)
+
+    def selectSearchEntry(self, entry):
+        # the listed levels pick their value up from the pending selection, the
+        # refresh engine coalesces every level into a single pass
+        selection = search_utils.getSelection(entry)
+        self._pending_selection = dict(selection)
+        for name in ("project", "data_type", "stage"):
+            if selection.get(name):
+                self._selectText(getattr(self, "{}_cb".format(name)), self._pending_selection.pop(name))
         self._updateDataTypeWidgets()
-        self._updateAssetType()
-        self._updateAsset()
-        self._updateStage()
+        if "path" in selection or "department" in selection:
+            self.file_tree.setCurrentIndex(QtCore.QModelIndex())
+        self.refresh_engine.markChanged("project")
+        self.refresh_engine.markChanged("data_type")
+        self.refresh_engine.markChanged("stage")
 
     def _populatePackages(self):
-        for repo in code_utils.listRepos():
+        self.pkg_menu.setEnabled(False)
+        self.dispatcher.submit("packages", self._buildPackageMenu, code_utils.getPackageIndex)
+
+    def _buildPackageMenu(self, package_index):
+        self.package_index = package_index
+        self._package_repos = OrderedDict((pkg, "master") for pkg in package_index.listPackages("master"))
+        for repo in package_index.repos:
             action = self.pkg_menu.addAction("Set all to {}".format(repo))
             action.triggered.connect(partial(self.setAllPackages, repo))
         self.pkg_menu.addSeparator()
-        
-        # add all packages within the master repo
-        for pkg in code_utils.listPackages("master"):
-            pkg = self.pkg_menu.addMenu(pkg)
-            action_group = QtWidgets.QActionGroup(self.pkg_menu)
-            for repo in code_utils.listRepos():
-                action = QtWidgets.QAction(repo)
-                action.setCheckable(True)
-                pkg.addAction(action)
-                action_group.addAction(action)
-                if repo == "master":
-                    action.setChecked(True)
+
+        # add all packages within the master repo, their repo actions are created on first show
+        for pkg in self._package_repos:
+            menu = self.pkg_menu.addMenu(pkg)
+            menu.aboutToShow.connect(partial(self._populatePackageMenu, menu, pkg))
+        self.pkg_menu.setEnabled(True)
+
+    def _populatePackageMenu(self, menu, pkg):
+        if menu.actions():
+            return
+        action_group = QtWidgets.QActionGroup(menu)
+        available = self.package_index.getRepos(pkg)
+        for repo in self.package_index.repos:
+            action = menu.addAction(repo)
+            action.setCheckable(True)
+            # a repo without the package cannot be picked for it
+            action.setEnabled(repo in available)
+            action.setChecked(repo == self._package_repos[pkg])
+            action_group.addAction(action)
+            action.triggered.connect(partial(self._setPackageRepo, pkg, repo))
+
+    def _setPackageRepo(self, pkg, repo):
+        self._package_repos[pkg] = repo
 
     def getPackages(self):
-        return [pkg.title() for pkg in self.pkg_menu.findChildren(QtWidgets.QMenu)]
-    
+        return list(self._package_repos)
+
     def getPackageRepos(self):
-        return [action_group.checkedAction().text() for action_group in self.pkg_menu.findChildren(QtWidgets.QActionGroup)]
+        return list(self._package_repos.values())
+
+    def getPackageEnvironment(self):
+        # repeat launches with the same selection reuse the resolved snapshot
+        snapshot = code_utils.resolveEnvironment(list(zip(self.getPackages(), self.getPackageRepos())))
+        return dict(snapshot.environ)
+
+    def getProjectEnvironment(self):
+        environ = {}
+        # the selected scene path carries the whole context
+        scene = self.getCurrentScenePath()
+        context = project_utils.parsePath(scene) if scene else None
+        if context is not None:
+            fields = context.fields
+            environ["PROJECT"] = fields["project"]
+            if "asset" in fields:
+                environ["ASSET"] = fields["asset"]
+                environ["ASSET_TYPE"] = fields["asset_type"]
+            else:
+                environ["SEQUENCE"] = fields["sequence"]
+                environ["SHOT"] = fields["shot"]
+            environ["DEPARTMENT"] = fields["department"]
+            return environ
 
-    def setPackageEnvironments(self):
-        packages = self.getPackages()
-        repos = self.getPackageRepos()
+        environ["PROJECT"] = self.project_cb.currentText()
+        if self.data_type_cb.currentText() == "assets":
+            environ["ASSET"] = self.asset_cb.currentText()
+            environ["ASSET_TYPE"] = self.asset_type_cb.currentText()
+        elif self.data_type_cb.currentText() == "shots":
+            environ["SEQUENCE"] = self.sequence_cb.currentText()
+            environ["SHOT"] = self.shot_cb.currentText()
+
+        department = self.getCurrentDepartment()
+        if department:
+            environ["DEPARTMENT"] = department
+        else:
+            environ["DEPARTMENT"] = "default"
+        return environ
 
-        os.environ["PACKAGES"] = ";".join(packages)
+    def getSoftwareEnvironment(self):
+        return {}
 
-        code_lib = code_utils.getCodeLibrary()
-        package_paths = ""
-        for x, repo in enumerate(repos):
-            package_paths += "{}/{}/{};".format(code_lib, repo, packages[x])
+    def getLaunchEnvironment(self):
+        # a new environment per launch, the one of the launcher is left untouched
+        import launch_utils
+        return launch_utils.buildEnvironment([self.getPackageEnvironment(), self.getProjectEnvironment(),
+                                              self.getSoftwareEnvironment()])
 
-        os.environ["PACKAGE_PATHS"] = package_paths
+    def setPackageEnvironments(self):
+        os.environ.update(self.getPackageEnvironment())
 
     def setProjectEnvironments(self):
-        os.environ["PROJECT"] = self.project_cb.currentText()
-        if self.data_type_cb.currentText() == "assets":
-            os.environ["ASSET"] = self.asset_cb.currentText()
-            os.environ["ASSET_TYPE"] = self.asset_type_cb.currentText()
-        elif self.data_type_cb.currentText() == "shots":
-            os.environ["SEQUENCE"] = self.sequence_cb.currentText()
-            os.environ["SHOT"] = self.shot_cb.currentText()
-
-        current = self.file_tree.currentItem()
-        if current:
-            if current.parent():
-                os.environ["DEPARTMENT"] = current.parent().text(0)
-            else:
-                os.environ["DEPARTMENT"] = current.text(0)
-        else:
-            os.environ["DEPARTMENT"] = "default"
+        os.environ.update(self.getProjectEnvironment())
 
     def setAllPackages(self, repo):
+        for pkg in self._package_repos:
+            if repo in self.package_index.getRepos(pkg):
+                self._package_repos[pkg] = repo
+        # the menus already opened show the new selection
         for action_group in self.pkg_menu.findChildren(QtWidgets.QActionGroup):
             for action in action_group.actions():
-                if action.text() == repo:
+                if action.text() == repo and action.isEnabled():
                     action.setChecked(True)
 
+    def _setUsageVisible(self, visible):
+        self.settings.setValue("show_usage", visible)
+        for column in file_model.USAGE_COLUMNS:
+            self.file_tree.setColumnHidden(column, not visible)
+        self.file_model.setUsageVisible(visible)
+
+    def _exportStorageUsage(self):
+        project = self._getSelection(self.project_cb)
+        if not project:
+            return
+        path = QtWidgets.QFileDialog.getSaveFileName(self, "Export Storage Usage", "{}_storage.csv".format(project),
+                                                     "CSV (*.csv);;JSON (*.json)")[0]
+        if path:
+            # the walk runs in the background, the file is written once done
+            self.dispatcher.submit("usage_export", partial(self._onStorageUsageExported, path), self._computeStorageUsage, project, path)
+
+    def _computeStorageUsage(self, project, path):
+        import storage_utils
+        rows = storage_utils.computeUsage([project])
+        storage_utils.exportUsage(rows, path)
+        return len(rows)
+
+    def _onStorageUsageExported(self, path, count):
+        QtCore.qDebug("Exported the storage usage of {} folders to {}".format(count, path))
+
+    def _populateDebugMenu(self):
+        self.profile_action = self.debug_menu.addAction("Profile Filesystem Calls")
+        self.profile_action.setCheckable(True)
+        self.profile_action.setChecked(profile_utils.isEnabled())
+        self.profile_action.toggled.connect(self._setProfiling)
+        self.debug_menu.addAction("Show Report", self._showDebugReport)
+        self.debug_menu.addAction("Save Report...", self._saveDebugReport)
+        self.debug_menu.addAction("Reset Report", self._resetDebugReport)
+
+    def _toggleDebugMenu(self):
+        action = self.debug_menu.menuAction()
+        action.setVisible(not action.isVisible())
+
+    def _setProfiling(self, enabled):
+        if enabled:
+            profile_utils.enable()
+        else:
+            profile_utils.disable()
+
+    def getDebugReport(self):
+        return {
+            "profile": profile_utils.getReport(),
+            "cache": cache_utils.getCacheStats(),
+            "fs_calls": cache_utils.getFilesystemCallCount(),
+            "last_refresh": self.refresh_engine.last_stats,
+            "startup": self.startup_times,
+            "launches": self.launch_engine.getReport() if self.launch_engine is not None else [],
+            "prefetch": self.prefetcher.stats(),
+        }
+
+    def _showDebugReport(self):
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Debug Report")
+        layout = QtWidgets.QVBoxLayout(dialog)
+        text = QtWidgets.QPlainTextEdit()
+        text.setReadOnly(True)
+        text.setPlainText(json.dumps(self.getDebugReport(), indent=2, sort_keys=True))
+        layout.addWidget(text)
+        dialog.resize(600, 500)
+        dialog.show()
+
+    def _saveDebugReport(self):
+        path = QtWidgets.QFileDialog.getSaveFileName(self, "Save Report", "launcher_report.json", "JSON (*.json)")[0]
+        if path:
+            with open(path, "w") as f:
+                json.dump(self.getDebugReport(), f, indent=2, sort_keys=True)
+
+    def _resetDebugReport(self):
+        recorder = profile_utils.getRecorder()
+        if recorder is not None:
+            recorder.reset()
+
+    def _getLaunchEngine(self):
+        import launch_utils
+        if self.launch_engine is None:
+            self.launch_engine = launch_utils.LaunchEngine()
+        return self.launch_engine
+
     def launchSoftware(self):
-        pass
+        import launch_utils
+        start = time.perf_counter()
+        try:
+            environ = self.getLaunchEnvironment()
+            command = launch_utils.getCommand(self.software, self.getCurrentScenePath())
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Launch Failed", str(e))
+            return None
+        resolve = time.perf_counter() - start
+        try:
+            launch = self._getLaunchEngine().launch(self.software, command, environ, resolve_time=resolve)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, "Launch Failed", "Could not start {}: {}".format(command[0], e))
+            return None
+        QtCore.qDebug("Launched {} (pid {}): resolve {:.1f} ms, spawn {:.1f} ms".format(
+            self.software, launch.pid, resolve * 1000, launch.timings["spawn"] * 1000))
+        return launch
+
+def applyDarkPalette(app):
+    app.setStyle("Fusion")
+
+    # set the color scheme
+    dark_palette = QtGui.QPalette()
+    dark_palette.setColor(QtGui.QPalette.Window, QtGui.QColor(53,53,53))
+    dark_palette.setColor(QtGui.QPalette.WindowText, QtCore.Qt.white)
+    dark_palette.setColor(QtGui.QPalette.Base, QtGui.QColor(25,25,25))
+    dark_palette.setColor(QtGui.QPalette.AlternateBase, QtGui.QColor(53,53,53))
+    dark_palette.setColor(QtGui.QPalette.ToolTipBase, QtCore.Qt.white)
+    dark_palette.setColor(QtGui.QPalette.ToolTipText, QtCore.Qt.white)
+    dark_palette.setColor(QtGui.QPalette.Text, QtCore.Qt.white)
+    dark_palette.setColor(QtGui.QPalette.Button, QtGui.QColor(53,53,53))
+    dark_palette.setColor(QtGui.QPalette.ButtonText, QtCore.Qt.white)
+    dark_palette.setColor(QtGui.QPalette.BrightText, QtCore.Qt.red)
+    dark_palette.setColor(QtGui.QPalette.Link, QtGui.QColor(42, 130, 218))
+    dark_palette.setColor(QtGui.QPalette.Highlight, QtGui.QColor(42, 130, 218))
+    dark_palette.setColor(QtGui.QPalette.HighlightedText, QtCore.Qt.black)
+    app.setPalette(dark_palette)
+
+def main(window_class, argv=None, start=None):
+    argv = sys.argv if argv is None else argv
+    parser = argparse.ArgumentParser(description="Launch {} within a project context.".format(window_class.__name__))
+    parser.add_argument("--profile-startup", action="store_true", help="print the time to first paint and first refresh")
+    args, qt_args = parser.parse_known_args(argv[1:])
+
+    app = QtWidgets.QApplication(argv[:1] + qt_args)
+    applyDarkPalette(app)
+
+    window = window_class()
+    if args.profile_startup:
+        window.profileStartup(start)
+    window.show()
+
+    return app.exec_()
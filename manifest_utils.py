@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+import cache_utils
+import version_utils
+
+# the format of the manifest files, older or newer ones are ignored
+MANIFEST_FORMAT = 2
+PUBLISH_STAGE = "publish"
+# seconds a folder mtime must be old to be recorded, a folder changed within
+# the same mtime after the manifest was written would otherwise look current
+MTIME_GRACE = 2.0
+
+_manifests = {}
+_lock = threading.Lock()
+
+# read once, setting the umask to read it back is not thread safe
+_umask = os.umask(0)
+os.umask(_umask)
+
+def getManifestPath(stage_dir):
+    """
+    Returns the manifest file of a stage folder. It is kept next to the stage
+    folder rather than inside it, so writing it does not change the folder
+    mtime the manifest is validated against.
+
+    :param stage_dir: The asset or shot stage folder
+    :type stage_dir: str
+    :return: The manifest file
+    :rtype: str
+    """
+    stage_dir = stage_dir.replace("\\", "/").rstrip("/")
+    parent, _, stage = stage_dir.rpartition("/")
+    return "{}/.{}_manifest.json".format(parent, stage)
+
+def _mtime(path):
+    cache_utils.countFilesystemCall()
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _recordedMtime(mtime, now):
+    # a folder changed this instant is recorded as changed, so it is listed until the next write
+    if mtime is not None and now - mtime <= MTIME_GRACE:
+        return -1.0
+    return mtime
+
+class Manifest(object):
+    """
+    The departments, apps and scene files of a stage folder, as recorded by
+    the last writeManifest. Every scene is a dictionary with its `name`,
+    `size`, `mtime` and `version`. The mtimes of the stage, department and
+    scenes folders are kept to tell which parts are still current.
+    """
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def revision(self):
+        return self.data["revision"]
+
+    def departments(self):
+        """
+        Returns the department folders.
+
+        :rtype: list
+        """
+        return sorted(self.data["departments"])
+
+    def apps(self, department):
+        """
+        Returns the app folders of a department.
+
+        :rtype: list
+        """
+        return sorted(self.data["departments"].get(department, {}))
+
+    def scenes(self, department, app):
+        """
+        Returns the scene records of a department app folder.
+
+        :rtype: list
+        """
+        return self.data["departments"].get(department, {}).get(app, {}).get("scenes", [])
+
+    def sceneNames(self, department, app, extensions=None):
+        """
+        Returns the scene file names of a department app folder.
+
+        :param extensions: Only return the files ending with one of these extensions
+        :type extensions: tuple, optional
+        :rtype: list
+        """
+        names = [scene["name"] for scene in self.scenes(department, app)]
+        if extensions:
+            names = [name for name in names if name.endswith(tuple(extensions))]
+        return names
+
+    def isCurrent(self, stage_dir, strict=False):
+        """
+        Returns whether the stage folder still matches the manifest. A new
+        department changes the stage folder mtime, a new app folder the
+        department folder mtime and a new scene the scenes folder mtime, so
+        only `strict` covers the whole manifest, at a stat per folder.
+
+        :param stage_dir: The stage folder the manifest describes
+        :type stage_dir: str
+        :param strict: Also check the department and scenes folders, defaults to False
+        :type strict: bool, optional
+        :rtype: bool
+        """
+        if _mtime(stage_dir) != self.data["stage_mtime"]:
+            return False
+        if strict:
+            for department, apps in self.data["departments"].items():
+                if _mtime("{}/{}".format(stage_dir, department)) != self.data["department_mtimes"][department]:
+                    return False
+                for app in apps:
+                    if not self.isScenesCurrent(stage_dir, department, app):
+                        return False
+        return True
+
+    def isScenesCurrent(self, stage_dir, department, app):
+        """
+        Returns whether a scenes folder still matches the manifest, at a
+        single stat of the folder.
+
+        :param stage_dir: The stage folder the manifest describes
+        :type stage_dir: str
+        :param department: The department folder
+        :type department: str
+        :param app: The app folder
+        :type app: str
+        :return: False when the folder changed or is not recorded
+        :rtype: bool
+        """
+        folder = self.data["departments"].get(department, {}).get(app)
+        if folder is None:
+            return False
+        return _mtime("{}/{}/{}/scenes".format(stage_dir, department, app)) == folder["mtime"]
+
+def buildManifest(stage_dir, extensions, revision=1):
+    """
+    Walks a stage folder, bypassing the caches, and returns its manifest.
+
+    :param stage_dir: The asset or shot stage folder
+    :type stage_dir: str
+    :param extensions: Dictionary of the app folders to record and their scene extensions
+    :type extensions: dict
+    :param revision: The revision of the new manifest
+    :type revision: int, optional
+    :return: The manifest, None when the stage folder does not exist
+    :rtype: Manifest
+    """
+    stage_mtime = _mtime(stage_dir)
+    if stage_mtime is None:
+        return None
+    now = time.time()
+    departments = {}
+    department_mtimes = {}
+    for dept in cache_utils.readDirectory(stage_dir):
+        if not dept.is_dir:
+            continue
+        dept_dir = "{}/{}".format(stage_dir, dept.name)
+        department_mtimes[dept.name] = _recordedMtime(_mtime(dept_dir), now)
+        apps = {}
+        for app in cache_utils.readDirectory(dept_dir):
+            if not app.is_dir or app.name not in extensions:
+                continue
+            scenes_dir = "{}/{}/scenes".format(dept_dir, app.name)
+            scenes = []
+            scenes_mtime = _mtime(scenes_dir)
+            if scenes_mtime is not None:
+                cache_utils.countFilesystemCall()
+                with os.scandir(scenes_dir) as it:
+                    for entry in it:
+                        if not entry.name.endswith(extensions[app.name]) or not entry.is_file():
+                            continue
+                        st = entry.stat()
+                        scenes.append({"name": entry.name, "size": st.st_size, "mtime": st.st_mtime,
+                                       "version": version_utils.parseVersion(entry.name)})
+            scenes.sort(key=lambda scene: (scene["version"] is None, scene["version"] or 0, scene["name"]))
+            apps[app.name] = {"mtime": _recordedMtime(scenes_mtime, now), "scenes": scenes}
+        departments[dept.name] = apps
+    return Manifest({
+        "format": MANIFEST_FORMAT,
+        "revision": revision,
+        "written": now,
+        "stage_mtime": _recordedMtime(stage_mtime, now),
+        "department_mtimes": department_mtimes,
+        "departments": departments,
+    })
+
+def writeManifest(stage_dir, extensions):
+    """
+    Records the current content of a stage folder in its manifest, replacing
+    the previous revision atomically so readers never see a partial file.
+
+    :param stage_dir: The asset or shot stage folder
+    :type stage_dir: str
+    :param extensions: Dictionary of the app folders to record and their scene extensions
+    :type extensions: dict
+    :return: The written manifest, None when the stage folder does not exist
+    :rtype: Manifest
+    """
+    path = getManifestPath(stage_dir)
+    previous = _load(path)
+    manifest = buildManifest(stage_dir, extensions, previous.revision + 1 if previous else 1)
+    if manifest is None:
+        return None
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix=".manifest_", suffix=".tmp", dir=directory)
+    try:
+        # mkstemp creates it readable by the owner only, the manifests are shared
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, 0o666 & ~_umask)
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest.data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    with _lock:
+        _manifests.pop(cache_utils.resolvePath(path), None)
+    return manifest
+
+def _load(path):
+    # one open per manifest revision, the parsed manifests are kept while the file is unchanged
+    key = cache_utils.resolvePath(path)
+    mtime = _mtime(path)
+    if mtime is None:
+        return None
+    with _lock:
+        cached = _manifests.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("format") != MANIFEST_FORMAT:
+        return None
+    manifest = Manifest(data)
+    with _lock:
+        _manifests[key] = (mtime, manifest)
+    return manifest
+
+def readManifest(stage_dir, strict=False):
+    """
+    Returns the manifest of a stage folder when it is still current.
+
+    :param stage_dir: The asset or shot stage folder
+    :type stage_dir: str
+    :param strict: Check every recorded folder, see Manifest.isCurrent
+    :type strict: bool, optional
+    :return: The manifest, None when missing, unreadable or stale
+    :rtype: Manifest
+    """
+    manifest = _load(getManifestPath(stage_dir))
+    if manifest is None or not manifest.isCurrent(stage_dir, strict):
+        return None
+    return manifest
+
+def listPublished(directory, dirs_only=False, extensions=None):
+    """
+    Answers the listing of a publish stage folder, or of one of its scenes
+    folders, from the manifest. Each costs a single stat of the listed
+    folder, to check it did not change since the manifest was written.
+
+    :param directory: A `<publish>` or `<publish>/<department>/<app>/scenes` folder
+    :type directory: str
+    :param dirs_only: Only return the sub directories, defaults to False
+    :type dirs_only: bool, optional
+    :param extensions: Only return the files ending with one of these extensions
+    :type extensions: tuple, optional
+    :return: List of names, None when the folder is not covered by a current manifest
+    :rtype: list
+    """
+    parts = directory.replace("\\", "/").rstrip("/").split("/")
+    if parts[-1] == PUBLISH_STAGE:
+        manifest = readManifest(directory)
+        return manifest.departments() if manifest is not None else None
+    if len(parts) > 4 and parts[-1] == "scenes" and parts[-4] == PUBLISH_STAGE:
+        if dirs_only:
+            return None
+        stage_dir = "/".join(parts[:-3])
+        # a scene published since the manifest was written changes the scenes folder only
+        manifest = _load(getManifestPath(stage_dir))
+        if manifest is None or not manifest.isScenesCurrent(stage_dir, parts[-3], parts[-2]):
+            return None
+        return manifest.sceneNames(parts[-3], parts[-2], extensions)
+    return None
+
+def updateManifest(stage_dir, extensions, force=False):
+    """
+    Writes the manifest of a stage folder unless it is current.
+
+    :param stage_dir: The asset or shot stage folder
+    :type stage_dir: str
+    :param extensions: Dictionary of the app folders to record and their scene extensions
+    :type extensions: dict
+    :param force: Write it even when current, defaults to False
+    :type force: bool, optional
+    :return: `written`, `current` or `missing` when there is no stage folder
+    :rtype: str
+    """
+    if not force and readManifest(stage_dir, strict=True) is not None:
+        return "current"
+    return "written" if writeManifest(stage_dir, extensions) is not None else "missing"
+
+if __name__ == "__main__":
+    import argparse
+    import project_utils
+
+    parser = argparse.ArgumentParser(description="Write the publish manifests of existing projects.")
+    parser.add_argument("projects", nargs="*", help="the projects, all projects by default")
+    parser.add_argument("--workers", type=int, default=project_utils.DEFAULT_CRAWL_WORKERS, help="number of entities written at once")
+    parser.add_argument("--force", action="store_true", help="rewrite the manifests that are current")
+    args = parser.parse_args()
+
+    start = time.time()
+    counts = project_utils.backfillManifests(args.projects or None, max_workers=args.workers, force=args.force)
+    print("{written} written, {current} current, {missing} without a publish folder, {failed} failed in {elapsed:.1f}s".format(
+        elapsed=time.time() - start, **counts))
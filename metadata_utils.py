@@ -0,0 +1,290 @@
+import os
+import re
+import json
+import mmap
+import zlib
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_utils
+import index_utils
+
+# bytes read from the start of a scene, the headers never need more
+HEADER_SIZE = 16384
+DEFAULT_METADATA_WORKERS = 4
+
+SceneMetadata = namedtuple("SceneMetadata", ["app", "app_version", "saved_by", "saved_at", "size", "mtime"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    data TEXT
+);
+"""
+
+_MAYA_HEADER = re.compile(rb"^//Maya ASCII (\S+) scene")
+_MAYA_MODIFIED = re.compile(rb"^//Last modified: (.+?)\s*$", re.MULTILINE)
+_MAYA_FILE_INFO = re.compile(rb'^fileInfo "(\w+)" "((?:[^"\\]|\\.)*)";', re.MULTILINE)
+# `BLENDER_v300` before blender 4.2, `BLENDER17-01v0402` after
+_BLEND_HEADER = re.compile(rb"^BLENDER(?:[_-][vV](\d)(\d\d)|\d\d-\d\d[vV](\d\d)(\d\d))")
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def getDefaultStorePath():
+    """
+    Returns the path of the scene metadata database.
+
+    :return: The database path
+    :rtype: str
+    """
+    return "{}/scene_metadata.db".format(index_utils.getCacheDir())
+
+def readHeader(path, size=HEADER_SIZE, use_mmap=False):
+    """
+    Returns the first bytes of a file, never reading the rest of it.
+
+    :param path: The file to read
+    :type path: str
+    :param size: Number of bytes to read, defaults to HEADER_SIZE
+    :type size: int, optional
+    :param use_mmap: Map the file instead of reading it, defaults to False
+    :type use_mmap: bool, optional
+    :return: The header bytes
+    :rtype: bytes
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    return m[:size]
+            except ValueError:
+                # empty files cannot be mapped
+                return b""
+        return f.read(size)
+
+def _parseMayaHeader(header):
+    info = {"app": "maya", "app_version": None, "saved_by": None, "saved_at": None}
+    match = _MAYA_HEADER.match(header)
+    if match:
+        info["app_version"] = match.group(1).decode("utf-8", "replace")
+    match = _MAYA_MODIFIED.search(header)
+    if match:
+        info["saved_at"] = match.group(1).decode("utf-8", "replace")
+    file_info = dict((k.decode("utf-8", "replace"), v.decode("utf-8", "replace")) for k, v in _MAYA_FILE_INFO.findall(header))
+    if "product" in file_info:
+        info["app_version"] = file_info["product"]
+    # maya does not record the user, pipelines usually add one of these
+    for key in ("user", "author", "savedBy"):
+        if key in file_info:
+            info["saved_by"] = file_info[key]
+            break
+    return info
+
+def _parseBlendHeader(header):
+    info = {"app": "blender", "app_version": None, "saved_by": None, "saved_at": None}
+    if header.startswith(_GZIP_MAGIC):
+        # older compressed files, the header is in the first deflate block
+        try:
+            header = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(header, 64)
+        except zlib.error:
+            return info
+    elif header.startswith(_ZSTD_MAGIC):
+        info["app_version"] = "compressed"
+        return info
+    match = _BLEND_HEADER.match(header)
+    if match:
+        major, minor = [g for g in match.groups() if g is not None]
+        info["app_version"] = "Blender {}.{}".format(int(major), int(minor))
+    return info
+
+def _getOwner(st):
+    try:
+        import pwd
+    except ImportError:
+        return None
+    try:
+        return pwd.getpwuid(st.st_uid).pw_name
+    except KeyError:
+        return str(st.st_uid)
+
+def readMetadata(path, st=None, use_mmap=False):
+    """
+    Parses the header of a `.ma` or `.blend` scene.
+
+    :param path: The scene file
+    :type path: str
+    :param st: The stat result of the file, stat'ed when omitted
+    :type st: os.stat_result, optional
+    :param use_mmap: Map the file instead of reading it, defaults to False
+    :type use_mmap: bool, optional
+    :return: The metadata, the fields the header does not hold are None
+    :rtype: SceneMetadata
+    """
+    if st is None:
+        cache_utils.countFilesystemCall()
+        st = os.stat(path)
+    header = readHeader(path, use_mmap=use_mmap)
+    if path.endswith(".blend"):
+        info = _parseBlendHeader(header)
+    elif path.endswith(".ma"):
+        info = _parseMayaHeader(header)
+    else:
+        info = {"app": None, "app_version": None, "saved_by": None, "saved_at": None}
+    if info["saved_by"] is None:
+        info["saved_by"] = _getOwner(st)
+    return SceneMetadata(info["app"], info["app_version"], info["saved_by"], info["saved_at"], st.st_size, st.st_mtime)
+
+class MetadataStore(object):
+    """
+    A persistent SQLite cache of scene metadata, an entry is only trusted while
+    the size and mtime of its file are unchanged.
+    """
+    def __init__(self, path=None):
+        self.path = path or getDefaultStorePath()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def get(self, path, size, mtime):
+        """
+        Returns the stored metadata of a file.
+
+        :param path: The resolved file path
+        :type path: str
+        :param size: The current size of the file
+        :type size: int
+        :param mtime: The current mtime of the file
+        :type mtime: float
+        :return: The metadata, None when missing or stale
+        :rtype: SceneMetadata
+        """
+        row = self._connection().execute("SELECT size, mtime, data FROM metadata WHERE path = ?", (path,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        return SceneMetadata(**json.loads(row[2]))
+
+    def put(self, items):
+        """
+        Stores the metadata of several files.
+
+        :param items: List of (resolved path, SceneMetadata) tuples
+        :type items: list
+        """
+        if not items:
+            return
+        with self._write_lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO metadata (path, size, mtime, data) VALUES (?, ?, ?, ?)",
+                             [(path, meta.size, meta.mtime, json.dumps(meta._asdict())) for path, meta in items])
+            conn.commit()
+
+    def clear(self):
+        """
+        Drops every stored entry.
+        """
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM metadata")
+            conn.commit()
+
+_store = None
+_store_lock = threading.Lock()
+_executor = None
+
+def getStore():
+    """
+    Returns the shared metadata store, opened on first use.
+
+    :rtype: MetadataStore
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataStore()
+        return _store
+
+def setStore(store):
+    """
+    Replaces the shared metadata store.
+
+    :param store: The store, None to open the default one on next use
+    :type store: MetadataStore
+    """
+    global _store
+    with _store_lock:
+        _store = store
+
+def _getExecutor():
+    global _executor
+    with _store_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(DEFAULT_METADATA_WORKERS)
+        return _executor
+
+def getMetadata(paths, use_mmap=False):
+    """
+    Returns the metadata of several scenes. The stored entries are reused, the
+    other headers are parsed on the worker pool and stored.
+
+    :param paths: The scene files
+    :type paths: list
+    :param use_mmap: Map the files instead of reading them, defaults to False
+    :type use_mmap: bool, optional
+    :return: Dictionary of path to SceneMetadata, the unreadable files are left out
+    :rtype: dict
+    """
+    store = getStore()
+    results = {}
+    missing = []
+    for path in paths:
+        cache_utils.countFilesystemCall()
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        meta = store.get(cache_utils.resolvePath(path), st.st_size, st.st_mtime)
+        if meta is not None:
+            results[path] = meta
+        else:
+            missing.append((path, st))
+
+    def read(item):
+        try:
+            return item[0], readMetadata(item[0], item[1], use_mmap)
+        except OSError:
+            return item[0], None
+
+    if len(missing) > 1:
+        parsed = list(_getExecutor().map(read, missing))
+    else:
+        parsed = [read(item) for item in missing]
+    parsed = [(path, meta) for path, meta in parsed if meta is not None]
+    store.put([(cache_utils.resolvePath(path), meta) for path, meta in parsed])
+    results.update(parsed)
+    return results
@@ -0,0 +1,220 @@
+import time
+import threading
+from collections import OrderedDict, deque
+
+import cache_utils
+import version_utils
+
+# stage folders warmed per scheduling, the rest of the targets are dropped
+DEFAULT_BUDGET = 6
+# departments of a stage folder whose scenes are warmed
+MAX_DEPARTMENTS = 8
+# stage folders remembered for the hit rate
+MAX_TRACKED = 512
+# the groups of targets, the first ones are warmed first
+GROUPS = ("hover", "neighbours")
+
+class PrefetchScheduler(object):
+    """
+    Warms the listings of the stage folders the user is likely to open next,
+    on a single background thread so the foreground listings keep the pool.
+
+    Targets are scheduled in groups, scheduling a group again drops its
+    targets that were not warmed yet, so the queue follows the selection. The
+    current target is abandoned between two listings once its group was
+    rescheduled. The warmed folders are remembered to count how many of the
+    folders the user opens were ready, see recordVisit.
+    """
+    def __init__(self, software, extensions=(), budget=DEFAULT_BUDGET, max_departments=MAX_DEPARTMENTS):
+        self.software = software
+        self.extensions = tuple(extensions)
+        self.budget = budget
+        self.max_departments = max_departments
+        self._queues = dict((group, deque()) for group in GROUPS)
+        self._generations = dict((group, 0) for group in GROUPS)
+        self._condition = threading.Condition()
+        self._paused = False
+        self._stopped = False
+        self._current = None
+        self._warmed = OrderedDict()
+        self._stats = {"scheduled": 0, "warmed": 0, "cancelled": 0, "listings": 0,
+                       "hits": 0, "late": 0, "misses": 0}
+        self._latency = {"hit": [], "late": [], "miss": []}
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prefetch")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def schedule(self, stage_dirs, group="neighbours"):
+        """
+        Replaces the targets of a group, the most likely first. Only the first
+        `budget` folders not warmed recently are kept.
+
+        :param stage_dirs: The asset or shot stage folders
+        :type stage_dirs: list
+        :param group: The group of the targets, one of GROUPS
+        :type group: str, optional
+        """
+        ttl = cache_utils.getCache().ttl
+        now = time.time()
+        targets = []
+        for stage_dir in stage_dirs:
+            key = cache_utils.resolvePath(stage_dir)
+            warmed = self._warmed.get(key)
+            if key in targets or (warmed is not None and now - warmed < ttl):
+                continue
+            targets.append(key)
+            if len(targets) >= self.budget:
+                break
+        with self._condition:
+            self._generations[group] += 1
+            self._stats["cancelled"] += len(self._queues[group])
+            self._queues[group].clear()
+            self._queues[group].extend(targets)
+            self._stats["scheduled"] += len(targets)
+            self._paused = False
+            self._condition.notify()
+        self._start()
+
+    def cancel(self, group=None):
+        """
+        Drops the pending targets of a group, of every group by default.
+
+        :param group: The group, one of GROUPS
+        :type group: str, optional
+        """
+        with self._condition:
+            for name in GROUPS if group is None else (group,):
+                self._generations[name] += 1
+                self._stats["cancelled"] += len(self._queues[name])
+                self._queues[name].clear()
+
+    def pause(self):
+        """
+        Holds the warming while the foreground lists, schedule resumes it.
+        """
+        with self._condition:
+            self._paused = True
+
+    def resume(self):
+        """
+        Resumes the warming after pause.
+        """
+        with self._condition:
+            self._paused = False
+            self._condition.notify()
+
+    def stop(self):
+        """
+        Drops every target and ends the background thread.
+        """
+        self.cancel()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _next(self):
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                if not self._paused:
+                    for group in GROUPS:
+                        if self._queues[group]:
+                            self._current = self._queues[group][0]
+                            return group, self._generations[group], self._queues[group].popleft()
+                self._current = None
+                self._condition.wait()
+
+    def _isCurrent(self, group, generation):
+        # a rescheduled group abandons its target, a pause holds it between listings
+        with self._condition:
+            while self._paused and not self._stopped and self._generations[group] == generation:
+                self._condition.wait()
+            return not self._stopped and self._generations[group] == generation
+
+    def _run(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            group, generation, stage_dir = task
+            try:
+                warmed = self._warm(stage_dir, group, generation)
+            except OSError:
+                warmed = False
+            with self._condition:
+                self._current = None
+                if warmed:
+                    self._warmed[stage_dir] = time.time()
+                    self._warmed.move_to_end(stage_dir)
+                    while len(self._warmed) > MAX_TRACKED:
+                        self._warmed.popitem(last=False)
+                    self._stats["warmed"] += 1
+                else:
+                    self._stats["cancelled"] += 1
+
+    def _warm(self, stage_dir, group, generation):
+        # the same listings the file tree asks for, so they land in the shared caches
+        departments = cache_utils.listDirectory(stage_dir, dirs_only=True)
+        self._stats["listings"] += 1
+        for department in departments[:self.max_departments]:
+            if not self._isCurrent(group, generation):
+                return False
+            scenes_dir = "{}/{}/{}/scenes".format(stage_dir, department, self.software)
+            version_utils.getSceneVersions(scenes_dir, self.extensions)
+            self._stats["listings"] += 1
+        return True
+
+    def recordVisit(self, stage_dir):
+        """
+        Counts a stage folder opened by the user against the warmed folders.
+
+        :param stage_dir: The stage folder shown in the file tree
+        :type stage_dir: str
+        :return: `hit` when it was warmed, `late` when it was still being warmed or queued, `miss` otherwise
+        :rtype: str
+        """
+        key = cache_utils.resolvePath(stage_dir)
+        with self._condition:
+            warmed = self._warmed.get(key)
+            if warmed is not None and time.time() - warmed < cache_utils.getCache().ttl:
+                kind = "hit"
+            elif key == self._current or any(key in queue for queue in self._queues.values()):
+                kind = "late"
+            else:
+                kind = "miss"
+            self._stats[{"hit": "hits", "late": "late", "miss": "misses"}[kind]] += 1
+        return kind
+
+    def recordLatency(self, kind, seconds):
+        """
+        Records the time from a selection to its file tree being listed.
+
+        :param kind: The result of recordVisit for the folder
+        :type kind: str
+        :param seconds: The time to list the tree
+        :type seconds: float
+        """
+        with self._condition:
+            self._latency[kind].append(seconds)
+            del self._latency[kind][:-MAX_TRACKED]
+
+    def stats(self):
+        """
+        Returns the counters of the scheduler.
+
+        :return: Dictionary with the `scheduled`, `warmed`, `cancelled`, `listings`, `hits`, `late` and `misses` counts, the `hit_rate` of the visits and the mean `latency` in seconds of each kind of visit
+        :rtype: dict
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            visits = stats["hits"] + stats["late"] + stats["misses"]
+            stats["hit_rate"] = float(stats["hits"]) / visits if visits else 0.0
+            stats["latency"] = dict((kind, sum(values) / len(values) if values else None)
+                                    for kind, values in self._latency.items())
+            stats["pending"] = sum(len(queue) for queue in self._queues.values())
+        return stats
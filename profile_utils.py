@@ -0,0 +1,378 @@
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import logging
+import threading
+import importlib.abc
+import importlib.machinery
+
+# modules whose filesystem calls are recorded while profiling is enabled
+INSTRUMENTED_MODULES = ["cache_utils", "index_utils", "manifest_utils", "metadata_utils", "storage_utils", "snapshot_utils"]
+INSTRUMENTED_CALLS = ("stat", "scandir", "listdir")
+DEFAULT_THRESHOLD = 0.1
+MAX_SAMPLES = 100000
+SLOWEST_PATHS = 50
+
+logger = logging.getLogger("pipeline.profile")
+
+class _Stats(object):
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        # keep a uniform reservoir so long sessions stay bounded
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(duration)
+        else:
+            x = random.randrange(self.count)
+            if x < MAX_SAMPLES:
+                self.samples[x] = duration
+
+    def report(self):
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "p99": percentile(0.99),
+            "max": self.max,
+        }
+
+class _PathStats(object):
+    # only the totals per path, there may be one for every folder of the libraries
+    __slots__ = ("count", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+
+    def report(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+
+class Recorder(object):
+    """
+    Collects the timings of the filesystem operations and of the timed methods.
+    """
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drops every recorded timing.
+        """
+        with self._lock:
+            self._operations = {}
+            self._methods = {}
+            self._paths = {}
+            self._start = time.time()
+
+    def record(self, kind, name, duration, path=None):
+        """
+        Records a single timing.
+
+        :param kind: `operation` for filesystem calls, `method` for timed methods
+        :type kind: str
+        :param name: The operation or method name
+        :type name: str
+        :param duration: Seconds the call took
+        :type duration: float
+        :param path: The path the operation worked on
+        :type path: str, optional
+        """
+        with self._lock:
+            table = self._operations if kind == "operation" else self._methods
+            stats = table.get(name)
+            if stats is None:
+                stats = table[name] = _Stats()
+            stats.add(duration)
+            if path is not None:
+                key = (name, path)
+                stats = self._paths.get(key)
+                if stats is None:
+                    stats = self._paths[key] = _PathStats()
+                stats.add(duration)
+        if duration >= self.threshold:
+            logger.warning("Slow %s %s took %.1f ms%s", kind, name, duration * 1000, " on {}".format(path) if path else "")
+
+    def call(self, name, func, path, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(path, *args, **kwargs)
+        finally:
+            self.record("operation", name, time.perf_counter() - start, str(path))
+
+    def report(self):
+        """
+        Returns the recorded timings.
+
+        :return: Dictionary with the `operations`, `methods` and `slowest_paths` timings, in seconds
+        :rtype: dict
+        """
+        with self._lock:
+            paths = heapq.nlargest(SLOWEST_PATHS, self._paths.items(), key=lambda item: item[1].total)
+            return {
+                "duration": time.time() - self._start,
+                "threshold": self.threshold,
+                "operations": {name: stats.report() for name, stats in self._operations.items()},
+                "methods": {name: stats.report() for name, stats in self._methods.items()},
+                "slowest_paths": [dict(stats.report(), operation=name, path=path) for (name, path), stats in paths],
+            }
+
+class _DirEntryProxy(object):
+    # forwards a DirEntry, its checks that may stat are added to the time of the scandir
+    __slots__ = ("_scan", "_entry")
+
+    def __init__(self, scan, entry):
+        self._scan = scan
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def is_dir(self, *args, **kwargs):
+        return self._scan.time(self._entry.is_dir, *args, **kwargs)
+
+    def is_file(self, *args, **kwargs):
+        return self._scan.time(self._entry.is_file, *args, **kwargs)
+
+    def stat(self, *args, **kwargs):
+        return self._scan.time(self._entry.stat, *args, **kwargs)
+
+class _ScandirProxy(object):
+    """
+    Stands in for a scandir iterator, the directory reads happen while
+    iterating so the scandir is recorded once it is closed or exhausted, with
+    the time spent opening, reading and checking its entries.
+    """
+    def __init__(self, recorder, iterator, path, elapsed):
+        self._recorder = recorder
+        self._iterator = iterator
+        self._path = path
+        self._elapsed = elapsed
+
+    def time(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            entry = self.time(next, self._iterator)
+        except StopIteration:
+            self.close()
+            raise
+        return _DirEntryProxy(self, entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._iterator is not None:
+            self._iterator.close()
+            self._iterator = None
+            self._recorder.record("operation", "scandir", self._elapsed, self._path)
+
+class _OsProxy(object):
+    """
+    Stands in for the `os` module inside an instrumented module, timing the
+    filesystem calls and forwarding everything else.
+    """
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+    def stat(self, path, *args, **kwargs):
+        return self._recorder.call("stat", os.stat, path, *args, **kwargs)
+
+    def scandir(self, path=".", *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            iterator = os.scandir(path, *args, **kwargs)
+        except OSError:
+            self._recorder.record("operation", "scandir", time.perf_counter() - start, str(path))
+            raise
+        return _ScandirProxy(self._recorder, iterator, str(path), time.perf_counter() - start)
+
+    def listdir(self, path=".", *args, **kwargs):
+        return self._recorder.call("listdir", os.listdir, path, *args, **kwargs)
+
+class _Loader(importlib.abc.Loader):
+    # runs the real loader then hands the module the proxy
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        recorder = _recorder
+        if recorder is not None:
+            module.os = _OsProxy(recorder)
+
+class _ImportHook(importlib.abc.MetaPathFinder):
+    """
+    Instruments the modules imported only once profiling is enabled, like
+    storage_utils, without importing them up front.
+    """
+    def find_spec(self, name, path, target=None):
+        if name not in INSTRUMENTED_MODULES:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(name, path)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _Loader(spec.loader)
+        return spec
+
+_recorder = None
+_import_hook = _ImportHook()
+
+def isEnabled():
+    """
+    Returns whether profiling is enabled.
+
+    :rtype: bool
+    """
+    return _recorder is not None
+
+def getRecorder():
+    """
+    Returns the active recorder, None when profiling is disabled.
+
+    :rtype: Recorder
+    """
+    return _recorder
+
+def enable(threshold=None):
+    """
+    Starts recording the filesystem calls of the instrumented modules.
+
+    :param threshold: Seconds above which a call is logged, defaults to `PIPELINE_PROFILE_THRESHOLD` milliseconds or 100 ms
+    :type threshold: float, optional
+    :return: The recorder
+    :rtype: Recorder
+    """
+    global _recorder
+    if threshold is None:
+        if "PIPELINE_PROFILE_THRESHOLD" in os.environ:
+            threshold = float(os.environ["PIPELINE_PROFILE_THRESHOLD"]) / 1000.0
+        else:
+            threshold = DEFAULT_THRESHOLD
+    if _recorder is None:
+        _recorder = Recorder(threshold)
+        proxy = _OsProxy(_recorder)
+        for name in INSTRUMENTED_MODULES:
+            module = sys.modules.get(name)
+            if module is not None:
+                module.os = proxy
+        if _import_hook not in sys.meta_path:
+            sys.meta_path.insert(0, _import_hook)
+    _recorder.threshold = threshold
+    return _recorder
+
+def disable():
+    """
+    Stops recording, the instrumented modules get the plain `os` module back
+    so there is no overhead left.
+    """
+    global _recorder
+    if _import_hook in sys.meta_path:
+        sys.meta_path.remove(_import_hook)
+    for name in INSTRUMENTED_MODULES:
+        module = sys.modules.get(name)
+        if module is not None:
+            module.os = os
+    _recorder = None
+
+def instrumentMethods(obj, names):
+    """
+    Replaces methods of an object by wrappers timing them while profiling is
+    enabled, so profiling may be turned on at any time. Call it before the
+    methods are connected to signals so the connections see the wrappers.
+
+    :param obj: The object to instrument
+    :type obj: object
+    :param names: The method names
+    :type names: list
+    """
+    label = type(obj).__name__
+
+    def wrap(name, method):
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return method(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                recorder.record("method", "{}.{}".format(label, name), time.perf_counter() - start)
+        return wrapper
+
+    for name in names:
+        setattr(obj, name, wrap(name, getattr(obj, name)))
+
+def getReport():
+    """
+    Returns the recorded timings, empty when profiling is disabled.
+
+    :rtype: dict
+    """
+    if _recorder is None:
+        return {}
+    return _recorder.report()
+
+def dumpReport(path):
+    """
+    Writes the recorded timings as JSON.
+
+    :param path: The file to write
+    :type path: str
+    """
+    with open(path, "w") as f:
+        json.dump(getReport(), f, indent=2, sort_keys=True)
+
+# profile from the start of the session when asked through the environment
+if os.environ.get("PIPELINE_PROFILE"):
+    enable()
@@ -1,22 +1,131 @@
-import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-def getProjectLibrary():
+import cache_utils
+import config_utils
+import manifest_utils
+import template_utils
+
+STAGES = ("work", "publish")
+DEFAULT_CRAWL_WORKERS = 8
+SCENE_EXTENSIONS = {
+    "maya": (".ma",),
+    "blender": (".blend",),
+}
+
+def getProjectLibraries():
+    """
+    Returns the ordered project library folders, the fastest storage first.
+    See config_utils.getLibraryRoots for where they are configured.
+
+    :return: List of project library folders
+    :rtype: list
+    """
+    return config_utils.getLibraryRoots("project", "D:/pipeline/projects")
+
+def getProjectLibrary(project=None):
     """
-    Returns the project library folder.
+    Returns the project library folder. Given a project, returns the first
+    library holding it.
 
+    :param project: The name of the project
+    :type project: str, optional
     :return: The project library folder
     :rtype: str
     """
-    return "D:/pipeline/projects"
+    roots = getProjectLibraries()
+    if project and len(roots) > 1:
+        for root in roots:
+            if project in cache_utils.listDirectory(root, dirs_only=True):
+                return root
+    return roots[0]
+
+def _listDirectory(directory, dirs_only=False, extensions=None):
+    # the publish folders are answered by their manifest, the rest by the cached listings
+    names = manifest_utils.listPublished(directory, dirs_only, extensions)
+    if names is None:
+        names = cache_utils.listDirectory(directory, dirs_only, extensions)
+    return names
+
+def _updateEntityManifest(library, project, data_type, group, entity, stage, force):
+    template = "asset" if data_type == "assets" else "shot"
+    directory = "{}/{}".format(library, template_utils.PROJECT_TEMPLATES.format(template, project=project, asset_type=group, asset=entity, sequence=group, shot=entity))
+    return manifest_utils.updateManifest("{}/{}".format(directory, stage), SCENE_EXTENSIONS, force)
+
+def backfillManifests(projects=None, stage=manifest_utils.PUBLISH_STAGE, max_workers=DEFAULT_CRAWL_WORKERS, force=False):
+    """
+    Writes the manifest of every asset and shot stage folder of the given
+    projects concurrently, skipping the ones that are current.
+
+    :param projects: The names of the projects, all projects by default
+    :type projects: list, optional
+    :param stage: The stage folders to write, defaults to `publish`
+    :type stage: str, optional
+    :param max_workers: Number of concurrent writers
+    :type max_workers: int, optional
+    :param force: Rewrite the current manifests too, defaults to False
+    :type force: bool, optional
+    :return: Dictionary with the `written`, `current`, `missing` and `failed` counts
+    :rtype: dict
+    """
+    if projects is None:
+        projects = listProjects()
+    counts = {"written": 0, "current": 0, "missing": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers) as pool:
+        futures = []
+        for project, entities in pool.map(_listEntities, projects):
+            futures.extend(pool.submit(_updateEntityManifest, getProjectLibrary(project), project, data_type, group, entity, stage, force)
+                           for data_type, group, entity in entities)
+        for future in futures:
+            try:
+                counts[future.result()] += 1
+            except OSError:
+                counts["failed"] += 1
+    return counts
+
+def formatPath(template, **fields):
+    """
+    Returns the absolute path of a project template, see template_utils.PROJECT_TEMPLATES.
+
+    :param template: The name of the template, for example `asset_scenes`
+    :type template: str
+    :return: The path, under the library holding the project
+    :rtype: str
+    """
+    return "{}/{}".format(getProjectLibrary(fields.get("project")), template_utils.PROJECT_TEMPLATES.format(template, **fields))
+
+def parsePaths(paths):
+    """
+    Returns the context (project, asset/shot, stage, department, ...) of many
+    paths below the project libraries at once.
+
+    :param paths: The paths to parse
+    :type paths: list
+    :return: One template_utils.PathContext per path, None for the paths matching no template
+    :rtype: list
+    """
+    return template_utils.PROJECT_TEMPLATES.parseMany(paths, getProjectLibraries())
+
+def parsePath(path):
+    """
+    Returns the context of a path below the project libraries.
+
+    :param path: The path to parse
+    :type path: str
+    :return: The context, None when the path matches no template
+    :rtype: template_utils.PathContext
+    """
+    return parsePaths([path])[0]
 
 def listProjects():
     """
-    Returns a list of the project folders, as strings.
+    Returns a list of the project folders, as strings. The libraries are listed
+    concurrently and merged by precedence.
 
     :return: List of projects
     :rtype: list
     """
-    return os.listdir(getProjectLibrary())
+    return cache_utils.mergeListings(cache_utils.listDirectories(getProjectLibraries()))
 
 def listAssetTypes(project):
     """
@@ -27,11 +136,8 @@ def listAssetTypes(project):
     :return: List of asset types
     :rtype: list
     """
-    directory = "{}/{}/assets".format(getProjectLibrary(), project)
-    if os.path.isdir(directory):
-        return [d for d in os.listdir(directory) if os.path.isdir("{}/{}".format(directory, d))]
-    else:
-        return []
+    directory = formatPath("asset_library", project=project)
+    return cache_utils.listDirectory(directory, dirs_only=True)
 
 def listAssets(project, asset_type):
     """
@@ -44,11 +150,8 @@ def listAssets(project, asset_type):
     :return: List of assets
     :rtype: list
     """
-    directory = "{}/{}/assets/{}".format(getProjectLibrary(), project, asset_type)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = formatPath("asset_type", project=project, asset_type=asset_type)
+    return cache_utils.listDirectory(directory)
 
 def listAssetDepartments(project, asset_type, asset, stage="work"):
     """
@@ -65,11 +168,25 @@ def listAssetDepartments(project, asset_type, asset, stage="work"):
     :return: List of asset departments
     :rtype: list
     """
-    directory = "{}/{}/assets/{}/{}/{}/".format(getProjectLibrary(), project, asset_type, asset, stage)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = formatPath("asset_stage", project=project, asset_type=asset_type, asset=asset, stage=stage)
+    return _listDirectory(directory)
+
+def getAssetStageDir(project, asset_type, asset, stage="work"):
+    """
+    Returns the stage folder of an asset.
+
+    :param project: The name of the project
+    :type project: str
+    :param asset_type: The asset type
+    :type asset_type: str
+    :param asset: The name of the asset
+    :type asset: str
+    :param stage: The stage folder. Accepts `work` or `publish`
+    :type stage: str
+    :return: The stage folder
+    :rtype: str
+    """
+    return formatPath("asset_stage", project=project, asset_type=asset_type, asset=asset, stage=stage)
 
 def listAssetMayaScenes(project, asset_type, asset, stage="work", department="default"):
     """
@@ -88,11 +205,8 @@ def listAssetMayaScenes(project, asset_type, asset, stage="work", department="de
     :return: List of maya scenes
     :rtype: list
     """
-    directory = "{}/{}/assets/{}/{}/{}/{}/maya/scenes".format(getProjectLibrary(), project, asset_type, asset, stage, department)
-    if os.path.isdir(directory):
-        return [f for f in os.listdir(directory) if f.endswith(".ma")]
-    else:
-        return []
+    directory = formatPath("asset_scenes", project=project, asset_type=asset_type, asset=asset, stage=stage, department=department, app="maya")
+    return _listDirectory(directory, extensions=SCENE_EXTENSIONS["maya"])
 
 def listAssetBlenderScenes(project, asset_type, asset, stage="work", department="default"):
     """
@@ -111,11 +225,8 @@ def listAssetBlenderScenes(project, asset_type, asset, stage="work", department=
     :return: List of blender scenes
     :rtype: list
     """
-    directory = "{}/{}/assets/{}/{}/{}/{}/blender/scenes".format(getProjectLibrary(), project, asset_type, asset, stage, department)
-    if os.path.isdir(directory):
-        return [f for f in os.listdir(directory) if f.endswith(".blend")]
-    else:
-        return []
+    directory = formatPath("asset_scenes", project=project, asset_type=asset_type, asset=asset, stage=stage, department=department, app="blender")
+    return _listDirectory(directory, extensions=SCENE_EXTENSIONS["blender"])
 
 def listSequences(project):
     """
@@ -126,11 +237,8 @@ def listSequences(project):
     :return: List of sequences
     :rtype: list
     """
-    directory = "{}/{}/shots".format(getProjectLibrary(), project)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = formatPath("shot_library", project=project)
+    return cache_utils.listDirectory(directory)
 
 def listShots(project, sequence):
     """
@@ -143,11 +251,8 @@ def listShots(project, sequence):
     :return: List of shots
     :rtype: list
     """
-    directory = "{}/{}/shots/{}".format(getProjectLibrary(), project, sequence)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = formatPath("sequence", project=project, sequence=sequence)
+    return cache_utils.listDirectory(directory)
 
 def listShotDepartments(project, sequence, shot, stage="work"):
     """
@@ -164,11 +269,25 @@ def listShotDepartments(project, sequence, shot, stage="work"):
     :return: List of asset departments
     :rtype: list
     """
-    directory = "{}/{}/shots/{}/{}/{}/".format(getProjectLibrary(), project, sequence, shot, stage)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = formatPath("shot_stage", project=project, sequence=sequence, shot=shot, stage=stage)
+    return _listDirectory(directory)
+
+def getShotStageDir(project, sequence, shot, stage="work"):
+    """
+    Returns the stage folder of a shot.
+
+    :param project: The name of the project
+    :type project: str
+    :param sequence: The name of the sequence
+    :type sequence: str
+    :param shot: The name of the shot
+    :type shot: str
+    :param stage: The stage folder. Accepts `work` or `publish`
+    :type stage: str
+    :return: The stage folder
+    :rtype: str
+    """
+    return formatPath("shot_stage", project=project, sequence=sequence, shot=shot, stage=stage)
 
 def listShotMayaScenes(project, sequence, shot, stage="work", department="default"):
     """
@@ -187,11 +306,8 @@ def listShotMayaScenes(project, sequence, shot, stage="work", department="defaul
     :return: List of maya scenes
     :rtype: list
     """
-    directory = "{}/{}/shots/{}/{}/{}/{}/maya/scenes".format(getProjectLibrary(), project, sequence, shot, stage, department)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
-    else:
-        return []
+    directory = formatPath("shot_scenes", project=project, sequence=sequence, shot=shot, stage=stage, department=department, app="maya")
+    return _listDirectory(directory, extensions=SCENE_EXTENSIONS["maya"])
 
 def listShotBlenderScenes(project, sequence, shot, stage="work", department="default"):
     """
@@ -207,11 +323,164 @@ def listShotBlenderScenes(project, sequence, shot, stage="work", department="def
     :type stage: str
     :param department: The department name
     :type department: str
-    :return: List blender scenes
+    :return: List of blender scenes
     :rtype: list
     """
-    directory = "{}/{}/shots/{}/{}/{}/{}/blender/scenes".format(getProjectLibrary(), project, sequence, shot, stage, department)
-    if os.path.isdir(directory):
-        return os.listdir(directory)
+    directory = formatPath("shot_scenes", project=project, sequence=sequence, shot=shot, stage=stage, department=department, app="blender")
+    return _listDirectory(directory, extensions=SCENE_EXTENSIONS["blender"])
+
+def _walkEntityTree(directory, stages, apps):
+    tree = {}
+    for stage in stages:
+        stage_dir = "{}/{}".format(directory, stage)
+        # every department and scenes folder is stat'ed, a stat is still cheaper than a listing
+        manifest = manifest_utils.readManifest(stage_dir, strict=True) if stage == manifest_utils.PUBLISH_STAGE else None
+        if manifest is not None:
+            tree[stage] = dict((dept, dict((app, manifest.sceneNames(dept, app)) for app in manifest.apps(dept) if not apps or app in apps))
+                               for dept in manifest.departments())
+            continue
+        departments = {}
+        for dept in cache_utils.listDirectory(stage_dir, dirs_only=True):
+            dept_dir = "{}/{}".format(stage_dir, dept)
+            dept_apps = {}
+            for app in cache_utils.listDirectory(dept_dir, dirs_only=True):
+                if app not in SCENE_EXTENSIONS or (apps and app not in apps):
+                    continue
+                scenes_dir = "{}/{}/scenes".format(dept_dir, app)
+                dept_apps[app] = cache_utils.listDirectory(scenes_dir, extensions=SCENE_EXTENSIONS[app])
+            departments[dept] = dept_apps
+        tree[stage] = departments
+    return tree
+
+def getAssetTree(project, asset_type, asset, stages=STAGES, apps=None):
+    """
+    Returns the whole stage/department/app/scenes hierarchy of an asset from a
+    single walk, as a nested dictionary `{stage: {department: {app: [scenes]}}}`.
+
+    :param project: The name of the project
+    :type project: str
+    :param asset_type: The asset type
+    :type asset_type: str
+    :param asset: The name of the asset
+    :type asset: str
+    :param stages: The stage folders to walk, defaults to `work` and `publish`
+    :type stages: tuple, optional
+    :param apps: The app folders to walk, all known apps by default
+    :type apps: list, optional
+    :return: The asset hierarchy
+    :rtype: dict
+    """
+    directory = formatPath("asset", project=project, asset_type=asset_type, asset=asset)
+    return _walkEntityTree(directory, stages, apps)
+
+def getShotTree(project, sequence, shot, stages=STAGES, apps=None):
+    """
+    Returns the whole stage/department/app/scenes hierarchy of a shot from a
+    single walk, as a nested dictionary `{stage: {department: {app: [scenes]}}}`.
+
+    :param project: The name of the project
+    :type project: str
+    :param sequence: The name of the sequence
+    :type sequence: str
+    :param shot: The name of the shot
+    :type shot: str
+    :param stages: The stage folders to walk, defaults to `work` and `publish`
+    :type stages: tuple, optional
+    :param apps: The app folders to walk, all known apps by default
+    :type apps: list, optional
+    :return: The shot hierarchy
+    :rtype: dict
+    """
+    directory = formatPath("shot", project=project, sequence=sequence, shot=shot)
+    return _walkEntityTree(directory, stages, apps)
+
+SceneRecord = namedtuple("SceneRecord", ["project", "data_type", "group", "entity", "stage", "department", "app", "name", "path"])
+SceneRecord.__doc__ = """
+A scene found by the bulk crawl. `group` is the asset type or the sequence and
+`entity` the asset or the shot, depending on `data_type`.
+"""
+
+def _listEntities(project):
+    entities = []
+    for asset_type in listAssetTypes(project):
+        entities.extend(("assets", asset_type, asset) for asset in listAssets(project, asset_type))
+    for sequence in listSequences(project):
+        entities.extend(("shots", sequence, shot) for shot in listShots(project, sequence))
+    return project, entities
+
+def _crawlEntity(library, project, data_type, group, entity, stages, apps):
+    template = "asset" if data_type == "assets" else "shot"
+    directory = "{}/{}".format(library, template_utils.PROJECT_TEMPLATES.format(template, project=project, asset_type=group, asset=entity, sequence=group, shot=entity))
+    records = []
+    for stage, departments in _walkEntityTree(directory, stages, apps).items():
+        for dept, dept_apps in departments.items():
+            for app, scenes in dept_apps.items():
+                scenes_dir = "{}/{}/{}/{}/scenes".format(directory, stage, dept, app)
+                records.extend(SceneRecord(project, data_type, group, entity, stage, dept, app, scene, "{}/{}".format(scenes_dir, scene))
+                               for scene in scenes)
+    return records
+
+def crawlProjects(projects=None, stages=STAGES, apps=None, max_workers=DEFAULT_CRAWL_WORKERS, use_processes=False):
+    """
+    Walks every asset and shot of the given projects concurrently and yields
+    their scenes as they are found. Only a bounded number of entities is in
+    flight at a time, so memory stays flat however big the projects are.
+
+    :param projects: The names of the projects, all projects by default
+    :type projects: list, optional
+    :param stages: The stage folders to walk, defaults to `work` and `publish`
+    :type stages: tuple, optional
+    :param apps: The app folders to walk, all known apps by default
+    :type apps: list, optional
+    :param max_workers: Number of concurrent walkers
+    :type max_workers: int, optional
+    :param use_processes: Walk the entities in a process pool, for very wide trees
+    :type use_processes: bool, optional
+    :return: Generator of SceneRecord
+    :rtype: generator
+    """
+    if projects is None:
+        projects = listProjects()
+    stages = tuple(stages)
+    apps = tuple(apps) if apps else None
+    max_pending = max_workers * 2
+
+    listing_pool = ThreadPoolExecutor(max_workers)
+    if use_processes:
+        crawl_pool = ProcessPoolExecutor(max_workers)
     else:
-        return []
+        crawl_pool = listing_pool
+
+    pending = set()
+    try:
+        for project, entities in listing_pool.map(_listEntities, projects):
+            for data_type, group, entity in entities:
+                pending.add(crawl_pool.submit(_crawlEntity, getProjectLibrary(project), project, data_type, group, entity, stages, apps))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for record in future.result():
+                            yield record
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for record in future.result():
+                    yield record
+    finally:
+        for future in pending:
+            future.cancel()
+        listing_pool.shutdown(wait=False)
+        if crawl_pool is not listing_pool:
+            crawl_pool.shutdown(wait=False)
+
+def crawlProject(project, stages=STAGES, apps=None, max_workers=DEFAULT_CRAWL_WORKERS, use_processes=False):
+    """
+    Walks every asset and shot of a project concurrently and yields their scenes.
+    See crawlProjects.
+
+    :param project: The name of the project
+    :type project: str
+    :return: Generator of SceneRecord
+    :rtype: generator
+    """
+    return crawlProjects([project], stages, apps, max_workers, use_processes)
@@ -0,0 +1,177 @@
+import time
+from functools import partial
+from PySide2 import QtCore
+
+import cache_utils
+
+DEFAULT_DELAY = 30
+
+class _Level(object):
+    __slots__ = ("name", "refresh", "depends", "cancel")
+
+    def __init__(self, name, refresh, depends, cancel):
+        self.name = name
+        self.refresh = refresh
+        self.depends = tuple(depends)
+        self.cancel = cancel
+
+class RefreshEngine(QtCore.QObject):
+    """
+    Refreshes a dependency graph of selection levels in coalesced passes.
+
+    Every level is declared with the levels it depends on. Changing a level
+    marks its dependents dirty and schedules a single debounced pass, which
+    refreshes each dirty level exactly once, after the levels it depends on
+    have finished. A level refresh receives a `done` callable to call once its
+    (possibly asynchronous) work is finished.
+    """
+    # the action that started a pass, then the stats of the finished pass
+    passStarted = QtCore.Signal(str)
+    passFinished = QtCore.Signal(dict)
+
+    def __init__(self, parent=None, delay=DEFAULT_DELAY):
+        super().__init__(parent)
+        self._levels = {}
+        self._order = []
+        self._dirty = set()
+        self._running = {}
+        self._tokens = {}
+        self._in_run = False
+        self._action = None
+        self._refreshed = []
+        self.last_stats = None
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self._run)
+
+    def addLevel(self, name, refresh, depends=(), cancel=None):
+        """
+        Declares a selection level, the levels it depends on must be declared first.
+
+        :param name: The name of the level
+        :type name: str
+        :param refresh: Called with a `done` callable to refresh the level
+        :type refresh: callable
+        :param depends: The levels this level is computed from
+        :type depends: tuple, optional
+        :param cancel: Called when a running refresh of the level is superseded
+        :type cancel: callable, optional
+        """
+        for dep in depends:
+            if dep not in self._levels:
+                raise ValueError("Unknown level {} for {}".format(dep, name))
+        self._levels[name] = _Level(name, refresh, depends, cancel)
+        self._order.append(name)
+
+    def dependents(self, name):
+        """
+        Returns every level computed directly or indirectly from a level.
+
+        :param name: The name of the level
+        :type name: str
+        :return: The dependent levels in refresh order
+        :rtype: list
+        """
+        found = set([name])
+        for level in self._order:
+            if any(dep in found for dep in self._levels[level].depends):
+                found.add(level)
+        found.discard(name)
+        return [level for level in self._order if level in found]
+
+    def markDirty(self, name):
+        """
+        Schedules a refresh of a level and its dependents.
+
+        :param name: The name of the level
+        :type name: str
+        """
+        self._invalidate([name] + self.dependents(name), name)
+
+    def markChanged(self, name):
+        """
+        Schedules a refresh of the dependents of a level whose selection changed.
+
+        :param name: The name of the level
+        :type name: str
+        """
+        self._invalidate(self.dependents(name), name)
+
+    def refreshAll(self):
+        """
+        Schedules a refresh of every level.
+        """
+        self._invalidate(list(self._order), "all")
+
+    def isIdle(self):
+        """
+        Returns whether no pass is scheduled or running.
+
+        :rtype: bool
+        """
+        return not self._dirty and not self._running and not self._timer.isActive()
+
+    def _invalidate(self, names, action):
+        if self._action is None:
+            self._action = {"action": action, "start": time.time(), "fs_calls": cache_utils.getFilesystemCallCount()}
+            self._refreshed = []
+            self.passStarted.emit(action)
+        for name in names:
+            # a running refresh is superseded, its done call is ignored
+            if name in self._running:
+                del self._running[name]
+                level = self._levels[name]
+                if level.cancel is not None:
+                    level.cancel()
+            self._dirty.add(name)
+        self._timer.start()
+
+    def _isReady(self, name):
+        for dep in self._levels[name].depends:
+            if dep in self._dirty or dep in self._running:
+                return False
+        return True
+
+    def _run(self):
+        if self._in_run:
+            return
+        self._in_run = True
+        try:
+            while True:
+                name = None
+                for level in self._order:
+                    if level in self._dirty and level not in self._running and self._isReady(level):
+                        name = level
+                        break
+                if name is None:
+                    break
+                self._dirty.discard(name)
+                token = self._tokens.get(name, 0) + 1
+                self._tokens[name] = token
+                self._running[name] = token
+                self._refreshed.append(name)
+                self._levels[name].refresh(partial(self._onDone, name, token))
+        finally:
+            self._in_run = False
+
+        if not self._dirty and not self._running and self._action is not None and not self._timer.isActive():
+            self._finishPass()
+
+    def _onDone(self, name, token):
+        if self._running.get(name) != token:
+            return
+        del self._running[name]
+        self._run()
+
+    def _finishPass(self):
+        action = self._action
+        self._action = None
+        self.last_stats = {
+            "action": action["action"],
+            "refreshed": list(self._refreshed),
+            "fs_calls": cache_utils.getFilesystemCallCount() - action["fs_calls"],
+            "elapsed": time.time() - action["start"],
+        }
+        self.passFinished.emit(self.last_stats)
@@ -0,0 +1,277 @@
+import re
+import bisect
+import heapq
+import threading
+from array import array
+from functools import partial
+from collections import namedtuple, Counter
+
+import project_utils
+import version_utils
+
+DEFAULT_LIMIT = 50
+# share of the query trigrams a typo tolerant token must contain
+FUZZY_RATIO = 0.5
+# entries looked at before giving up on a query whose tokens rarely meet
+MAX_SCANNED = 5000
+KIND_ORDER = {"project": 0, "asset_type": 1, "sequence": 1, "asset": 2, "shot": 2, "scene": 3}
+
+_TOKEN_SPLIT = re.compile(r"[\s/\\._-]+")
+
+SearchEntry = namedtuple("SearchEntry", ["kind", "name", "project", "data_type", "group", "entity", "stage", "department", "app", "path"])
+
+def _trigrams(text):
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+def _deletions(token):
+    return set(token[:i] + token[i + 1:] for i in range(len(token)))
+
+def _tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(text.lower()) if token]
+
+def formatLabel(entry):
+    """
+    Returns the text a search result is shown with, `p1 / char / hero / work / rig / hero_rig_v042.ma`.
+
+    :param entry: The search entry
+    :type entry: SearchEntry
+    :rtype: str
+    """
+    if entry.kind == "project":
+        return entry.name
+    parts = [entry.project, entry.group, entry.entity, entry.stage, entry.department, entry.name]
+    return " / ".join(part for part in parts if part)
+
+def getSelection(entry):
+    """
+    Returns the launcher levels a search entry points at.
+
+    :param entry: The search entry
+    :type entry: SearchEntry
+    :return: Dictionary with some of the `project`, `data_type`, `asset_type`, `asset`, `sequence`, `shot`, `stage`, `department` and `path` keys
+    :rtype: dict
+    """
+    selection = {"project": entry.project}
+    if entry.data_type is None:
+        return selection
+    selection["data_type"] = entry.data_type
+    group_level, entity_level = ("asset_type", "asset") if entry.data_type == "assets" else ("sequence", "shot")
+    if entry.kind in ("asset_type", "sequence"):
+        selection[group_level] = entry.name
+    elif entry.kind in ("asset", "shot"):
+        selection[group_level] = entry.group
+        selection[entity_level] = entry.name
+    else:
+        selection[group_level] = entry.group
+        selection[entity_level] = entry.entity
+        selection["stage"] = entry.stage
+        selection["department"] = entry.department
+        selection["path"] = entry.path
+    return selection
+
+class SearchIndex(object):
+    """
+    An in-memory index of project entities and scenes answering ranked,
+    typo tolerant queries.
+
+    Every entry is indexed under the tokens of its label, so `hero rig` finds
+    the rig scenes of the hero asset. A query token matches the label tokens
+    containing it, found through a trigram index of the token vocabulary, or
+    starting with it for one and two letter tokens, found by bisecting the
+    sorted vocabulary. A token matching nothing falls back to the label tokens
+    one typo away or sharing most of its trigrams.
+
+    The entries are numbered in rank order before the first query, so the
+    postings of the rarest query token are merged lazily and the search stops
+    as soon as enough entries pass the other tokens.
+    """
+    def __init__(self, entries=()):
+        self._entries = []
+        self._labels = []
+        self._ranks = []
+        self._postings = {}
+        self._vocab_grams = {}
+        self._vocab_deletions = {}
+        self._vocab_sorted = []
+        self._exact = {}
+        self._ordered = True
+        self._lock = threading.Lock()
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry):
+        """
+        Adds an entry to the index.
+
+        :param entry: The entry
+        :type entry: SearchEntry
+        """
+        label = formatLabel(entry).lower()
+        name = entry.name.lower()
+        version = version_utils.parseVersion(entry.name) if entry.kind == "scene" else None
+        with self._lock:
+            i = len(self._entries)
+            self._entries.append(entry)
+            self._labels.append(label)
+            # entities first, then the newest versions and the shortest labels
+            self._ranks.append((KIND_ORDER.get(entry.kind, 4), -(version or 0), len(label), label))
+            # keyed like the queries, `hero rig v001` and `hero_rig_v001.ma` both find hero_rig_v001.ma
+            key = "_".join(_tokenize(name))
+            self._exact.setdefault(key, []).append(i)
+            stem = "_".join(_tokenize(name.rsplit(".", 1)[0]))
+            if stem != key:
+                self._exact.setdefault(stem, []).append(i)
+            for token in set(_tokenize(label)):
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = array("I")
+                    for gram in _trigrams(token):
+                        self._vocab_grams.setdefault(gram, []).append(token)
+                    for variant in _deletions(token) | set([token]):
+                        self._vocab_deletions.setdefault(variant, []).append(token)
+                    self._vocab_sorted = None
+                posting.append(i)
+            self._ordered = False
+
+    def _order(self):
+        # renumber the entries in rank order, the postings stay sorted by rank
+        with self._lock:
+            if self._ordered:
+                return
+            order = sorted(range(len(self._entries)), key=self._ranks.__getitem__)
+            new_ids = array("I", bytes(4 * len(order)))
+            for new, old in enumerate(order):
+                new_ids[old] = new
+            self._entries = [self._entries[i] for i in order]
+            self._labels = [self._labels[i] for i in order]
+            self._ranks = [self._ranks[i] for i in order]
+            self._postings = dict((token, array("I", sorted(new_ids[i] for i in posting))) for token, posting in self._postings.items())
+            self._exact = dict((name, sorted(new_ids[i] for i in ids)) for name, ids in self._exact.items())
+            self._ordered = True
+
+    def _matchTokens(self, token):
+        # the vocabulary tokens a query token stands for, and whether they contain it
+        if len(token) < 3:
+            with self._lock:
+                if self._vocab_sorted is None:
+                    self._vocab_sorted = sorted(self._postings)
+                vocab = self._vocab_sorted
+            start = bisect.bisect_left(vocab, token)
+            end = bisect.bisect_left(vocab, token + "\uffff", start)
+            return vocab[start:end], False
+
+        grams = _trigrams(token)
+        lists = [self._vocab_grams.get(gram, ()) for gram in grams]
+        found = [t for t in min(lists, key=len) if token in t]
+        if found:
+            return found, True
+
+        # typo tolerant fallback, the tokens one deletion, insertion, substitution
+        # or swap away, and the longer ones sharing most of the trigrams
+        found = set()
+        for variant in _deletions(token) | set([token]):
+            found.update(self._vocab_deletions.get(variant, ()))
+        counts = Counter()
+        for tokens in lists:
+            counts.update(tokens)
+        required = max(2, int(len(grams) * FUZZY_RATIO + 0.5))
+        found.update(t for t, count in counts.items() if count >= required)
+        return list(found), False
+
+    def search(self, query, limit=DEFAULT_LIMIT, kinds=None):
+        """
+        Returns the entries matching a query, best match first.
+
+        :param query: The text typed by the user, tokens are separated by spaces, `/`, `_`, `.` or `-`
+        :type query: str
+        :param limit: Maximum number of results
+        :type limit: int, optional
+        :param kinds: Only return these kinds of entries, see KIND_ORDER
+        :type kinds: tuple, optional
+        :return: List of SearchEntry
+        :rtype: list
+        """
+        tokens = _tokenize(query)
+        if not tokens:
+            return []
+        self._order()
+
+        postings = self._postings
+        terms = []
+        for token in set(tokens):
+            matched, contained = self._matchTokens(token)
+            if not matched:
+                return []
+            terms.append((sum(len(postings[t]) for t in matched), token, matched, contained))
+        terms.sort()
+
+        # a token contained in a label token is a plain substring of the label
+        labels = self._labels
+        checks = []
+        for size, token, matched, contained in terms[1:]:
+            if contained:
+                checks.append(partial(_hasSubstring, token))
+            else:
+                checks.append(partial(_hasToken, frozenset(matched)))
+
+        entries = self._entries
+        driver = terms[0][2]
+        stream = postings[driver[0]] if len(driver) == 1 else heapq.merge(*[postings[t] for t in driver])
+
+        # the exact names come first, the rest in rank order
+        results = [i for i in self._exact.get("_".join(tokens), ()) if self._accepts(i, checks, kinds)][:limit]
+        exact = set(results)
+        previous = None
+        for scanned, i in enumerate(stream):
+            if scanned >= MAX_SCANNED or len(results) >= limit:
+                break
+            if i == previous or i in exact:
+                continue
+            previous = i
+            if all(check(labels[i]) for check in checks) and (not kinds or entries[i].kind in kinds):
+                results.append(i)
+        return [entries[i] for i in results]
+
+    def _accepts(self, i, checks, kinds):
+        return all(check(self._labels[i]) for check in checks) and (not kinds or self._entries[i].kind in kinds)
+
+def _hasSubstring(token, label):
+    return token in label
+
+def _hasToken(tokens, label):
+    return not tokens.isdisjoint(_tokenize(label))
+
+def buildIndex(projects=None, apps=None):
+    """
+    Builds a search index of the projects, their asset types, assets,
+    sequences, shots and scenes.
+
+    :param projects: The names of the projects, all projects by default
+    :type projects: list, optional
+    :param apps: The app folders whose scenes are indexed, all known apps by default
+    :type apps: list, optional
+    :return: The index
+    :rtype: SearchIndex
+    """
+    if projects is None:
+        projects = project_utils.listProjects()
+    index = SearchIndex()
+    for project in projects:
+        index.add(SearchEntry("project", project, project, None, None, None, None, None, None, None))
+        for asset_type in project_utils.listAssetTypes(project):
+            index.add(SearchEntry("asset_type", asset_type, project, "assets", None, None, None, None, None, None))
+            for asset in project_utils.listAssets(project, asset_type):
+                index.add(SearchEntry("asset", asset, project, "assets", asset_type, None, None, None, None, None))
+        for sequence in project_utils.listSequences(project):
+            index.add(SearchEntry("sequence", sequence, project, "shots", None, None, None, None, None, None))
+            for shot in project_utils.listShots(project, sequence):
+                index.add(SearchEntry("shot", shot, project, "shots", sequence, None, None, None, None, None))
+    for record in project_utils.crawlProjects(projects, apps=apps):
+        index.add(SearchEntry("scene", record.name, record.project, record.data_type, record.group, record.entity,
+                              record.stage, record.department, record.app, record.path))
+    # number the entries in rank order now rather than on the first query
+    index._order()
+    return index
@@ -0,0 +1,339 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_utils
+import index_utils
+import project_utils
+
+SNAPSHOT_FORMAT = 1
+# the levels below the project library, the entities are scanned concurrently
+ENTITY_DEPTH = 4
+SCENES_DEPTH = index_utils.MAX_DEPTH
+# seconds a folder mtime must be old to be trusted by the next snapshot
+MTIME_GRACE = 2.0
+
+Change = namedtuple("Change", ["action", "kind", "path", "size", "mtime"])
+Change.__doc__ = """
+A difference between two snapshots. `action` is `added`, `removed` or
+`modified`, `kind` one of the index_utils.classifyPath kinds or `scene`.
+`size` and `mtime` are those of the newest scene file, None for folders.
+"""
+
+def getSnapshotDir():
+    """
+    Returns the folder the change feed snapshots are saved to.
+
+    :rtype: str
+    """
+    return "{}/snapshots".format(index_utils.getCacheDir())
+
+def _hashNode(node):
+    digest = hashlib.blake2b(digest_size=8)
+    for name in sorted(node["d"]):
+        digest.update("d\0{}\0{}\0".format(name, node["d"][name]["h"]).encode("utf-8", "surrogateescape"))
+    for name in sorted(node["f"]):
+        size, mtime = node["f"][name]
+        digest.update("f\0{}\0{}\0{!r}\0".format(name, size, mtime).encode("utf-8", "surrogateescape"))
+    node["h"] = digest.hexdigest()
+    return node
+
+def _statFiles(path, files):
+    restated = {}
+    for name in files:
+        cache_utils.countFilesystemCall()
+        try:
+            st = os.stat("{}/{}".format(path, name))
+        except OSError:
+            continue
+        restated[name] = [st.st_size, st.st_mtime]
+    return restated
+
+def _scanNode(path, depth, previous, deferred, deep=False):
+    # a folder whose mtime did not change keeps its listing, only its sub folders are stat'ed
+    cache_utils.countFilesystemCall()
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if previous is not None and previous["m"] == mtime:
+        names = list(previous["d"])
+        # a scene saved over in place leaves its folder mtime alone
+        files = _statFiles(path, previous["f"]) if deep and previous["f"] else previous["f"]
+    else:
+        names = []
+        files = {}
+        cache_utils.countFilesystemCall()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            names.append(entry.name)
+                        elif depth == SCENES_DEPTH:
+                            cache_utils.countFilesystemCall()
+                            st = entry.stat()
+                            files[entry.name] = [st.st_size, st.st_mtime]
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+
+    # a folder changed this instant may change again within the same mtime, list it next time
+    node = {"m": mtime if time.time() - mtime > MTIME_GRACE else None, "d": {}, "f": files}
+    if depth >= SCENES_DEPTH:
+        return _hashNode(node)
+    for name in names:
+        child_path = "{}/{}".format(path, name)
+        child_previous = previous["d"].get(name) if previous is not None else None
+        if depth + 1 == ENTITY_DEPTH and deferred is not None:
+            deferred.append((node, name, child_path, child_previous))
+            node["d"][name] = None
+            continue
+        child = _scanNode(child_path, depth + 1, child_previous, deferred, deep)
+        if child is not None:
+            node["d"][name] = child
+    if deferred is None:
+        _hashNode(node)
+    return node
+
+def _finishNode(node):
+    # hash the folders above the entities once the entities are scanned
+    if "h" in node:
+        return
+    for name, child in list(node["d"].items()):
+        if child is None:
+            del node["d"][name]
+        else:
+            _finishNode(child)
+    _hashNode(node)
+
+class Snapshot(object):
+    """
+    A compact image of the project folders down to the scene files, where
+    every folder carries a hash of its whole subtree. Folders are kept as
+    `{"m": mtime, "h": hash, "d": {name: folder}, "f": {name: [size, mtime]}}`,
+    only the scenes folders hold files.
+    """
+    def __init__(self, projects=None, taken=None):
+        # project name to (library, root folder)
+        self.projects = projects or {}
+        self.taken = taken or time.time()
+
+    def save(self, path):
+        """
+        Writes the snapshot as gzipped JSON, replacing the file atomically.
+
+        :param path: The snapshot file
+        :type path: str
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        data = {"format": SNAPSHOT_FORMAT, "taken": self.taken,
+                "projects": dict((name, [library, root]) for name, (library, root) in self.projects.items())}
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        # dumps uses the C encoder, dump would encode in python
+        with gzip.open(temp_path, "wb", compresslevel=5) as f:
+            f.write(json.dumps(data, separators=(",", ":")).encode("utf-8", "surrogateescape"))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a snapshot written by save.
+
+        :param path: The snapshot file
+        :type path: str
+        :return: The snapshot, None when missing or of another format
+        :rtype: Snapshot
+        """
+        try:
+            with gzip.open(path, "rt") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != SNAPSHOT_FORMAT:
+            return None
+        return cls(dict((name, tuple(value)) for name, value in data["projects"].items()), data["taken"])
+
+    def fileCount(self):
+        """
+        Returns the number of scene files in the snapshot.
+
+        :rtype: int
+        """
+        count = 0
+        stack = [root for library, root in self.projects.values()]
+        while stack:
+            node = stack.pop()
+            count += len(node["f"])
+            stack.extend(node["d"].values())
+        return count
+
+def takeSnapshot(projects=None, previous=None, deep=False, max_workers=project_utils.DEFAULT_CRAWL_WORKERS):
+    """
+    Records the folders and scene files of the projects. Given the previous
+    snapshot, only the folders whose mtime changed are listed again, every
+    other folder costs a single stat. Scenes saved over in place are only
+    seen by a `deep` snapshot, which stats every scene file.
+
+    :param projects: The names of the projects, all projects by default
+    :type projects: list, optional
+    :param previous: The last snapshot of the projects
+    :type previous: Snapshot, optional
+    :param deep: Stat the scenes of the unchanged folders too, defaults to False
+    :type deep: bool, optional
+    :param max_workers: Number of entities scanned at once
+    :type max_workers: int, optional
+    :rtype: Snapshot
+    """
+    if projects is None:
+        projects = project_utils.listProjects()
+    snapshot = Snapshot()
+    deferred = []
+    for project in projects:
+        library = project_utils.getProjectLibrary(project)
+        old = previous.projects.get(project) if previous is not None else None
+        root = _scanNode("{}/{}".format(library, project), 1, old[1] if old and old[0] == library else None, deferred, deep)
+        if root is not None:
+            snapshot.projects[project] = (library, root)
+
+    def scan(task):
+        return _scanNode(task[2], ENTITY_DEPTH, task[3], None, deep)
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        for task, node in zip(deferred, pool.map(scan, deferred)):
+            task[0]["d"][task[1]] = node
+    for library, root in snapshot.projects.values():
+        _finishNode(root)
+    return snapshot
+
+def _kind(depth, parts):
+    if depth > SCENES_DEPTH:
+        return "scene"
+    return index_utils.classifyPath(parts) or "folder"
+
+def _iterSubtree(action, path, parts, node):
+    yield Change(action, _kind(len(parts), parts), path, None, None)
+    for name in sorted(node["f"]):
+        size, mtime = node["f"][name]
+        yield Change(action, "scene", "{}/{}".format(path, name), size, mtime)
+    for name in sorted(node["d"]):
+        for change in _iterSubtree(action, "{}/{}".format(path, name), parts + [name], node["d"][name]):
+            yield change
+
+def _iterNodeChanges(path, parts, old, new):
+    # the subtrees with the same hash are skipped whole, a changed folder is reported before its content
+    if old["h"] == new["h"]:
+        return
+    yield Change("modified", _kind(len(parts), parts), path, None, None)
+    for name in sorted(set(old["f"]) | set(new["f"])):
+        file_path = "{}/{}".format(path, name)
+        if name not in old["f"]:
+            yield Change("added", "scene", file_path, *new["f"][name])
+        elif name not in new["f"]:
+            yield Change("removed", "scene", file_path, *old["f"][name])
+        elif old["f"][name] != new["f"][name]:
+            yield Change("modified", "scene", file_path, *new["f"][name])
+    for name in sorted(set(old["d"]) | set(new["d"])):
+        child_path = "{}/{}".format(path, name)
+        if name not in old["d"]:
+            changes = _iterSubtree("added", child_path, parts + [name], new["d"][name])
+        elif name not in new["d"]:
+            changes = _iterSubtree("removed", child_path, parts + [name], old["d"][name])
+        else:
+            changes = _iterNodeChanges(child_path, parts + [name], old["d"][name], new["d"][name])
+        for change in changes:
+            yield change
+
+def iterChanges(old, new):
+    """
+    Yields the differences between two snapshots as they are found, parents
+    before their content. An added or removed folder is followed by all of
+    its content, a folder with changes somewhere below it is `modified`.
+
+    :param old: The earlier snapshot
+    :type old: Snapshot
+    :param new: The later snapshot
+    :type new: Snapshot
+    :return: Generator of Change
+    :rtype: generator
+    """
+    for project in sorted(set(old.projects) | set(new.projects)):
+        old_root = old.projects.get(project)
+        new_root = new.projects.get(project)
+        if old_root is None:
+            changes = _iterSubtree("added", "{}/{}".format(new_root[0], project), [project], new_root[1])
+        elif new_root is None:
+            changes = _iterSubtree("removed", "{}/{}".format(old_root[0], project), [project], old_root[1])
+        else:
+            changes = _iterNodeChanges("{}/{}".format(new_root[0], project), [project], old_root[1], new_root[1])
+        for change in changes:
+            yield change
+
+class ChangeFeed(object):
+    """
+    A named cursor over the project folders, each poll yields what changed
+    since the previous one. The cursor snapshot is saved once a poll was
+    consumed to the end, so a reader stopping early sees the same changes
+    again.
+    """
+    def __init__(self, name, projects=None, path=None):
+        self.name = name
+        self.projects = projects
+        self.path = path or "{}/{}.json.gz".format(getSnapshotDir(), name)
+        self._snapshot = None
+
+    def getSnapshot(self):
+        """
+        Returns the snapshot of the last consumed poll.
+
+        :return: The snapshot, None before the first poll
+        :rtype: Snapshot
+        """
+        if self._snapshot is None:
+            self._snapshot = Snapshot.load(self.path)
+        return self._snapshot
+
+    def poll(self, initial=False, deep=False):
+        """
+        Takes a new snapshot and yields its changes against the cursor.
+
+        :param initial: Yield everything on the first poll instead of only recording it, defaults to False
+        :type initial: bool, optional
+        :param deep: Stat every scene file to see the ones saved over in place, see takeSnapshot
+        :type deep: bool, optional
+        :return: Generator of Change
+        :rtype: generator
+        """
+        previous = self.getSnapshot()
+        snapshot = takeSnapshot(self.projects, previous, deep)
+        if previous is not None or initial:
+            for change in iterChanges(previous or Snapshot(), snapshot):
+                yield change
+        snapshot.save(self.path)
+        self._snapshot = snapshot
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print the project changes since the last poll of a feed, as JSON lines.")
+    parser.add_argument("feed", help="the name of the feed, each tool keeps its own")
+    parser.add_argument("projects", nargs="*", help="the projects, all projects by default")
+    parser.add_argument("--initial", action="store_true", help="print every scene on the first poll")
+    parser.add_argument("--deep", action="store_true", help="stat every scene file to catch the ones saved over in place")
+    parser.add_argument("--kind", action="append", help="only print the changes of this kind, repeatable")
+    args = parser.parse_args(argv)
+
+    feed = ChangeFeed(args.feed, args.projects or None)
+    for change in feed.poll(args.initial, args.deep):
+        if not args.kind or change.kind in args.kind:
+            print(json.dumps(change._asdict()), flush=True)
+
+if __name__ == "__main__":
+    main()
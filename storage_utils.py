@@ -0,0 +1,377 @@
+import os
+import csv
+import json
+import sqlite3
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_utils
+import index_utils
+import project_utils
+
+# the levels below the project library, the entities are walked concurrently
+ENTITY_DEPTH = 4
+# the deepest level rolled up, the app folders
+APP_DEPTH = 7
+# seconds a folder mtime must be old to be trusted by the next run
+MTIME_GRACE = 2.0
+LEVELS = ("project", "data_type", "group", "entity", "stage", "department", "app")
+FIELDS = ("level", "path", "project", "data_type", "group", "entity", "stage", "department", "app", "size", "files")
+
+Usage = namedtuple("Usage", FIELDS)
+Usage.__doc__ = """
+The storage used by a folder of the project hierarchy and everything below it.
+`level` is one of LEVELS, the fields below the level are None. `group` is
+the asset type or the sequence and `entity` the asset or the shot.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    files INTEGER,
+    subdirs TEXT
+);
+"""
+
+def getDefaultStorePath():
+    """
+    Returns the path of the storage usage database.
+
+    :return: The database path
+    :rtype: str
+    """
+    return "{}/storage_usage.db".format(index_utils.getCacheDir())
+
+class UsageStore(object):
+    """
+    A persistent SQLite cache of the files directly inside each folder, a
+    folder is only listed again once its mtime changed.
+    """
+    def __init__(self, path=None):
+        self.path = path or getDefaultStorePath()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def load(self, root):
+        """
+        Returns the stored folders of a tree.
+
+        :param root: The resolved root folder
+        :type root: str
+        :return: Dictionary of resolved path to (mtime, size, files, sub folder names)
+        :rtype: dict
+        """
+        prefix = root.rstrip(os.sep) + os.sep
+        rows = self._connection().execute(
+            "SELECT path, mtime, size, files, subdirs FROM directories WHERE path = ? OR (path >= ? AND path < ?)",
+            (root, prefix, prefix + "\uffff"))
+        return dict((path, (mtime, size, files, subdirs.split("\0") if subdirs else []))
+                    for path, mtime, size, files, subdirs in rows)
+
+    def update(self, rows, removed=()):
+        """
+        Stores the folders listed again and drops the vanished ones.
+
+        :param rows: List of (resolved path, mtime, size, files, sub folder names)
+        :type rows: list
+        :param removed: The resolved paths to drop
+        :type removed: list
+        """
+        if not rows and not removed:
+            return
+        with self._write_lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO directories (path, mtime, size, files, subdirs) VALUES (?, ?, ?, ?, ?)",
+                             [(path, mtime, size, files, "\0".join(subdirs)) for path, mtime, size, files, subdirs in rows])
+            conn.executemany("DELETE FROM directories WHERE path = ?", [(path,) for path in removed])
+            conn.commit()
+
+    def clear(self):
+        """
+        Drops every stored folder.
+        """
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM directories")
+            conn.commit()
+
+_store = None
+_store_lock = threading.Lock()
+
+def getStore():
+    """
+    Returns the shared usage store, opened on first use.
+
+    :rtype: UsageStore
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UsageStore()
+        return _store
+
+def setStore(store):
+    """
+    Replaces the shared usage store.
+
+    :param store: The store, None to open the default one on next use
+    :type store: UsageStore
+    """
+    global _store
+    with _store_lock:
+        _store = store
+
+class _Walk(object):
+    # the state of one walker thread, merged once every walker is done
+    def __init__(self, cached):
+        self.cached = cached
+        self.visited = set()
+        self.updates = []
+        self.rollups = {}
+
+    def scan(self, path):
+        # the size and number of the files directly inside a folder, and its sub folders
+        key = cache_utils.resolvePath(path)
+        cache_utils.countFilesystemCall()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        self.visited.add(key)
+        entry = self.cached.get(key)
+        if entry is not None and entry[0] == mtime:
+            return entry[1], entry[2], entry[3]
+
+        size = files = 0
+        subdirs = []
+        cache_utils.countFilesystemCall()
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        elif item.is_file(follow_symlinks=False):
+                            # the size comes with the listing on windows, costs a stat on posix
+                            cache_utils.countFilesystemCall()
+                            size += item.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        # a folder changed this instant may change again within the same mtime, list it next time
+        self.updates.append((key, mtime if time.time() - mtime > MTIME_GRACE else None, size, files, subdirs))
+        return size, files, subdirs
+
+    def walk(self, path, depth):
+        scanned = self.scan(path)
+        if scanned is None:
+            return 0, 0
+        size, files, subdirs = scanned
+        for name in subdirs:
+            child_size, child_files = self.walk("{}/{}".format(path, name), depth + 1)
+            size += child_size
+            files += child_files
+        if depth <= APP_DEPTH:
+            self.rollups[path] = (depth, size, files)
+        return size, files
+
+def _walkTop(walk, path, depth, pool):
+    # the folders above the entities are listed here, the entities are submitted to the pool
+    scanned = walk.scan(path)
+    if scanned is None:
+        return None
+    size, files, subdirs = scanned
+    children = []
+    for name in subdirs:
+        child_path = "{}/{}".format(path, name)
+        if depth + 1 == ENTITY_DEPTH:
+            entity_walk = _Walk(walk.cached)
+            children.append((entity_walk, pool.submit(entity_walk.walk, child_path, depth + 1)))
+        else:
+            children.append((None, _walkTop(walk, child_path, depth + 1, pool)))
+    return path, depth, size, files, children
+
+def _rollupTop(walk, node):
+    path, depth, size, files, children = node
+    for entity_walk, child in children:
+        if entity_walk is not None:
+            child_size, child_files = child.result()
+            walk.visited.update(entity_walk.visited)
+            walk.updates.extend(entity_walk.updates)
+            walk.rollups.update(entity_walk.rollups)
+        elif child is not None:
+            child_size, child_files = _rollupTop(walk, child)
+        else:
+            continue
+        size += child_size
+        files += child_files
+    walk.rollups[path] = (depth, size, files)
+    return size, files
+
+def _makeUsage(library, path, depth, size, files):
+    parts = path[len(library):].strip("/").split("/")
+    level = LEVELS[depth - 1]
+    values = parts + [None] * (len(LEVELS) - len(parts))
+    return Usage(level, path, *values, size=size, files=files)
+
+def computeUsage(projects=None, max_workers=project_utils.DEFAULT_CRAWL_WORKERS, store=None):
+    """
+    Rolls up the size and number of files of every level of the projects,
+    from the projects down to the app folders. The entities are walked
+    concurrently and only the folders whose mtime changed since the last run
+    are listed again; the others cost a single stat. A file saved over in
+    place is only counted again once its folder changes.
+
+    :param projects: The names of the projects, all projects by default
+    :type projects: list, optional
+    :param max_workers: Number of concurrent walkers
+    :type max_workers: int, optional
+    :param store: The cache of the folder listings, the shared store by default
+    :type store: UsageStore, optional
+    :return: List of Usage, sorted by path
+    :rtype: list
+    """
+    if projects is None:
+        projects = project_utils.listProjects()
+    store = store or getStore()
+    rows = []
+    with ThreadPoolExecutor(max_workers) as pool:
+        for project in projects:
+            library = project_utils.getProjectLibrary(project)
+            root = "{}/{}".format(library, project)
+            cached = store.load(cache_utils.resolvePath(root))
+            walk = _Walk(cached)
+            node = _walkTop(walk, root, 1, pool)
+            if node is None:
+                continue
+            _rollupTop(walk, node)
+            store.update(walk.updates, set(cached) - walk.visited)
+            rows.extend(_makeUsage(library, path, depth, size, files) for path, (depth, size, files) in walk.rollups.items())
+    rows.sort(key=lambda usage: usage.path)
+    return rows
+
+def getFolderUsage(directory, store=None):
+    """
+    Returns the size and number of files below each sub folder of a folder,
+    like the departments of a stage folder.
+
+    :param directory: The folder
+    :type directory: str
+    :param store: The cache of the folder listings, the shared store by default
+    :type store: UsageStore, optional
+    :return: Dictionary of sub folder name to (size, files)
+    :rtype: dict
+    """
+    store = store or getStore()
+    cached = store.load(cache_utils.resolvePath(directory))
+    walk = _Walk(cached)
+    scanned = walk.scan(directory)
+    if scanned is None:
+        return {}
+    usage = {}
+    for name in scanned[2]:
+        # below the reported depth, so only the totals are kept
+        usage[name] = walk.walk("{}/{}".format(directory, name), APP_DEPTH + 1)
+    store.update(walk.updates, set(cached) - walk.visited)
+    return usage
+
+def formatSize(size):
+    """
+    Returns a size in bytes as a short human readable text.
+
+    :param size: The size in bytes
+    :type size: int
+    :rtype: str
+    """
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return "{:.0f} {}".format(size, unit) if unit == "B" else "{:.1f} {}".format(size, unit)
+        size /= 1024.0
+
+def exportCsv(rows, path):
+    """
+    Writes usage rows to a CSV file, sizes in bytes.
+
+    :param rows: List of Usage
+    :type rows: list
+    :param path: The CSV file
+    :type path: str
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+
+def exportJson(rows, path):
+    """
+    Writes usage rows to a JSON file as a list of objects, sizes in bytes.
+
+    :param rows: List of Usage
+    :type rows: list
+    :param path: The JSON file
+    :type path: str
+    """
+    with open(path, "w") as f:
+        json.dump([usage._asdict() for usage in rows], f, indent=2)
+
+def exportUsage(rows, path):
+    """
+    Writes usage rows to a `.json` file, or a CSV file for any other extension.
+
+    :param rows: List of Usage
+    :type rows: list
+    :param path: The file
+    :type path: str
+    """
+    if path.lower().endswith(".json"):
+        exportJson(rows, path)
+    else:
+        exportCsv(rows, path)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Roll up the storage used by the projects.")
+    parser.add_argument("projects", nargs="*", help="the projects, all projects by default")
+    parser.add_argument("--level", choices=LEVELS, help="only report this level")
+    parser.add_argument("--workers", type=int, default=project_utils.DEFAULT_CRAWL_WORKERS, help="number of concurrent walkers")
+    parser.add_argument("--output", help="write the rows to a .csv or .json file instead of printing them")
+    args = parser.parse_args()
+
+    rows = computeUsage(args.projects or None, args.workers)
+    if args.level:
+        rows = [usage for usage in rows if usage.level == args.level]
+    if args.output:
+        exportUsage(rows, args.output)
+    else:
+        for usage in rows:
+            print("{:>10} {:>8}  {}".format(formatSize(usage.size), usage.files, usage.path))
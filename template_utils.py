@@ -0,0 +1,175 @@
+import re
+from collections import namedtuple
+
+_FIELD = re.compile(r"{(\w+)}")
+DEFAULT_FIELD_PATTERN = "[^/]+"
+
+PathContext = namedtuple("PathContext", ["template", "library", "fields"])
+
+class PathTemplate(object):
+    """
+    A path layout compiled once into a formatter and an anchored regex.
+
+    Fields are written `{name}` and match a single path segment unless the
+    template is given a different pattern for them.
+    """
+    def __init__(self, name, pattern, field_patterns=None):
+        self.name = name
+        self.pattern = pattern
+        self.fields = _FIELD.findall(pattern)
+        self.segments = pattern.count("/") + 1
+
+        field_patterns = field_patterns or {}
+        regex = []
+        pos = 0
+        for match in _FIELD.finditer(pattern):
+            field = match.group(1)
+            regex.append(re.escape(pattern[pos:match.start()]))
+            regex.append("(?P<{}>{})".format(field, field_patterns.get(field, DEFAULT_FIELD_PATTERN)))
+            pos = match.end()
+        regex.append(re.escape(pattern[pos:]))
+        self.regex = re.compile("^{}$".format("".join(regex)))
+
+    def format(self, **fields):
+        """
+        Returns the path of the template filled with the fields.
+
+        :return: The formatted path
+        :rtype: str
+        """
+        return self.pattern.format(**fields)
+
+    def parse(self, path):
+        """
+        Returns the fields of a path matching the template.
+
+        :param path: The path, using `/` separators
+        :type path: str
+        :return: Dictionary of fields, None when the path does not match
+        :rtype: dict
+        """
+        match = self.regex.match(path)
+        if match is None:
+            return None
+        return match.groupdict()
+
+class TemplateRegistry(object):
+    """
+    Named path templates, relative to a library root, with a fast batch parser.
+    """
+    def __init__(self, templates=None):
+        self._templates = {}
+        self._by_segments = {}
+        for name, pattern in (templates or []):
+            self.add(name, pattern)
+
+    def add(self, name, pattern, field_patterns=None):
+        """
+        Registers a template.
+
+        :param name: The name of the template
+        :type name: str
+        :param pattern: The path layout, for example `{project}/assets/{asset_type}`
+        :type pattern: str
+        :param field_patterns: Regex patterns of the fields that do not match a single segment
+        :type field_patterns: dict, optional
+        :return: The compiled template
+        :rtype: PathTemplate
+        """
+        template = PathTemplate(name, pattern, field_patterns)
+        if name in self._templates:
+            self._by_segments[self._templates[name].segments].remove(self._templates[name])
+        self._templates[name] = template
+        self._by_segments.setdefault(template.segments, []).append(template)
+        return template
+
+    def get(self, name):
+        """
+        Returns a registered template.
+
+        :rtype: PathTemplate
+        """
+        return self._templates[name]
+
+    def names(self):
+        """
+        Returns the names of the registered templates.
+
+        :rtype: list
+        """
+        return list(self._templates)
+
+    def format(self, name, **fields):
+        """
+        Returns the path of a template filled with the fields.
+
+        :param name: The name of the template
+        :type name: str
+        :return: The formatted path
+        :rtype: str
+        """
+        return self._templates[name].pattern.format(**fields)
+
+    def parse(self, path):
+        """
+        Returns the template matching a relative path and its fields.
+
+        :param path: The path relative to the library root, using `/` separators
+        :type path: str
+        :return: (template name, fields) or None when no template matches
+        :rtype: tuple
+        """
+        for template in self._by_segments.get(path.count("/") + 1, ()):
+            match = template.regex.match(path)
+            if match is not None:
+                return template.name, match.groupdict()
+        return None
+
+    def parseMany(self, paths, roots):
+        """
+        Classifies many absolute paths at once.
+
+        :param paths: The paths to classify, `\\` separators are accepted
+        :type paths: list
+        :param roots: The library roots the paths may live under
+        :type roots: list
+        :return: One PathContext per path, None for the paths that match no template
+        :rtype: list
+        """
+        # check the longest roots first so nested roots resolve to the deepest one
+        prefixes = sorted(((root.replace("\\", "/").rstrip("/") + "/", root) for root in roots), key=lambda item: -len(item[0]))
+        by_segments = self._by_segments
+        results = []
+        append = results.append
+        for path in paths:
+            path = path.replace("\\", "/")
+            context = None
+            for prefix, root in prefixes:
+                if path.startswith(prefix):
+                    relative = path[len(prefix):].rstrip("/")
+                    for template in by_segments.get(relative.count("/") + 1, ()):
+                        match = template.regex.match(relative)
+                        if match is not None:
+                            context = PathContext(template.name, root, match.groupdict())
+                            break
+                    break
+            append(context)
+        return results
+
+PROJECT_TEMPLATES = TemplateRegistry([
+    ("project", "{project}"),
+    ("asset_library", "{project}/assets"),
+    ("asset_type", "{project}/assets/{asset_type}"),
+    ("asset", "{project}/assets/{asset_type}/{asset}"),
+    ("asset_stage", "{project}/assets/{asset_type}/{asset}/{stage}"),
+    ("asset_department", "{project}/assets/{asset_type}/{asset}/{stage}/{department}"),
+    ("asset_scenes", "{project}/assets/{asset_type}/{asset}/{stage}/{department}/{app}/scenes"),
+    ("asset_scene", "{project}/assets/{asset_type}/{asset}/{stage}/{department}/{app}/scenes/{scene}"),
+    ("shot_library", "{project}/shots"),
+    ("sequence", "{project}/shots/{sequence}"),
+    ("shot", "{project}/shots/{sequence}/{shot}"),
+    ("shot_stage", "{project}/shots/{sequence}/{shot}/{stage}"),
+    ("shot_department", "{project}/shots/{sequence}/{shot}/{stage}/{department}"),
+    ("shot_scenes", "{project}/shots/{sequence}/{shot}/{stage}/{department}/{app}/scenes"),
+    ("shot_scene", "{project}/shots/{sequence}/{shot}/{stage}/{department}/{app}/scenes/{scene}"),
+])
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the pipeline modules are imported flat, like the launchers do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
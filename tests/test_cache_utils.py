@@ -0,0 +1,115 @@
+import os
+
+import cache_utils
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+def _loader(calls):
+    def load(path):
+        calls.append(path)
+        return sorted(os.listdir(path))
+    return load
+
+def _touch(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+def test_unchanged_directory_is_a_hit(tmp_path):
+    cache = cache_utils.DirectoryCache()
+    (tmp_path / "a.ma").write_text("")
+    calls = []
+
+    assert cache.get(str(tmp_path), _loader(calls)) == ["a.ma"]
+    assert cache.get(str(tmp_path), _loader(calls)) == ["a.ma"]
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "hit_rate": 0.5}
+
+def test_changed_mtime_is_a_miss(tmp_path):
+    cache = cache_utils.DirectoryCache()
+    _touch(str(tmp_path), 1000.0)
+    calls = []
+    cache.get(str(tmp_path), _loader(calls))
+
+    (tmp_path / "b.ma").write_text("")
+    _touch(str(tmp_path), 2000.0)
+    assert cache.get(str(tmp_path), _loader(calls)) == ["b.ma"]
+    assert len(calls) == 2
+
+def test_expired_entry_is_a_miss(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_utils, "time", clock)
+    cache = cache_utils.DirectoryCache(ttl=30.0)
+    calls = []
+    cache.get(str(tmp_path), _loader(calls))
+
+    clock.now += 29.0
+    cache.get(str(tmp_path), _loader(calls))
+    assert len(calls) == 1
+    clock.now += 2.0
+    cache.get(str(tmp_path), _loader(calls))
+    assert len(calls) == 2
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = cache_utils.DirectoryCache(max_entries=2)
+    folders = []
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        folders.append(str(tmp_path / name))
+    calls = []
+    cache.get(folders[0], _loader(calls))
+    cache.get(folders[1], _loader(calls))
+    # a is used again, so b is the least recently used
+    cache.get(folders[0], _loader(calls))
+    cache.get(folders[2], _loader(calls))
+    assert cache.stats()["entries"] == 2
+
+    del calls[:]
+    cache.get(folders[0], _loader(calls))
+    cache.get(folders[1], _loader(calls))
+    assert calls == [cache_utils.resolvePath(folders[1])]
+
+def test_kinds_are_cached_apart(tmp_path):
+    cache = cache_utils.DirectoryCache()
+    assert cache.get(str(tmp_path), lambda path: "entries") == "entries"
+    assert cache.get(str(tmp_path), lambda path: "stat", "stat") == "stat"
+    assert cache.get(str(tmp_path), lambda path: "other") == "entries"
+
+def test_missing_directory(tmp_path):
+    cache = cache_utils.DirectoryCache()
+    folder = tmp_path / "gone"
+    folder.mkdir()
+    cache.get(str(folder), lambda path: [])
+    folder.rmdir()
+
+    assert cache.get(str(folder), lambda path: []) is None
+    assert cache.stats()["entries"] == 0
+
+def test_invalidate(tmp_path):
+    cache = cache_utils.DirectoryCache()
+    child = tmp_path / "child"
+    child.mkdir()
+    cache.get(str(tmp_path), lambda path: [])
+    cache.get(str(child), lambda path: [])
+
+    assert cache.invalidate(str(tmp_path), recursive=False) == 1
+    cache.get(str(tmp_path), lambda path: [])
+    assert cache.invalidate(str(tmp_path)) == 2
+    assert cache.stats()["entries"] == 0
+
+def test_list_directory(tmp_path):
+    (tmp_path / "scenes").mkdir()
+    for name in ("a_v001.ma", "a_v002.mb", "notes.txt"):
+        (tmp_path / name).write_text("")
+    cache_utils.clearCache()
+
+    assert sorted(cache_utils.listDirectory(str(tmp_path))) == ["a_v001.ma", "a_v002.mb", "notes.txt", "scenes"]
+    assert cache_utils.listDirectory(str(tmp_path), dirs_only=True) == ["scenes"]
+    assert sorted(cache_utils.listDirectory(str(tmp_path), extensions=(".ma", ".mb"))) == ["a_v001.ma", "a_v002.mb"]
+    assert cache_utils.listDirectory(str(tmp_path / "missing")) == []
+
+def test_merge_listings():
+    assert cache_utils.mergeListings([["b", "a"], ["a", "c"], ["d", "b"]]) == ["b", "a", "c", "d"]
@@ -0,0 +1,82 @@
+import os
+import time
+import subprocess
+
+import pytest
+
+import launch_utils
+
+def _output(launch):
+    return dict(line.split("=", 1) for line in launch.readOutput(50) if "=" in line)
+
+def test_launch_keeps_parent_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv("PROJECT", raising=False)
+    monkeypatch.setenv("SHOT", "sh999")
+    before = dict(os.environ)
+    base = dict(os.environ)
+    environ = launch_utils.buildEnvironment([{"PROJECT": "p1"}, {"SHOT": "sh010", "PACKAGES": 3}], base)
+
+    launch = launch_utils.LaunchEngine(str(tmp_path)).launch("stub", launch_utils.getStubCommand("--exit-code", "3"), environ)
+
+    assert launch.wait(10) == 3
+    output = _output(launch)
+    assert (output["PROJECT"], output["SHOT"], output["PACKAGES"]) == ("p1", "sh010", "3")
+    assert dict(os.environ) == before
+    assert base == before
+
+def test_concurrent_launches(tmp_path):
+    engine = launch_utils.LaunchEngine(str(tmp_path))
+    duration = 0.5
+    start = time.perf_counter()
+    launches = [engine.launch("stub", launch_utils.getStubCommand("--duration", str(duration)),
+                              launch_utils.buildEnvironment([{"PROJECT": "p{}".format(i)}]))
+                for i in range(6)]
+
+    assert len(engine.getLaunches(running=True)) == 6
+    assert [launch.wait(10) for launch in launches] == [0] * 6
+    # run side by side, not one after the other
+    assert time.perf_counter() - start < duration * len(launches)
+    assert [_output(launch)["PROJECT"] for launch in launches] == ["p{}".format(i) for i in range(6)]
+    assert len(set(launch.log_path for launch in launches)) == 6
+    assert engine.getLaunches(running=True) == []
+
+def test_first_output_timings(tmp_path):
+    delay = 0.5
+    launch = launch_utils.LaunchEngine(str(tmp_path)).launch(
+        "stub", launch_utils.getStubCommand("--delay", str(delay), "--duration", "0.2"), dict(os.environ), resolve_time=0.01)
+    launch.wait(10)
+    timings = launch.timings
+
+    assert timings["resolve"] == 0.01
+    assert timings["spawn"] < timings["first_output"] < timings["exit"]
+    # checked at doubling intervals, late by at most half the wait
+    assert delay <= timings["first_output"] <= delay * 1.5 + 0.5
+    assert timings["exit"] >= delay + 0.2
+
+def test_first_output_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(launch_utils, "MAX_POLL_INTERVAL", 0.08)
+    intervals = []
+    wait = subprocess.Popen.wait
+
+    def recordWait(process, timeout=None):
+        if timeout is not None:
+            intervals.append(timeout)
+        return wait(process, timeout)
+
+    monkeypatch.setattr(subprocess.Popen, "wait", recordWait)
+    launch = launch_utils.LaunchEngine(str(tmp_path)).launch(
+        "stub", launch_utils.getStubCommand("--delay", "0.6"), dict(os.environ))
+    launch.wait(10)
+
+    expected = [launch_utils.POLL_INTERVAL * 2 ** i for i in range(4)]
+    assert intervals[:4] == pytest.approx(expected)
+    assert max(intervals) == 0.08
+    assert "first_output" in launch.timings
+
+def test_failed_launch(tmp_path):
+    engine = launch_utils.LaunchEngine(str(tmp_path))
+    with pytest.raises(OSError):
+        engine.launch("stub", [str(tmp_path / "missing")], dict(os.environ))
+    launch = engine.getLaunches()[0]
+    assert launch.error and not launch.isRunning()
+    assert launch.wait(0) is None
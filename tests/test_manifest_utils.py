@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+import manifest_utils
+
+EXTENSIONS = {"maya": (".ma", ".mb")}
+
+def _makeScene(root, *parts):
+    directory = os.path.join(root, *parts[:-1])
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, parts[-1]), "w") as f:
+        f.write(parts[-1])
+
+def _makeStage(tmp_path):
+    stage_dir = str(tmp_path / "hero" / "publish").replace("\\", "/")
+    _makeScene(stage_dir, "rig", "maya", "scenes", "hero_rig_v001.ma")
+    _makeScene(stage_dir, "rig", "maya", "scenes", "hero_rig_v002.ma")
+    _makeScene(stage_dir, "model", "maya", "scenes", "hero_model_v001.ma")
+    return stage_dir
+
+def _age(stage_dir):
+    # past MTIME_GRACE, as if the folders were written a while ago
+    old = time.time() - manifest_utils.MTIME_GRACE * 10
+    for directory, dirs, files in os.walk(stage_dir, topdown=False):
+        os.utime(directory, (old, old))
+
+def test_written_manifest_reads_back(tmp_path):
+    stage_dir = _makeStage(tmp_path)
+    _age(stage_dir)
+    written = manifest_utils.writeManifest(stage_dir, EXTENSIONS)
+    manifest = manifest_utils.readManifest(stage_dir, strict=True)
+
+    assert manifest is not None
+    assert manifest.data == written.data
+    assert manifest.departments() == ["model", "rig"]
+    assert manifest.apps("rig") == ["maya"]
+    assert manifest.sceneNames("rig", "maya") == ["hero_rig_v001.ma", "hero_rig_v002.ma"]
+    assert [scene["version"] for scene in manifest.scenes("rig", "maya")] == [1, 2]
+    assert manifest_utils.listPublished(stage_dir) == ["model", "rig"]
+    assert manifest_utils.listPublished(stage_dir + "/rig/maya/scenes") == ["hero_rig_v001.ma", "hero_rig_v002.ma"]
+
+@pytest.mark.skipif(os.name == "nt", reason="no posix permissions")
+def test_manifest_is_not_private(tmp_path):
+    stage_dir = _makeStage(tmp_path)
+    manifest_utils.writeManifest(stage_dir, EXTENSIONS)
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(manifest_utils.getManifestPath(stage_dir)).st_mode & 0o777 == 0o666 & ~umask
+
+def test_new_scene_makes_scenes_folder_stale(tmp_path):
+    stage_dir = _makeStage(tmp_path)
+    _age(stage_dir)
+    manifest_utils.writeManifest(stage_dir, EXTENSIONS)
+    _makeScene(stage_dir, "rig", "maya", "scenes", "hero_rig_v003.ma")
+    manifest = manifest_utils.readManifest(stage_dir)
+
+    # the stage folder did not change, only the scenes folder of rig did
+    assert manifest is not None
+    assert not manifest.isScenesCurrent(stage_dir, "rig", "maya")
+    assert manifest.isScenesCurrent(stage_dir, "model", "maya")
+    assert not manifest.isScenesCurrent(stage_dir, "layout", "maya")
+    assert manifest_utils.listPublished(stage_dir + "/rig/maya/scenes") is None
+    assert manifest_utils.readManifest(stage_dir, strict=True) is None
+    assert manifest_utils.updateManifest(stage_dir, EXTENSIONS) == "written"
+
+def test_recent_folders_are_recorded_as_changed(tmp_path):
+    stage_dir = _makeStage(tmp_path)
+    manifest = manifest_utils.writeManifest(stage_dir, EXTENSIONS)
+
+    # changed within MTIME_GRACE, the next write may not see a change within the same mtime
+    assert manifest.data["stage_mtime"] == -1.0
+    assert manifest.data["department_mtimes"]["rig"] == -1.0
+    assert not manifest.isScenesCurrent(stage_dir, "rig", "maya")
+    assert manifest_utils.readManifest(stage_dir) is None
+    assert manifest_utils.listPublished(stage_dir) is None
+
+def test_revision_increments(tmp_path):
+    stage_dir = _makeStage(tmp_path)
+    _age(stage_dir)
+    revisions = [manifest_utils.writeManifest(stage_dir, EXTENSIONS).revision for i in range(3)]
+
+    assert revisions == [1, 2, 3]
+    assert manifest_utils.updateManifest(stage_dir, EXTENSIONS) == "current"
+    assert manifest_utils.readManifest(stage_dir).revision == 3
+    assert manifest_utils.updateManifest(stage_dir, EXTENSIONS, force=True) == "written"
+    assert manifest_utils.readManifest(stage_dir).revision == 4
+
+def test_missing_stage_folder(tmp_path):
+    stage_dir = str(tmp_path / "hero" / "publish").replace("\\", "/")
+    assert manifest_utils.writeManifest(stage_dir, EXTENSIONS) is None
+    assert manifest_utils.readManifest(stage_dir) is None
+    assert manifest_utils.updateManifest(stage_dir, EXTENSIONS) == "missing"
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PySide2.QtCore")
+
+import refresh_utils
+import worker_utils
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+def _processUntil(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.AllEvents, 10)
+    return condition()
+
+def _listShots():
+    raise PermissionError("Permission denied: 'shots/sq010'")
+
+def test_failed_listing_finishes_the_pass(app):
+    dispatcher = worker_utils.TaskDispatcher()
+    engine = refresh_utils.RefreshEngine()
+    listed = {}
+    errors = []
+    finished = []
+
+    def updateShot(done):
+        def onError(error):
+            errors.append(error)
+            listed["shot"] = []
+            done()
+        dispatcher.submit("shot", lambda names: listed.update(shot=names), _listShots, on_error=onError)
+
+    def updateFileTree(done):
+        listed["file_tree"] = True
+        done()
+
+    engine.addLevel("shot", updateShot)
+    engine.addLevel("file_tree", updateFileTree, ("shot",))
+    engine.passFinished.connect(finished.append)
+    engine.refreshAll()
+
+    assert _processUntil(lambda: finished)
+    assert listed == {"shot": [], "file_tree": True}
+    assert "PermissionError" in errors[0]
+    assert finished[0]["refreshed"] == ["shot", "file_tree"]
+    assert engine.isIdle()
+
+def test_superseded_failure_is_ignored(app):
+    dispatcher = worker_utils.TaskDispatcher()
+    errors = []
+    results = []
+    dispatcher.submit("shot", results.append, _listShots, on_error=errors.append)
+    dispatcher.submit("shot", results.append, lambda: ["sh010"], on_error=errors.append)
+
+    assert _processUntil(lambda: results)
+    assert results == [["sh010"]]
+    assert errors == []
@@ -0,0 +1,82 @@
+import search_utils
+
+def _entity(kind, name, project="p1", data_type="assets", group=None):
+    return search_utils.SearchEntry(kind, name, project, data_type, group, None, None, None, None, None)
+
+def _scene(name, entity="hero", department="rig", stage="work", group="char"):
+    path = "/mnt/p1/assets/{}/{}/{}/{}/maya/scenes/{}".format(group, entity, stage, department, name)
+    return search_utils.SearchEntry("scene", name, "p1", "assets", group, entity, stage, department, "maya", path)
+
+def _buildIndex():
+    entries = [
+        search_utils.SearchEntry("project", "p1", "p1", None, None, None, None, None, None, None),
+        _entity("asset_type", "char"),
+        _entity("asset", "hero", group="char"),
+        _entity("asset", "heroine", group="char"),
+        _entity("asset", "villain", group="char"),
+        _entity("sequence", "sq010", data_type="shots"),
+    ]
+    entries += [_scene("hero_rig_v{:03d}.ma".format(i)) for i in range(1, 6)]
+    entries += [_scene("hero_model_v001.ma", department="model"), _scene("villain_rig_v001.ma", entity="villain")]
+    return search_utils.SearchIndex(entries)
+
+def _names(results):
+    return [entry.name for entry in results]
+
+def test_entities_rank_before_scenes():
+    results = _buildIndex().search("hero")
+    assert _names(results)[:3] == ["hero", "heroine", "hero_rig_v005.ma"]
+    # then the newest versions, the shortest labels first
+    assert _names(results)[3:] == ["hero_rig_v004.ma", "hero_rig_v003.ma", "hero_rig_v002.ma", "hero_rig_v001.ma", "hero_model_v001.ma"]
+
+def test_every_token_must_match():
+    index = _buildIndex()
+    assert _names(index.search("hero rig")) == ["hero_rig_v005.ma", "hero_rig_v004.ma", "hero_rig_v003.ma", "hero_rig_v002.ma", "hero_rig_v001.ma"]
+    assert _names(index.search("villain rig")) == ["villain_rig_v001.ma"]
+    assert index.search("hero anim") == []
+    assert index.search("  ") == []
+
+def test_substring_and_short_tokens():
+    index = _buildIndex()
+    # inside a token through the trigrams, at the start of a token under three letters
+    assert _names(index.search("illa", kinds=("asset",))) == ["villain"]
+    assert _names(index.search("vi", kinds=("asset",))) == ["villain"]
+    assert index.search("il", kinds=("asset",)) == []
+
+def test_typos():
+    index = _buildIndex()
+    assert _names(index.search("vilain", kinds=("asset",))) == ["villain"]
+    assert _names(index.search("villian", kinds=("asset",))) == ["villain"]
+
+def test_exact_names_come_first():
+    index = _buildIndex()
+    assert _names(index.search("hero rig v001"))[0] == "hero_rig_v001.ma"
+    assert _names(index.search("hero_rig_v002.ma"))[0] == "hero_rig_v002.ma"
+    assert _names(index.search("heroine"))[0] == "heroine"
+
+def test_limit_covers_exact_names():
+    index = search_utils.SearchIndex([_scene("hero_rig_v001.ma", entity=entity) for entity in ("a", "b", "c", "d")])
+    assert len(index.search("hero_rig_v001.ma", limit=2)) == 2
+    assert len(index.search("hero rig", limit=3)) == 3
+    assert len(index.search("hero rig")) == 4
+
+def test_kinds():
+    index = _buildIndex()
+    assert _names(index.search("hero", kinds=("asset",))) == ["hero", "heroine"]
+    assert _names(index.search("p1", kinds=("project",))) == ["p1"]
+
+def test_added_entries_are_found():
+    index = _buildIndex()
+    index.search("hero")
+    index.add(_entity("asset", "herald", group="char"))
+    assert _names(index.search("her", kinds=("asset",))) == ["hero", "herald", "heroine"]
+
+def test_label_and_selection():
+    scene = _scene("hero_rig_v001.ma")
+    assert search_utils.formatLabel(scene) == "p1 / char / hero / work / rig / hero_rig_v001.ma"
+    assert search_utils.getSelection(scene) == {
+        "project": "p1", "data_type": "assets", "asset_type": "char", "asset": "hero",
+        "stage": "work", "department": "rig", "path": scene.path,
+    }
+    shot = _entity("shot", "sh010", data_type="shots", group="sq010")
+    assert search_utils.getSelection(shot) == {"project": "p1", "data_type": "shots", "sequence": "sq010", "shot": "sh010"}
@@ -0,0 +1,42 @@
+import os
+
+import snapshot_utils
+
+def _makeScene(root, *parts):
+    directory = os.path.join(root, *parts[:-1])
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, parts[-1]), "w") as f:
+        f.write(parts[-1])
+
+def test_changed_folders_are_modified(tmp_path, monkeypatch):
+    root = str(tmp_path).replace("\\", "/")
+    monkeypatch.setenv("PIPELINE_PROJECT_LIBRARY", root)
+    scenes = ("p1", "assets", "char", "hero", "publish", "rig", "maya", "scenes")
+    _makeScene(root, *scenes + ("hero_rig_v001.ma",))
+    _makeScene(root, "p1", "assets", "char", "villain", "publish", "rig", "maya", "scenes", "villain_rig_v001.ma")
+    old = snapshot_utils.takeSnapshot(["p1"])
+
+    _makeScene(root, *scenes + ("hero_rig_v002.ma",))
+    new = snapshot_utils.takeSnapshot(["p1"], old)
+    changes = [(change.action, change.kind, change.path[len(root) + 1:]) for change in snapshot_utils.iterChanges(old, new)]
+
+    hero = "p1/assets/char/hero"
+    assert changes == [
+        ("modified", "project", "p1"),
+        ("modified", "folder", "p1/assets"),
+        ("modified", "asset_type", "p1/assets/char"),
+        ("modified", "asset", hero),
+        ("modified", "stage", hero + "/publish"),
+        ("modified", "department", hero + "/publish/rig"),
+        ("modified", "app", hero + "/publish/rig/maya"),
+        ("modified", "scenes", hero + "/publish/rig/maya/scenes"),
+        ("added", "scene", hero + "/publish/rig/maya/scenes/hero_rig_v002.ma"),
+    ]
+
+def test_unchanged_snapshots_have_no_changes(tmp_path, monkeypatch):
+    root = str(tmp_path).replace("\\", "/")
+    monkeypatch.setenv("PIPELINE_PROJECT_LIBRARY", root)
+    _makeScene(root, "p1", "shots", "sq010", "sh010", "work", "anim", "maya", "scenes", "sh010_anim_v001.ma")
+    old = snapshot_utils.takeSnapshot(["p1"])
+    assert list(snapshot_utils.iterChanges(old, snapshot_utils.takeSnapshot(["p1"], old))) == []
@@ -0,0 +1,51 @@
+import template_utils
+
+def test_format_and_parse_round_trip():
+    registry = template_utils.PROJECT_TEMPLATES
+    fields = {"project": "p1", "asset_type": "char", "asset": "hero", "stage": "work", "department": "rig", "app": "maya"}
+    path = registry.format("asset_scenes", **fields)
+
+    assert path == "p1/assets/char/hero/work/rig/maya/scenes"
+    assert registry.parse(path) == ("asset_scenes", fields)
+    assert registry.parse(path + "/hero_rig_v001.ma") == ("asset_scene", dict(fields, scene="hero_rig_v001.ma"))
+
+def test_parse_picks_the_template_of_the_path():
+    registry = template_utils.PROJECT_TEMPLATES
+    assert registry.parse("p1") == ("project", {"project": "p1"})
+    assert registry.parse("p1/assets") == ("asset_library", {"project": "p1"})
+    assert registry.parse("p1/shots/sq010") == ("sequence", {"project": "p1", "sequence": "sq010"})
+    assert registry.parse("p1/props/char") is None
+    assert registry.parse("p1/assets/char/hero/work/rig/maya/cache") is None
+
+def test_field_patterns():
+    template = template_utils.PathTemplate("scene", "{name}_v{version}.ma", {"version": r"\d+"})
+    assert template.fields == ["name", "version"]
+    assert template.parse("hero_rig_v012.ma") == {"name": "hero_rig", "version": "012"}
+    assert template.parse("hero_rig_vx.ma") is None
+    assert template.parse("sub/hero_v001.ma") is None
+
+def test_replaced_template():
+    registry = template_utils.TemplateRegistry([("entity", "{project}/{entity}")])
+    registry.add("entity", "{project}/entities/{entity}")
+    assert registry.names() == ["entity"]
+    assert registry.parse("p1/hero") is None
+    assert registry.parse("p1/entities/hero") == ("entity", {"project": "p1", "entity": "hero"})
+
+def test_parse_many():
+    registry = template_utils.PROJECT_TEMPLATES
+    roots = ["/mnt/projects", "/mnt/projects/archive", "C:\\projects"]
+    contexts = registry.parseMany([
+        "/mnt/projects/p1/assets/char",
+        "/mnt/projects/archive/p0/shots/sq010/sh010/",
+        "C:\\projects\\p2\\assets",
+        "/mnt/other/p1",
+        "/mnt/projects/p1/assets/char/hero/work/rig",
+    ], roots)
+
+    assert contexts[0] == template_utils.PathContext("asset_type", "/mnt/projects", {"project": "p1", "asset_type": "char"})
+    # the deepest root wins
+    assert contexts[1] == template_utils.PathContext("shot", "/mnt/projects/archive", {"project": "p0", "sequence": "sq010", "shot": "sh010"})
+    assert contexts[2] == template_utils.PathContext("asset_library", "C:\\projects", {"project": "p2"})
+    assert contexts[3] is None
+    assert contexts[4].template == "asset_department"
+    assert contexts[4].fields["department"] == "rig"
@@ -0,0 +1,66 @@
+import pytest
+
+import tree_utils
+
+PATHS = [
+    "/mnt/p1/assets/char/hero/work/rig/maya/scenes/hero_rig_v010.ma",
+    "/mnt/p1/assets/char/hero/work/rig/maya/scenes/hero_rig_v002.ma",
+    "/mnt/p1/assets/char/hero/work/rig/maya/scenes/hero_rig_v001.ma",
+    "/mnt/p1/assets/char/hero/work/rig/maya/scenes/notes.txt",
+    "/mnt/p1/assets/char/villain/work/rig/maya/scenes/villain_rig_v001.ma",
+    "/mnt/p1/shots/sq010/sh010/work/anim/blender/scenes/sh010_anim_v0001.blend",
+]
+
+def _buildTree():
+    tree = tree_utils.CompactTree()
+    for path in PATHS:
+        tree.add(path)
+    return tree
+
+def test_paths_round_trip():
+    tree = _buildTree()
+    tree.freeze()
+    assert sorted(tree.iterFiles()) == sorted(PATHS)
+    for path in PATHS:
+        node = tree.find(path)
+        assert tree.path(node) == path and not tree.isDir(node)
+    assert tree.find("/mnt/p1/assets/char/hero/work/rig/maya/scenes/hero_rig_v003.ma") is None
+    assert tree.find("/mnt/p2") is None
+
+def test_versions_keep_their_padding():
+    tree = _buildTree()
+    scenes = "/mnt/p1/assets/char/hero/work/rig/maya/scenes"
+    # sorted by name segment then version
+    assert tree.listDirectory(scenes) == ["hero_rig_v001.ma", "hero_rig_v002.ma", "hero_rig_v010.ma", "notes.txt"]
+    assert tree.listDirectory("/mnt/p1/shots/sq010/sh010/work/anim/blender/scenes") == ["sh010_anim_v0001.blend"]
+
+def test_list_directory_filters():
+    tree = _buildTree()
+    assert tree.listDirectory("/mnt/p1/assets/char", dirs_only=True) == ["hero", "villain"]
+    assert tree.listDirectory("/mnt/p1/assets/char/hero/work/rig/maya/scenes", extensions=(".txt",)) == ["notes.txt"]
+    assert tree.listDirectory("\\mnt\\p1\\assets\\char\\") == ["hero", "villain"]
+    assert tree.listDirectory("/mnt/missing") == []
+
+def test_directories_are_shared():
+    tree = _buildTree()
+    # the posix root and 9 folders with 4 files for hero, 5 and 1 more for villain, 7 and 1 for the shot
+    assert len(tree) == 28
+    assert tree.add("/mnt/p1/assets/char/hero", is_dir=True) == tree.add("/mnt/p1/assets/char/hero/", is_dir=True)
+    assert len(tree) == 28
+    hero = tree.find("/mnt/p1/assets/char/hero")
+    assert tree.parent(tree.find("/mnt/p1/assets/char/hero/work")) == hero
+
+def test_frozen_tree_is_read_only():
+    tree = _buildTree()
+    tree.freeze()
+    with pytest.raises(RuntimeError):
+        tree.add("/mnt/p1/assets/prop")
+    assert tree.memoryUsage() > 0
+
+def test_relative_paths():
+    tree = tree_utils.CompactTree()
+    tree.add("p1/assets/char", is_dir=True)
+    tree.add("p1/shots", is_dir=True)
+    assert tree.listDirectory("p1") == ["assets", "shots"]
+    assert tree.isDir(tree.find("p1/assets/char"))
+    assert tree.path(tree.find("p1/assets/char")) == "p1/assets/char"
@@ -0,0 +1,80 @@
+import os
+
+import cache_utils
+import version_utils
+
+def _touch(directory, *names):
+    for name in names:
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(name)
+
+def test_parse_version():
+    assert version_utils.parseVersion("hero_rig_v012.ma") == 12
+    assert version_utils.parseVersion("hero.v3.rig.blend") == 3
+    assert version_utils.parseVersion("v7_hero_v008.ma") == 8
+    assert version_utils.parseVersion("hero_rig_V002.MA") == 2
+    assert version_utils.parseVersion("hero_rigv001.ma") is None
+    assert version_utils.parseVersion("notes.ma") is None
+
+def test_scene_versions_queries():
+    versions = version_utils.SceneVersions(["hero_v010.ma", "hero_v002.ma", "notes.ma", "hero_v002.mb", "hero_v001.ma"])
+
+    assert len(versions) == 5
+    assert versions.latest() == "hero_v010.ma"
+    assert versions.latest(3) == ["hero_v010.ma", "hero_v002.mb", "hero_v002.ma"]
+    assert versions.byVersion(2) == ["hero_v002.ma", "hero_v002.mb"]
+    assert versions.byVersion(5) == []
+    assert versions.versions() == [1, 2, 10]
+    # the scenes without a version are the oldest
+    assert versions.names()[-1] == "notes.ma"
+    assert version_utils.SceneVersions().latest() is None
+
+def test_scene_versions_update():
+    versions = version_utils.SceneVersions(["hero_v001.ma", "hero_v002.ma"])
+    assert versions.add("hero_v003.ma")
+    assert not versions.add("hero_v003.ma")
+    assert "hero_v003.ma" in versions
+
+    assert versions.update(["hero_v002.ma", "hero_v003.ma", "hero_v004.ma"]) == 2
+    assert versions.names() == ["hero_v004.ma", "hero_v003.ma", "hero_v002.ma"]
+    assert not versions.remove("hero_v001.ma")
+
+def test_index_follows_the_folder(tmp_path):
+    directory = str(tmp_path)
+    _touch(directory, "hero_v001.ma", "hero_v002.ma", "hero_v001.blend")
+    os.utime(directory, (1000.0, 1000.0))
+    index = version_utils.VersionIndex()
+    versions = index.get(directory, (".ma",))
+    assert versions.names() == ["hero_v002.ma", "hero_v001.ma"]
+
+    # an unchanged folder is answered from the cache, with a single stat
+    calls = cache_utils.getFilesystemCallCount()
+    assert index.get(directory, (".ma",)) is versions
+    assert cache_utils.getFilesystemCallCount() - calls == 1
+
+    # a changed folder patches the same versions
+    os.remove(os.path.join(directory, "hero_v001.ma"))
+    _touch(directory, "hero_v003.ma")
+    os.utime(directory, (2000.0, 2000.0))
+    assert index.get(directory, (".ma",)) is versions
+    assert versions.names() == ["hero_v003.ma", "hero_v002.ma"]
+    assert index.get(directory).latest() == "hero_v003.ma"
+
+def test_index_invalidate(tmp_path):
+    directory = str(tmp_path)
+    _touch(directory, "hero_v001.ma")
+    index = version_utils.VersionIndex()
+    versions = index.get(directory)
+
+    # changed within the same mtime, only an invalidate sees it
+    mtime = os.stat(directory).st_mtime
+    _touch(directory, "hero_v002.ma")
+    os.utime(directory, (mtime, mtime))
+    assert index.get(directory).latest() == "hero_v001.ma"
+    index.invalidate(directory)
+    assert index.get(directory) is not versions
+    assert index.get(directory).latest() == "hero_v002.ma"
+
+def test_index_missing_folder(tmp_path):
+    index = version_utils.VersionIndex()
+    assert len(index.get(str(tmp_path / "missing"))) == 0
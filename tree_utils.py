@@ -0,0 +1,307 @@
+import sys
+from array import array
+
+import project_utils
+import version_utils
+
+ROOT = 0
+_NO_NUMBER = -1
+
+def _encode(name):
+    # split the version digits out of a name, every version of a scene then shares one segment
+    match = None
+    for match in version_utils.VERSION_PATTERN.finditer(name):
+        pass
+    if match is None:
+        return (name, 0, ""), _NO_NUMBER
+    start, end = match.span(1)
+    return (name[:start], end - start, name[end:]), int(match.group(1))
+
+def _decode(segment, number):
+    if number == _NO_NUMBER:
+        return segment[0]
+    return "{}{}{}".format(segment[0], str(number).zfill(segment[1]), segment[2])
+
+class CompactTree(object):
+    """
+    A memory compact tree of paths, meant for millions of scene files.
+
+    Nodes are rows of flat arrays instead of objects. Names are split into an
+    interned segment and the number of their version token, so the versions
+    of a scene and the directory names repeated across assets and shots are
+    stored once. Once frozen, the children of a node are contiguous rows
+    sorted by segment and version, looked up by bisection.
+    """
+    __slots__ = ("_segments", "_segment_ids", "_parents", "_names", "_numbers", "_dirs",
+                 "_child_start", "_child_count", "_lookup", "_last_dir", "_frozen")
+
+    def __init__(self):
+        self._segments = []
+        self._segment_ids = {}
+        self._parents = array("i", [-1])
+        self._names = array("I", [self._intern(("", 0, ""))])
+        self._numbers = array("i", [_NO_NUMBER])
+        self._dirs = array("b", [1])
+        self._child_start = None
+        self._child_count = None
+        # (parent, segment, number) to node of the directories, only kept while building
+        self._lookup = {}
+        # the files of a folder usually come in a row, remember the last folder
+        self._last_dir = (None, ROOT)
+        self._frozen = False
+
+    def __len__(self):
+        return len(self._parents) - 1
+
+    def _intern(self, segment):
+        segment_id = self._segment_ids.get(segment)
+        if segment_id is None:
+            segment = tuple(sys.intern(part) if isinstance(part, str) else part for part in segment)
+            segment_id = self._segment_ids[segment] = len(self._segments)
+            self._segments.append(segment)
+        return segment_id
+
+    def _addNode(self, parent, name, is_dir):
+        segment, number = _encode(name)
+        segment_id = self._intern(segment)
+        if is_dir:
+            key = (parent, segment_id, number)
+            node = self._lookup.get(key)
+            if node is not None:
+                return node
+            self._lookup[key] = len(self._parents)
+        self._parents.append(parent)
+        self._names.append(segment_id)
+        self._numbers.append(number)
+        self._dirs.append(1 if is_dir else 0)
+        return len(self._parents) - 1
+
+    def add(self, path, is_dir=False):
+        """
+        Adds a path and its missing parent directories. Files are not checked
+        for duplicates, add each file once.
+
+        :param path: The path, using `/` or `\\` separators
+        :type path: str
+        :param is_dir: Whether the path is a directory, defaults to False
+        :type is_dir: bool, optional
+        :return: The node of the path
+        :rtype: int
+        """
+        if self._frozen:
+            raise RuntimeError("Cannot add to a frozen tree")
+        path = path.replace("\\", "/").rstrip("/")
+        directory, _, name = path.rpartition("/")
+        if directory == self._last_dir[0]:
+            node = self._last_dir[1]
+        else:
+            node = ROOT
+            for i, part in enumerate(directory.split("/")):
+                # an empty first part keeps the root of posix absolute paths
+                if part or i == 0 and directory:
+                    node = self._addNode(node, part, True)
+            self._last_dir = (directory, node)
+        if name:
+            node = self._addNode(node, name, is_dir)
+        return node
+
+    def freeze(self):
+        """
+        Drops the building tables and sorts the nodes so the children of every
+        node are contiguous. Nothing can be added afterwards.
+        """
+        if self._frozen:
+            return
+        self._lookup = None
+        self._last_dir = None
+        count = len(self._parents)
+        parents, names, numbers = self._parents, self._names, self._numbers
+        # order by parent, then segment and version
+        order = sorted(range(1, count), key=lambda node: (parents[node], names[node], numbers[node]))
+        new_ids = array("i", bytes(4 * count))
+        for position, node in enumerate(order):
+            new_ids[node] = position + 1
+
+        self._parents = array("i", [-1]) + array("i", (new_ids[parents[node]] for node in order))
+        self._names = array("I", [names[0]]) + array("I", (names[node] for node in order))
+        self._numbers = array("i", [_NO_NUMBER]) + array("i", (numbers[node] for node in order))
+        self._dirs = array("b", [1]) + array("b", (self._dirs[node] for node in order))
+        del order, new_ids
+
+        # children rows are contiguous, sorted by parent since parents were renumbered in order
+        self._child_start = array("I", bytes(4 * count))
+        self._child_count = array("I", bytes(4 * count))
+        for node in range(count - 1, 0, -1):
+            parent = self._parents[node]
+            self._child_start[parent] = node
+            self._child_count[parent] += 1
+        self._frozen = True
+
+    def _checkFrozen(self):
+        if not self._frozen:
+            self.freeze()
+
+    def name(self, node):
+        """
+        Returns the name of a node.
+
+        :rtype: str
+        """
+        return _decode(self._segments[self._names[node]], self._numbers[node])
+
+    def parent(self, node):
+        """
+        Returns the parent node, -1 for the root.
+
+        :rtype: int
+        """
+        return self._parents[node]
+
+    def isDir(self, node):
+        """
+        Returns whether a node is a directory.
+
+        :rtype: bool
+        """
+        return bool(self._dirs[node])
+
+    def path(self, node):
+        """
+        Returns the full path of a node.
+
+        :rtype: str
+        """
+        parts = []
+        while node > ROOT:
+            parts.append(self.name(node))
+            node = self._parents[node]
+        return "/".join(reversed(parts))
+
+    def children(self, node=ROOT):
+        """
+        Returns the child nodes of a node, sorted by name segment and version.
+
+        :rtype: range
+        """
+        self._checkFrozen()
+        start = self._child_start[node]
+        return range(start, start + self._child_count[node])
+
+    def child(self, node, name):
+        """
+        Returns the child of a node with the given name.
+
+        :return: The child node, None when missing
+        :rtype: int
+        """
+        self._checkFrozen()
+        segment, number = _encode(name)
+        segment_id = self._segment_ids.get(segment)
+        if segment_id is None:
+            return None
+        key = (segment_id, number)
+        low = self._child_start[node]
+        high = low + self._child_count[node]
+        names, numbers = self._names, self._numbers
+        while low < high:
+            mid = (low + high) // 2
+            if (names[mid], numbers[mid]) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._child_start[node] + self._child_count[node] and names[low] == segment_id and numbers[low] == number:
+            return low
+        return None
+
+    def find(self, path):
+        """
+        Returns the node of a path.
+
+        :param path: The path, using `/` or `\\` separators
+        :type path: str
+        :return: The node, None when the path is not in the tree
+        :rtype: int
+        """
+        node = ROOT
+        path = path.replace("\\", "/").rstrip("/")
+        for i, part in enumerate(path.split("/")):
+            if part or i == 0 and path:
+                node = self.child(node, part)
+                if node is None:
+                    return None
+        return node
+
+    def listDirectory(self, path, dirs_only=False, extensions=None):
+        """
+        Returns the names inside a directory of the tree, like cache_utils.listDirectory.
+
+        :param path: The directory
+        :type path: str
+        :param dirs_only: Only return the sub directories, defaults to False
+        :type dirs_only: bool, optional
+        :param extensions: Only return the files ending with one of these extensions
+        :type extensions: tuple, optional
+        :return: List of names, empty if the directory is not in the tree
+        :rtype: list
+        """
+        node = self.find(path)
+        if node is None:
+            return []
+        names = []
+        for child in self.children(node):
+            if dirs_only and not self._dirs[child]:
+                continue
+            name = self.name(child)
+            if extensions and (self._dirs[child] or not name.endswith(tuple(extensions))):
+                continue
+            names.append(name)
+        return names
+
+    def iterFiles(self, node=ROOT):
+        """
+        Yields the paths of every file below a node.
+
+        :rtype: generator
+        """
+        self._checkFrozen()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for child in self.children(current):
+                if self._dirs[child]:
+                    stack.append(child)
+                else:
+                    yield self.path(child)
+
+    def memoryUsage(self):
+        """
+        Returns an estimate of the bytes held by the tree.
+
+        :rtype: int
+        """
+        size = sys.getsizeof(self._segments) + sys.getsizeof(self._segment_ids)
+        for segment in self._segments:
+            size += sys.getsizeof(segment) + sum(sys.getsizeof(part) for part in segment)
+        for table in (self._parents, self._names, self._numbers, self._dirs, self._child_start, self._child_count):
+            if table is not None:
+                size += sys.getsizeof(table)
+        if self._lookup:
+            size += sys.getsizeof(self._lookup) + len(self._lookup) * 100
+        return size
+
+def buildTree(projects=None, apps=None):
+    """
+    Builds the compact tree of every scene of the projects.
+
+    :param projects: The names of the projects, all projects by default
+    :type projects: list, optional
+    :param apps: The app folders to walk, all known apps by default
+    :type apps: list, optional
+    :return: The frozen tree
+    :rtype: CompactTree
+    """
+    tree = CompactTree()
+    for record in project_utils.crawlProjects(projects, apps=apps):
+        tree.add(record.path)
+    tree.freeze()
+    return tree
@@ -0,0 +1,236 @@
+import os
+import re
+import bisect
+import threading
+from collections import OrderedDict
+
+import cache_utils
+
+# the last `v001` like token of the file name, separated from the rest by `_`, `.` or `-`
+VERSION_PATTERN = re.compile(r"(?:^|[._-])v(\d+)(?=$|[._-])", re.IGNORECASE)
+DEFAULT_MAX_DIRECTORIES = 1024
+# sort key of the scenes without a version token, older than any version
+NO_VERSION = -1
+
+def parseVersion(name):
+    """
+    Returns the version number of a scene file name, `asset_rig_v012.ma` gives 12.
+
+    :param name: The file name
+    :type name: str
+    :return: The version, None when the name has no version token
+    :rtype: int
+    """
+    matches = VERSION_PATTERN.findall(os.path.splitext(name)[0])
+    if not matches:
+        return None
+    return int(matches[-1])
+
+def _sortKey(name):
+    version = parseVersion(name)
+    return (NO_VERSION if version is None else version, name)
+
+class SceneVersions(object):
+    """
+    The scenes of a single scenes folder kept sorted by version, oldest first.
+
+    Lookups bisect the sorted keys, adding or removing a scene only shifts the
+    sorted lists instead of sorting the folder again.
+    """
+    def __init__(self, names=()):
+        self._keys = sorted(_sortKey(name) for name in names)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, name):
+        key = _sortKey(name)
+        with self._lock:
+            i = bisect.bisect_left(self._keys, key)
+            return i < len(self._keys) and self._keys[i] == key
+
+    def add(self, name):
+        """
+        Adds a scene, nothing happens when it is already known.
+
+        :param name: The file name of the scene
+        :type name: str
+        :return: Whether the scene was added
+        :rtype: bool
+        """
+        key = _sortKey(name)
+        with self._lock:
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                return False
+            self._keys.insert(i, key)
+            return True
+
+    def remove(self, name):
+        """
+        Removes a scene.
+
+        :param name: The file name of the scene
+        :type name: str
+        :return: Whether the scene was known
+        :rtype: bool
+        """
+        key = _sortKey(name)
+        with self._lock:
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+                return True
+            return False
+
+    def update(self, names):
+        """
+        Brings the scenes in line with a new listing of the folder.
+
+        :param names: The file names of the scenes
+        :type names: list
+        :return: Number of scenes added and removed
+        :rtype: int
+        """
+        with self._lock:
+            known = set(name for _, name in self._keys)
+        wanted = set(names)
+        changes = 0
+        for name in known - wanted:
+            changes += self.remove(name)
+        for name in wanted - known:
+            changes += self.add(name)
+        return changes
+
+    def latest(self, count=None):
+        """
+        Returns the newest scene, or the `count` newest scenes newest first.
+
+        :param count: Number of scenes to return, only the newest when omitted
+        :type count: int, optional
+        :return: The scene name, None when the folder is empty, or a list of names
+        :rtype: str or list
+        """
+        with self._lock:
+            if count is None:
+                return self._keys[-1][1] if self._keys else None
+            return [name for _, name in reversed(self._keys[max(0, len(self._keys) - count):])]
+
+    def byVersion(self, version):
+        """
+        Returns the scenes of a version.
+
+        :param version: The version number
+        :type version: int
+        :return: List of scene names, usually a single one
+        :rtype: list
+        """
+        with self._lock:
+            start = bisect.bisect_left(self._keys, (version, ""))
+            end = bisect.bisect_left(self._keys, (version + 1, ""), start)
+            return [name for _, name in self._keys[start:end]]
+
+    def versions(self):
+        """
+        Returns the distinct version numbers, oldest first.
+
+        :rtype: list
+        """
+        with self._lock:
+            return sorted(set(version for version, _ in self._keys if version != NO_VERSION))
+
+    def names(self):
+        """
+        Returns every scene, newest first.
+
+        :rtype: list
+        """
+        with self._lock:
+            return [name for _, name in reversed(self._keys)]
+
+class VersionIndex(object):
+    """
+    A bounded map of scenes folders to their SceneVersions.
+
+    The versions are held by the listing cache, so an unchanged folder costs
+    the stat of its mtime check and a changed one is listed again and patched
+    with only its new and vanished scenes.
+    """
+    def __init__(self, max_directories=DEFAULT_MAX_DIRECTORIES):
+        self.max_directories = max_directories
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, directory, extensions=None):
+        """
+        Returns the versions of a scenes folder, up to date with the disk.
+
+        :param directory: The scenes folder
+        :type directory: str
+        :param extensions: Only index the files ending with one of these extensions
+        :type extensions: tuple, optional
+        :return: The versions, empty when the folder does not exist
+        :rtype: SceneVersions
+        """
+        key = (cache_utils.resolvePath(directory), tuple(extensions or ()))
+
+        def load(path):
+            # the folder changed, the versions seen last are patched rather than sorted again
+            with self._lock:
+                versions = self._entries.get(key)
+                if versions is None:
+                    versions = self._entries[key] = SceneVersions()
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_directories:
+                    self._entries.popitem(last=False)
+            versions.update(cache_utils.listDirectory(path, extensions=extensions))
+            return versions
+
+        versions = cache_utils.getCache().get(directory, load, "versions{}".format(key[1]))
+        return versions if versions is not None else SceneVersions()
+
+    def invalidate(self, directory):
+        """
+        Forgets a scenes folder.
+
+        :param directory: The scenes folder
+        :type directory: str
+        """
+        directory = cache_utils.resolvePath(directory)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == directory]:
+                del self._entries[key]
+        cache_utils.getCache().invalidate(directory, recursive=False)
+
+    def clear(self):
+        """
+        Forgets every scenes folder.
+        """
+        with self._lock:
+            directories = set(key[0] for key in self._entries)
+            self._entries.clear()
+        for directory in directories:
+            cache_utils.getCache().invalidate(directory, recursive=False)
+
+_index = VersionIndex()
+
+def getIndex():
+    """
+    Returns the shared version index used by the file trees and the prefetcher.
+
+    :rtype: VersionIndex
+    """
+    return _index
+
+def getSceneVersions(directory, extensions=None):
+    """
+    Returns the versions of a scenes folder from the shared index.
+
+    :param directory: The scenes folder
+    :type directory: str
+    :param extensions: Only index the files ending with one of these extensions
+    :type extensions: tuple, optional
+    :rtype: SceneVersions
+    """
+    return _index.get(directory, extensions)
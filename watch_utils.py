@@ -0,0 +1,80 @@
+from PySide2 import QtCore
+
+import cache_utils
+
+DEFAULT_DELAY = 300
+
+class DirectoryWatcher(QtCore.QObject):
+    """
+    Watches a small set of directories and reports their changes in coalesced
+    batches, dropping the stale cache entries before the batch is emitted.
+
+    QFileSystemWatcher is backed by inotify on Linux and ReadDirectoryChangesW
+    on Windows, so only the watched directories cost anything.
+    """
+    directoriesChanged = QtCore.Signal(list)
+
+    def __init__(self, parent=None, delay=DEFAULT_DELAY):
+        super().__init__(parent)
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._onDirectoryChanged)
+        self._pending = set()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self._flush)
+
+    def setDirectories(self, directories):
+        """
+        Replaces the watched directories, the directories that do not exist are skipped.
+
+        :param directories: The directories to watch
+        :type directories: list
+        """
+        wanted = set(cache_utils.resolvePath(d) for d in directories)
+        current = set(self._watcher.directories())
+        removed = list(current - wanted)
+        added = [d for d in wanted - current if QtCore.QFileInfo(d).isDir()]
+        if removed:
+            self._watcher.removePaths(removed)
+        if added:
+            self._watcher.addPaths(added)
+        self._pending &= wanted
+
+    def addDirectories(self, directories):
+        """
+        Starts watching more directories.
+
+        :param directories: The directories to watch
+        :type directories: list
+        """
+        self.setDirectories(list(self._watcher.directories()) + list(directories))
+
+    def directories(self):
+        """
+        Returns the watched directories.
+
+        :rtype: list
+        """
+        return list(self._watcher.directories())
+
+    def clear(self):
+        """
+        Stops watching every directory.
+        """
+        self.setDirectories([])
+        self._timer.stop()
+
+    def _onDirectoryChanged(self, path):
+        self._pending.add(path)
+        # restart the timer so a burst of saves is reported once
+        self._timer.start()
+
+    def _flush(self):
+        paths = sorted(self._pending)
+        self._pending.clear()
+        # only the memory cache here, the index is refreshed by the listings off the gui thread
+        for path in paths:
+            cache_utils.getCache().invalidate(path, recursive=False)
+        if paths:
+            self.directoriesChanged.emit(paths)
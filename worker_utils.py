@@ -0,0 +1,153 @@
+import traceback
+from PySide2 import QtCore
+
+class WorkerSignals(QtCore.QObject):
+    """
+    Signals posted back from the worker threads, delivered on the thread the
+    object lives in (the GUI thread).
+    """
+    finished = QtCore.Signal(str, int, object)
+    failed = QtCore.Signal(str, int, str)
+    done = QtCore.Signal(object)
+
+class Worker(QtCore.QRunnable):
+    """
+    Runs a single function on a QThreadPool thread and posts the result back.
+    """
+    def __init__(self, dispatcher, key, token, func, args, kwargs):
+        super().__init__()
+        self.dispatcher = dispatcher
+        self.key = key
+        self.token = token
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # the dispatcher keeps the python wrapper alive until the run is done
+        self.setAutoDelete(False)
+
+    def run(self):
+        signals = self.dispatcher.signals
+        try:
+            # the selection may have moved on while this task was queued
+            if not self.dispatcher.isCurrent(self.key, self.token):
+                return
+            try:
+                result = self.func(*self.args, **self.kwargs)
+            except Exception:
+                signals.failed.emit(self.key, self.token, traceback.format_exc())
+            else:
+                signals.finished.emit(self.key, self.token, result)
+        finally:
+            signals.done.emit(self)
+
+class TaskDispatcher(QtCore.QObject):
+    """
+    Runs keyed tasks on a QThreadPool. Submitting a task for a key supersedes
+    the previous task of that key, so only the newest result is delivered.
+    """
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        self.pool = pool or QtCore.QThreadPool.globalInstance()
+        self.signals = WorkerSignals(self)
+        self.signals.finished.connect(self._onFinished)
+        self.signals.failed.connect(self._onFailed)
+        self.signals.done.connect(self._onDone)
+        self._tokens = {}
+        self._callbacks = {}
+        self._errbacks = {}
+        self._pending = {}
+        self._workers = set()
+
+    def submit(self, key, callback, func, *args, on_error=None, **kwargs):
+        """
+        Queues a function on the pool and calls the callback with its result on the GUI thread.
+
+        :param key: The slot the task belongs to, a newer task for the same key supersedes this one
+        :type key: str
+        :param callback: Called with the result when the task is still current
+        :type callback: callable
+        :param func: The function to run on the pool
+        :type func: callable
+        :param on_error: Called with the formatted traceback instead of the callback when the function raises
+        :type on_error: callable, optional
+        :return: The token of the task
+        :rtype: int
+        """
+        self.cancel(key)
+        token = self._tokens[key]
+        self._callbacks[key] = callback
+        if on_error is not None:
+            self._errbacks[key] = on_error
+        worker = Worker(self, key, token, func, args, kwargs)
+        self._pending[key] = worker
+        self._workers.add(worker)
+        self.pool.start(worker)
+        return token
+
+    def cancel(self, key):
+        """
+        Drops the pending task of a key, a running task finishes but its result is ignored.
+
+        :param key: The slot to cancel
+        :type key: str
+        """
+        self._tokens[key] = self._tokens.get(key, 0) + 1
+        self._callbacks.pop(key, None)
+        self._errbacks.pop(key, None)
+        worker = self._pending.pop(key, None)
+        if worker is not None and self.pool.tryTake(worker):
+            self._workers.discard(worker)
+
+    def cancelAll(self):
+        """
+        Cancels the tasks of every key.
+        """
+        for key in list(self._tokens):
+            self.cancel(key)
+
+    def isCurrent(self, key, token):
+        """
+        Returns whether the token is the newest task of its key.
+
+        :param key: The slot of the task
+        :type key: str
+        :param token: The token returned by submit
+        :type token: int
+        :return: True when no newer task was submitted for the key
+        :rtype: bool
+        """
+        return self._tokens.get(key) == token
+
+    def isPending(self, key):
+        """
+        Returns whether a task of the key has not delivered its result yet.
+
+        :param key: The slot of the task
+        :type key: str
+        :rtype: bool
+        """
+        return key in self._pending
+
+    def _onDone(self, worker):
+        self._workers.discard(worker)
+        if self._pending.get(worker.key) is worker:
+            del self._pending[worker.key]
+
+    def _onFinished(self, key, token, result):
+        if not self.isCurrent(key, token):
+            return
+        self._pending.pop(key, None)
+        self._errbacks.pop(key, None)
+        callback = self._callbacks.pop(key, None)
+        if callback is not None:
+            callback(result)
+
+    def _onFailed(self, key, token, error):
+        if not self.isCurrent(key, token):
+            return
+        self._pending.pop(key, None)
+        self._callbacks.pop(key, None)
+        QtCore.qWarning("Task {} failed:\n{}".format(key, error))
+        errback = self._errbacks.pop(key, None)
+        if errback is not None:
+            errback(error)